@@ -7,37 +7,60 @@ It connects all the ML functions from the src directory with a web interface.
 Endpoints:
 - /weather: Get weather data for specific location and time
 - /predict: Make trip duration predictions
+- /predict/batch: Vectorized predictions for many trips in one call
+- /predict/bulk: Streaming, chunked scoring of large CSV uploads or NDJSON bodies
 - /distance: Calculate Manhattan and Euclidean distances
 - /time-features: Extract time-based features
 - /geolocation: Perform geolocation clustering
 - /models: Model management endpoints
+- /metrics: Prometheus metrics (request latency, prediction stages, pools)
 - /data: Data preprocessing endpoints
+- /jobs: Status, progress and cancellation of pipeline/training jobs
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Body
+from fastapi import FastAPI, HTTPException, Body, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import uvicorn
+import asyncio
+import json
 import logging
+import tempfile
+import time
 import sys
 import os
 from pathlib import Path
 from datetime import datetime
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 import pandas as pd
 import numpy as np
 
-# Add src to path for imports
+# Add project root (config.py) and src to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
 sys.path.append(str(Path(__file__).parent.parent / "src"))
 
+import config
+
 # Import ML modules
-from features.weather_api import get_weather_for_trip
-from features.distance import calc_distance
-from features.time import extract_time_features
+from features.weather_api import WeatherLookup
+from features.distance import calc_distance_fast
+from features.holidays import HolidayCalendar, REGIONS
 from features.geolocation import clustering
-from model.models import run_regression_models, predict_duration, normalize_features
+from model.models import predict_duration, normalize_features
+from model.save_models import load_latest_models, load_latest_feature_plans, load_latest_tree_ensembles
+from model.tree_ensemble import FlatTreeEnsemble, UnsupportedModelError, count_nodes
+from model.od_table import ODDurationTable
 from complete_pipeline import CompleteMLPipeline
+from serving.executors import BoundedExecutor, ExecutorSaturated
+from serving.admission import LoadShedder
+from serving.batching import MicroBatcher
+from serving.cache import PredictionCache
+from serving.metrics import MetricsRegistry
+from serving.jobs import JobManager
+from serving.memory import process_memory
+from serving.registry import ModelHolder
+from serving.encoding import ArrowResponse, FastJSONResponse, ARROW_MEDIA_TYPE, negotiate, offered_media_types
 
 # Setup logging
 logging.basicConfig(
@@ -64,20 +87,358 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus metrics served on /metrics
+metrics = MetricsRegistry()
+REQUESTS_TOTAL = metrics.counter(
+    "gopredict_requests_total", "HTTP requests by route and status code", ("method", "route", "status")
+)
+REQUEST_LATENCY = metrics.histogram(
+    "gopredict_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+)
+PREDICT_STAGE_LATENCY = metrics.histogram(
+    "gopredict_predict_stage_seconds", "Time spent in each prediction stage", ("stage",)
+)
+PREDICT_FALLBACKS = metrics.counter(
+    "gopredict_predict_fallback_total", "Predictions answered by the distance heuristic", ("reason",)
+)
+PREDICT_DEGRADED = metrics.counter(
+    "gopredict_predict_degraded_total",
+    "Predictions answered by the distance heuristic because inference was overloaded", ("reason",)
+)
+metrics.gauge(
+    "gopredict_load_shedding", "1 while /predict sheds model inference",
+    fn=lambda: int(load_shedder is not None and load_shedder.shedding)
+)
+metrics.gauge(
+    "gopredict_jobs_in_flight", "Pipeline/training jobs queued or running", fn=lambda: job_manager.active_count()
+)
+PREDICT_OD_TABLE = metrics.counter(
+    "gopredict_predict_od_table_total",
+    "Table-mode /predict lookups in the OD duration table by result", ("result",)
+)
+metrics.gauge(
+    "gopredict_od_table_entries", "Cell pairs in the loaded OD duration table",
+    fn=lambda: len(od_table) if od_table is not None else 0
+)
+BULK_ROWS = metrics.counter(
+    "gopredict_bulk_rows_total", "Rows processed by /predict/bulk", ("result",)
+)
+metrics.gauge("gopredict_trained_models", "Models available for prediction", fn=lambda: len(model_holder.current))
+metrics.gauge("gopredict_model_set_version", "Version of the published model set", fn=lambda: model_holder.current.version)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count requests and observe latency per route template"""
+    started = time.perf_counter()
+    request.state.started = started
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        REQUESTS_TOTAL.inc(method=request.method, route=route_path, status=status)
+        REQUEST_LATENCY.observe(time.perf_counter() - started, method=request.method, route=route_path)
+
 # Global variables for model management
-trained_models = {}
+# Published models: handlers read model_holder.current once and use that
+# ModelSet (models, flattened trees, feature plans) for the whole request
+model_holder = ModelHolder(keep=config.SERVING['model_history'])
 pipeline_instance = None
+models_ready = False
+models_preloaded = False  # set by preload_serving_state() in the parent before workers fork
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Weather served from the bulk hourly table and a cache before falling back to Meteostat
+weather_table_path = Path(config.SERVING['weather_table'])
+weather_lookup = WeatherLookup(
+    table_path=weather_table_path if weather_table_path.is_absolute() else PROJECT_ROOT / weather_table_path,
+    table_radius_km=config.SERVING['weather_table_radius_km'],
+    cache_size=config.SERVING['weather_cache_size'],
+    cache_ttl_s=config.SERVING['weather_cache_ttl_s'],
+    offline=config.SERVING['weather_offline']
+)
+
+# Origin-destination duration table for table-mode predictions (see model/od_table.py)
+PREDICTION_MODES = ('model', 'table')
+
+def load_od_table(path=None):
+    """Memory-map the OD duration table built by the pipeline, or None if it has not been built"""
+    path = Path(path or config.SERVING['od_table'])
+    path = path if path.is_absolute() else PROJECT_ROOT / path
+    if not (path / "meta.json").exists():
+        return None
+    try:
+        table = ODDurationTable.load(path)
+    except Exception as e:
+        logging.warning(f"Could not load OD duration table from {path}: {e}")
+        return None
+    logging.info(f"Loaded OD duration table: {len(table)} cell pairs from {path}")
+    return table
+
+def reload_od_table(path=None):
+    """Swap in a rebuilt OD duration table; requests holding the previous one keep it"""
+    global od_table
+    table = load_od_table(path)
+    if table is not None:
+        od_table = table
+
+od_table = load_od_table()
+
+# Holiday calendar of config.HOLIDAYS, the one the pipeline trains with; it
+# flags trips for the OD table and the prediction cache. /time-features can
+# also answer for the other regions over the same years
+holiday_calendar = HolidayCalendar(**config.HOLIDAYS)
+holiday_calendars = {
+    region: holiday_calendar if region == holiday_calendar.region else HolidayCalendar(
+        holiday_calendar.first_year, holiday_calendar.last_year, region
+    )
+    for region in REGIONS
+}
+
+# Optional cache of model predictions for near-duplicate trips
+prediction_cache = PredictionCache(
+    grid_deg=config.SERVING['prediction_cache_grid_deg'],
+    max_size=config.SERVING['prediction_cache_size']
+) if config.SERVING['prediction_cache_enabled'] else None
+
+def publish_models(models, ensembles=None, plans=None, source="publish"):
+    """Publish newly trained or loaded models as a new model set version and invalidate cached predictions"""
+    model_set = model_holder.publish(models, ensembles, plans, source=source)
+    logging.info(f"Published model set v{model_set.version} ({source}): {model_set.names()}")
+    if prediction_cache is not None:
+        prediction_cache.invalidate()
+    return model_set
+
+# Pipeline and training jobs run in their own processes; trained models come back here
+def publish_job_models(models, plans=None, ensembles=None):
+    """Warm up models trained by a job (on its monitor thread) and publish them on the event loop"""
+    warm_up_models(models, plans)
+    ensembles = flatten_tree_models(models, ensembles)
+    if event_loop is not None:
+        event_loop.call_soon_threadsafe(publish_models, models, ensembles, plans, "job")
+    else:
+        publish_models(models, ensembles, plans, "job")
+
+event_loop = None
+job_manager = JobManager(PROJECT_ROOT, on_models=publish_job_models, on_od_table=reload_od_table)
+
+# Bounded pools so blocking I/O and inference never run on the event loop
+io_executor = BoundedExecutor(
+    "io",
+    max_workers=config.SERVING['io_workers'],
+    max_queue=config.SERVING['io_max_queue'],
+    timeout=config.SERVING['io_timeout_s']
+)
+inference_executor = BoundedExecutor(
+    "inference",
+    max_workers=config.SERVING['inference_workers'],
+    max_queue=config.SERVING['inference_max_queue'],
+    timeout=config.SERVING['inference_timeout_s']
+)
+
+# Admission control for /predict model inference (see serving/admission.py)
+load_shedder = LoadShedder(
+    inference_executor,
+    max_queue_depth=config.SERVING['shed_queue_depth'],
+    max_latency_s=config.SERVING['shed_latency_ms'] / 1000.0,
+    resume_ratio=config.SERVING['shed_resume_ratio'],
+    probe_every=config.SERVING['shed_probe_every']
+) if config.SERVING['shed_enabled'] else None
+
+# Trip used to warm up freshly loaded models
+WARM_UP_TRIP = {
+    'start_lat': 40.767937, 'start_lng': -73.982155,
+    'end_lat': 40.748817, 'end_lng': -73.985428,
+    'datetime_str': "2016-01-01T17:00:00"
+}
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize the ML pipeline on startup"""
-    global pipeline_instance
+    global pipeline_instance, event_loop
+    event_loop = asyncio.get_running_loop()
     try:
         pipeline_instance = CompleteMLPipeline()
         logging.info("✅ GoPredict API initialized successfully")
     except Exception as e:
         logging.error(f"❌ Failed to initialize pipeline: {e}")
 
+    if models_preloaded:
+        # Forked from a preloading parent (start_api.py --preload): models are already shared
+        memory = process_memory()
+        logging.info(f"Worker {memory['pid']} started with preloaded models: "
+                     f"RSS {memory['rss_bytes'] / 1024 ** 2:.1f} MB, "
+                     f"USS {(memory['uss_bytes'] or 0) / 1024 ** 2:.1f} MB")
+        return
+
+    # Load persisted models without delaying startup; /health reports readiness
+    asyncio.create_task(warm_start_models())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release the executor pools and stop running jobs"""
+    job_manager.shutdown()
+    io_executor.shutdown()
+    inference_executor.shutdown()
+
+async def run_blocking(executor, fn, *args):
+    """
+    Run a blocking function on one of the bounded pools.
+
+    Raises:
+        HTTPException: 503 when the pool is saturated, 504 when the task times out
+    """
+    return await guard_pool(executor.run(fn, *args), executor)
+
+async def guard_pool(awaitable, executor):
+    """Await work scheduled on executor, mapping pool errors to HTTP errors"""
+    try:
+        return await awaitable
+    except ExecutorSaturated as e:
+        logging.warning(f"Rejected work: {e}")
+        raise HTTPException(status_code=503, detail=f"Server busy: {e}")
+    except asyncio.TimeoutError:
+        logging.warning(f"{executor.name} task timed out after {executor.timeout}s")
+        raise HTTPException(status_code=504, detail=f"{executor.name} task timed out")
+
+def warm_up_models(models, plans=None):
+    """Run one prediction per model through the single and batch paths"""
+    plans = plans or {}
+    trip = pd.DataFrame([WARM_UP_TRIP] * len(models))
+    trip['datetime'] = parse_trip_datetimes(trip['datetime_str'])
+    trip['model_name'] = list(models)
+    features, _ = create_feature_matrix(trip)
+
+    for i, (model_name, model) in enumerate(models.items()):
+        try:
+            row = plans[model_name].transform_frame(trip.iloc[i:i + 1]) if model_name in plans else features[i:i + 1]
+            model.predict([list(row[0])])
+            model.predict(row)
+        except Exception as e:
+            logging.warning(f"Warm-up prediction with {model_name} failed: {e}")
+
+def flatten_tree_models(models, exported=None):
+    """
+    Tree arrays of XGBoost and RandomForest models for the small-batch evaluator.
+
+    Uses the arrays exported next to each saved model (export_tree_ensemble);
+    models saved without them are flattened here. The flat arrays are a
+    second copy of the trees, so ensembles with more than
+    SERVING['tree_eval_max_nodes'] nodes (e.g. a 500-tree RandomForest) are
+    left to model.predict rather than doubling their memory.
+
+    Args:
+        models: Models by name
+        exported: FlatTreeEnsemble per model name loaded from the saved arrays
+
+    Returns:
+        dict: FlatTreeEnsemble per model name; other model types are skipped
+    """
+    if config.SERVING['tree_eval_max_rows'] <= 0:
+        return {}
+    max_nodes = config.SERVING['tree_eval_max_nodes']
+    exported = exported or {}
+    ensembles = {}
+    for model_name, model in models.items():
+        ensemble = exported.get(model_name)
+        if ensemble is not None:
+            if max_nodes > 0 and ensemble.n_nodes > max_nodes:
+                logging.info(f"Not using the tree arrays of {model_name}: {ensemble.n_nodes} nodes "
+                             f"exceed tree_eval_max_nodes ({max_nodes})")
+            else:
+                ensembles[model_name] = ensemble
+            continue
+        try:
+            n_nodes = count_nodes(model)
+            if n_nodes is None:
+                continue
+            if max_nodes > 0 and n_nodes > max_nodes:
+                logging.info(f"Not flattening {model_name}: {n_nodes} nodes exceed tree_eval_max_nodes ({max_nodes})")
+                continue
+            ensembles[model_name] = FlatTreeEnsemble.from_model(model)
+            logging.info(f"Flattened {model_name}: {ensembles[model_name].n_trees} trees, "
+                         f"{ensembles[model_name].n_nodes} nodes")
+        except UnsupportedModelError:
+            continue
+        except Exception as e:
+            logging.warning(f"Could not flatten {model_name}, using model.predict: {e}")
+    return ensembles
+
+def model_predict(served, features):
+    """model.predict, answered from the model's flattened trees for small batches"""
+    if served.ensemble is not None and len(features) <= config.SERVING['tree_eval_max_rows']:
+        return served.ensemble.predict(features)
+    return served.model.predict(features)
+
+def model_features(served, trips_df, features=None):
+    """
+    Feature matrix for a model: built by the feature plan saved with it, or
+    the legacy 14-column layout for models saved without a plan.
+
+    Args:
+        served: ServedModel from the request's pinned model set
+        trips_df: Trips with coordinates and a parsed 'datetime' column
+        features: create_feature_matrix(trips_df) output to reuse, if already built
+    """
+    if served.plan is not None:
+        return served.plan.transform_frame(trips_df)
+    if features is not None:
+        return features
+    return create_feature_matrix(trips_df)[0]
+
+def preload_serving_state(models_dir=None):
+    """
+    Load models and read-only tables before uvicorn workers are forked.
+
+    Called by start_api.py --preload in the parent process so that every
+    worker shares the model and table pages copy-on-write instead of loading
+    its own copy. The weather table is already loaded when this module is
+    imported.
+
+    Args:
+        models_dir: Directory of saved models (defaults to PROJECT_ROOT/saved_models)
+    """
+    global models_ready, models_preloaded
+    models_dir = models_dir or PROJECT_ROOT / "saved_models"
+    models = load_latest_models(str(models_dir))
+    if models:
+        plans = load_latest_feature_plans(str(models_dir))
+        warm_up_models(models, plans)
+        exported = load_latest_tree_ensembles(str(models_dir))
+        publish_models(models, flatten_tree_models(models, exported), plans, "preload")
+        logging.info(f"✅ Preloaded {len(models)} models: {list(models)}")
+    else:
+        logging.info("No saved models found to preload")
+    models_preloaded = True
+    models_ready = True
+
+async def warm_start_models():
+    """Load the newest saved artifact per model and warm it up before marking the API ready"""
+    global models_ready
+    try:
+        models_dir = pipeline_instance.paths['models'] if pipeline_instance else Path("saved_models")
+        loop = asyncio.get_running_loop()
+
+        models = await loop.run_in_executor(None, load_latest_models, str(models_dir))
+        if models:
+            plans = await loop.run_in_executor(None, load_latest_feature_plans, str(models_dir))
+            await loop.run_in_executor(None, warm_up_models, models, plans)
+            exported = await loop.run_in_executor(None, load_latest_tree_ensembles, str(models_dir))
+            ensembles = await loop.run_in_executor(None, flatten_tree_models, models, exported)
+            publish_models(models, ensembles, plans, "warm start")
+            logging.info(f"✅ Warm-started {len(models)} models: {list(models)}")
+        else:
+            logging.info("No saved models found; predictions use the distance fallback until training runs")
+
+    except Exception as e:
+        logging.error(f"❌ Model warm start failed: {e}")
+    finally:
+        models_ready = True
+
 # ===============================
 # WEATHER API ENDPOINTS
 # ===============================
@@ -103,8 +464,10 @@ async def get_weather(
         # Parse timestamp
         dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
         
-        # Get weather data
-        weather_data = get_weather_for_trip(latitude, longitude, dt)
+        # Get weather data: in-memory table/cache first, network fetch on the io pool
+        weather_data = weather_lookup.lookup(latitude, longitude, dt, allow_fetch=False)
+        if weather_data is None:
+            weather_data = await run_blocking(io_executor, weather_lookup.lookup, latitude, longitude, dt)
         
         if not weather_data:
             raise HTTPException(status_code=404, detail="No weather data found for the specified location and time")
@@ -116,6 +479,8 @@ async def get_weather(
             "timestamp": timestamp
         }
     
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Invalid timestamp format: {e}")
     except Exception as e:
@@ -128,6 +493,7 @@ async def get_weather(
 
 @app.post("/distance")
 async def calculate_distance(
+    request: Request,
     start_lat: float,
     start_lng: float,
     end_lat: float,
@@ -145,33 +511,27 @@ async def calculate_distance(
         method: "manhattan", "euclidean", or "both"
     
     Returns:
-        Distance calculation results
+        Distance calculation results (JSON only; 406 if Accept excludes it)
     """
+    response_media_type(request)
     try:
-        # Create a simple dataframe for the distance calculation
-        df = pd.DataFrame({
-            'start_lat': [start_lat],
-            'start_lng': [start_lng],
-            'end_lat': [end_lat],
-            'end_lng': [end_lng]
-        })
+        # Scalar fast path: both distances in one call, no DataFrame
+        manhattan_dist, euclidean_dist = calc_distance_fast(start_lat, start_lng, end_lat, end_lng)
         
         results = {}
         
         if method in ["manhattan", "both"]:
-            manhattan_dist = calc_distance(df, method='manhattan')[0]
-            results["manhattan_distance"] = float(manhattan_dist)
+            results["manhattan_distance"] = manhattan_dist
         
         if method in ["euclidean", "both"]:
-            euclidean_dist = calc_distance(df, method='euclidean')[0]
-            results["euclidean_distance"] = float(euclidean_dist)
+            results["euclidean_distance"] = euclidean_dist
         
-        return {
+        return FastJSONResponse({
             "success": True,
             "data": results,
             "start_location": {"latitude": start_lat, "longitude": start_lng},
             "end_location": {"latitude": end_lat, "longitude": end_lng}
-        }
+        })
     
     except Exception as e:
         logging.error(f"Distance calculation error: {e}")
@@ -183,17 +543,22 @@ async def calculate_distance(
 
 @app.post("/time-features")
 async def extract_time_features_api(
-    datetime_str: str
+    datetime_str: str,
+    city: Optional[str] = None
 ):
     """
     Extract time-based features from a datetime string.
     
     Args:
         datetime_str: ISO format datetime string
+        city: Holiday region ('new_york' or 'san_francisco'; defaults to config.HOLIDAYS['region'])
     
     Returns:
         Time features dictionary
     """
+    calendar = holiday_calendars.get(city or holiday_calendar.region)
+    if calendar is None:
+        raise HTTPException(status_code=400, detail=f"Unknown city '{city}', expected one of {sorted(REGIONS)}")
     try:
         # Parse datetime
         dt = pd.to_datetime(datetime_str)
@@ -202,29 +567,7 @@ async def extract_time_features_api(
         weekday = dt.weekday() + 1
         hour = dt.hour
         date = dt.date()
-        
-        # Check if it's a holiday (simplified 2015 holidays)
-        holidays_2015 = {
-            datetime.date(2015, 1, 1),   # New Years Day
-            datetime.date(2015, 1, 19),  # Martin Luther King Day
-            datetime.date(2015, 4, 4),   # Easter Saturday
-            datetime.date(2015, 4, 5),   # Easter Sunday
-            datetime.date(2015, 5, 24),  # Memorial Sunday
-            datetime.date(2015, 5, 25),  # Memorial Day
-            datetime.date(2015, 7, 3),   # Independence Pre-day
-            datetime.date(2015, 7, 4),   # Independence Day
-            datetime.date(2015, 7, 5),   # Independence Post-day
-            datetime.date(2015, 9, 7),   # Labor Day
-            datetime.date(2015, 11, 26), # Thanksgiving Day
-            datetime.date(2015, 11, 27), # Thanksgiving Post-day
-            datetime.date(2015, 11, 28), # Thanksgiving Post-post-day
-            datetime.date(2015, 12, 24), # Christmas Eve
-            datetime.date(2015, 12, 25), # Christmas Day
-            datetime.date(2015, 12, 26), # Christmas Post-day
-            datetime.date(2015, 12, 31), # New Years Eve
-        }
-        
-        is_holiday = 1 if date in holidays_2015 else 0
+        holiday = calendar.is_holiday(date)
         
         return {
             "success": True,
@@ -232,7 +575,7 @@ async def extract_time_features_api(
                 "weekday": int(weekday),
                 "hour": int(hour),
                 "date": str(date),
-                "holiday": is_holiday
+                "holiday": holiday
             },
             "original_datetime": datetime_str
         }
@@ -258,10 +601,12 @@ class PredictRequest(BaseModel):
     startTime: str
     city: Optional[str] = "new_york"
     model_name: Optional[str] = "XGBoost"
+    mode: Optional[str] = None
 
 
 @app.post("/predict")
 async def predict_trip_duration(
+    request: Request,
     # allow either a JSON body (new frontend) or legacy query params
     payload: Optional[PredictRequest] = Body(None),
     start_lat: Optional[float] = None,
@@ -270,6 +615,7 @@ async def predict_trip_duration(
     end_lng: Optional[float] = None,
     datetime_str: Optional[str] = None,
     model_name: str = "XGBoost",
+    mode: Optional[str] = None,
 ):
     """
     Predict trip duration using trained ML models.
@@ -278,7 +624,27 @@ async def predict_trip_duration(
     - JSON body matching the frontend (from, to, startTime, city)
     - Legacy query params (start_lat, start_lng, end_lat, end_lng, datetime_str)
     Returns a simple top-level JSON with minutes, confidence and distance_km.
+    When inference is overloaded the answer comes from the distance heuristic
+    and carries "degraded": true.
+
+    mode (body or query, default config.SERVING['prediction_mode']) selects
+    'model' or 'table': table mode answers from the median duration of the
+    trip's origin/destination cells and hour of week in the OD duration table,
+    and uses the model when that cell pair has too few training trips, the
+    trip is on a holiday or no table has been built. "source" tells which
+    answered: model, od_table or fallback.
+
+    The response is JSON only (Arrow is offered by /predict/batch); an Accept
+    header that excludes JSON gets 406.
     """
+    # Time between the request arriving and FastAPI handing us the parsed body
+    started = getattr(request.state, "started", None)
+    if started is not None:
+        PREDICT_STAGE_LATENCY.observe(time.perf_counter() - started, stage="request_parsing")
+    response_media_type(request)
+
+    # Pin the published model set for the whole request
+    model_set = model_holder.current
     try:
         # If payload provided (frontend JSON), extract values
         if payload is not None:
@@ -288,50 +654,87 @@ async def predict_trip_duration(
             end_lng = payload.to.lon
             datetime_str = payload.startTime
             model_name = payload.model_name or model_name
+            mode = payload.mode or mode
             city = payload.city or "new_york"
 
         # Basic validation
         if any(v is None for v in [start_lat, start_lng, end_lat, end_lng, datetime_str]):
             raise HTTPException(status_code=400, detail="Missing required trip parameters")
 
+        city = payload.city if payload is not None else (locals().get('city', None) or "unknown")
+
+        mode = mode or config.SERVING['prediction_mode']
+        if mode not in PREDICTION_MODES:
+            raise HTTPException(status_code=400, detail=f"Unknown mode '{mode}'; expected one of {list(PREDICTION_MODES)}")
+
+        # Table mode: well-observed cell pairs are answered by their median duration
+        table = od_table
+        if mode == "table" and table is not None:
+            with PREDICT_STAGE_LATENCY.labels(stage="od_table").time():
+                median_s, result = od_table_lookup(table, start_lat, start_lng, end_lat, end_lng, datetime_str)
+            PREDICT_OD_TABLE.inc(result=result)
+            if median_s is not None:
+                return FastJSONResponse(prediction_response(
+                    median_s / 60.0, trip_distance_km(start_lat, start_lng, end_lat, end_lng),
+                    model_name, city, model_set.version, source="od_table"
+                ))
+
+        # Repeat trips (same cells, hour of week and model) are answered from the cache
+        served = model_set.get(model_name)
+        cache_key = None
+        if prediction_cache is not None and served is not None:
+            cache_key = prediction_cache_key(
+                model_name, model_set.version, start_lat, start_lng, end_lat, end_lng, datetime_str
+            )
+            cached = prediction_cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                return FastJSONResponse(prediction_response(cached[0], cached[1], model_name, city, model_set.version))
+
         # Try using trained model if available
         minutes = None
-        distance_km = None
+        distance_km = trip_distance_km(start_lat, start_lng, end_lat, end_lng)
 
-        # compute distance using existing helper (euclidean) -> returns METERS; convert to KM
-        try:
-            distance_m = float(calc_distance(pd.DataFrame({
-                'start_lat': [start_lat], 'start_lng': [start_lng], 'end_lat': [end_lat], 'end_lng': [end_lng]
-            }), method='euclidean')[0])
-            distance_km = distance_m / 1000.0
-        except Exception:
-            distance_km = None
+        # Overloaded: answer from the distance heuristic rather than queue (see load_shedder)
+        degraded_reason = None
+        if served is not None:
+            admitted, degraded_reason = load_shedder.admit() if load_shedder is not None else (True, None)
+            if admitted:
+                started = time.perf_counter()
+                try:
+                    minutes = await infer_trip_minutes(
+                        served, (start_lat, start_lng, end_lat, end_lng, datetime_str)
+                    )
+                except HTTPException as e:
+                    if load_shedder is None or e.status_code not in (503, 504):
+                        raise
+                    degraded_reason = "saturated" if e.status_code == 503 else "timeout"
+                    # Rejections (503) never ran; only timeouts say anything about latency
+                    if e.status_code == 504:
+                        load_shedder.record_timeout(time.perf_counter() - started)
+                else:
+                    if load_shedder is not None:
+                        load_shedder.record(time.perf_counter() - started)
 
-        if trained_models and model_name in trained_models:
-            model = trained_models[model_name]
-            features = await create_feature_vector(start_lat, start_lng, end_lat, end_lng, datetime_str)
-            try:
-                pred = model.predict([features])[0]
-                minutes = float(pred) / 60.0
-            except Exception:
-                minutes = None
+        if minutes is not None and cache_key is not None:
+            prediction_cache.set(cache_key, (minutes, distance_km))
+
+        if degraded_reason is not None:
+            PREDICT_DEGRADED.inc(reason=degraded_reason)
+            minutes = fallback_minutes(distance_km or 0.0)
+            return FastJSONResponse(prediction_response(
+                minutes, distance_km, model_name, city, model_set.version, degraded=True, source="fallback"
+            ))
 
         # Fallback estimate if model not available or failed
+        source = "model"
         if minutes is None:
+            reason = "model_error" if served is not None else "no_model"
+            PREDICT_FALLBACKS.inc(reason=reason)
             # Use computed distance_km if available, otherwise 0
-            km = distance_km or 0.0
-            base_speed = 25.0
-            minutes = max(5.0, (km / base_speed) * 60.0)
-
-        response = {
-            "minutes": round(minutes, 1),
-            "confidence": 0.75,
-            "model_version": model_name,
-            "distance_km": round(distance_km or 0.0, 1),
-            "city": payload.city if payload is not None else (locals().get('city', None) or "unknown")
-        }
+            minutes = fallback_minutes(distance_km or 0.0)
+            source = "fallback"
 
-        return response
+        return FastJSONResponse(prediction_response(minutes, distance_km, model_name, city, model_set.version, source=source))
 
     except HTTPException:
         raise
@@ -339,24 +742,114 @@ async def predict_trip_duration(
         logging.error(f"Prediction error: {e}")
         raise HTTPException(status_code=500, detail=f"Prediction failed: {e}")
 
-async def create_feature_vector(start_lat, start_lng, end_lat, end_lng, datetime_str):
+def prediction_response(minutes, distance_km, model_name, city, model_set_version, degraded=False, source="model"):
+    """
+    Top-level JSON returned by /predict.
+
+    model_version is the name of the model asked for, as before model sets
+    were versioned; model_set_version is the version of the model set the
+    request was pinned to; degraded marks heuristic answers under overload;
+    source is what answered (model, od_table or fallback).
+    """
+    return {
+        "minutes": round(minutes, 1),
+        "confidence": 0.75,
+        "model_name": model_name,
+        "model_version": model_name,
+        "model_set_version": model_set_version,
+        "distance_km": round(distance_km or 0.0, 1),
+        "city": city,
+        "degraded": degraded,
+        "source": source
+    }
+
+async def infer_trip_minutes(served, trip):
+    """
+    Score one trip on the inference pool, coalesced with concurrent requests when batching is on.
+
+    Raises:
+        HTTPException: 503 when the pool is saturated, 504 when inference times out
+    """
+    if prediction_batcher is not None:
+        # Batches are keyed by name and never mix ServedModel objects of different versions
+        return await guard_pool(prediction_batcher.submit(served.name, served, trip), inference_executor)
+    return await run_blocking(inference_executor, predict_with_model, served, *trip)
+
+def response_media_type(request, columnar=False):
+    """
+    Media type of the response negotiated from the Accept header.
+
+    Only the batch endpoints are columnar (Arrow); single-trip endpoints
+    answer in JSON and reject an Accept header that excludes it.
+
+    Raises:
+        HTTPException: 406 when the client accepts none of the offered types
+    """
+    offered = offered_media_types(columnar=columnar)
+    media_type = negotiate(request.headers.get("accept"), offered)
+    if media_type is None:
+        raise HTTPException(status_code=406, detail=f"Supported response formats: {', '.join(offered)}")
+    return media_type
+
+def trip_distance_km(start_lat, start_lng, end_lat, end_lng):
+    """Euclidean trip distance in km from the scalar fast path, or None if it fails"""
+    try:
+        with PREDICT_STAGE_LATENCY.labels(stage="distance_features").time():
+            _, distance_m = calc_distance_fast(start_lat, start_lng, end_lat, end_lng)
+        return distance_m / 1000.0
+    except Exception:
+        return None
+
+def trip_hour_of_week(datetime_str):
+    """(hour of week, holiday flag) of a trip start time, or None if it cannot be parsed"""
+    try:
+        dt = datetime.fromisoformat(datetime_str)
+    except ValueError:
+        try:
+            dt = pd.Timestamp(datetime_str)
+        except Exception:
+            return None
+    return dt.weekday() * 24 + dt.hour, holiday_calendar.is_holiday(dt.date())
+
+def prediction_cache_key(model_name, model_version, start_lat, start_lng, end_lat, end_lng, datetime_str):
+    """Prediction cache key for a trip, or None if the start time cannot be parsed"""
+    trip_time = trip_hour_of_week(datetime_str)
+    if trip_time is None:
+        return None
+    return prediction_cache.key(model_name, model_version, start_lat, start_lng, end_lat, end_lng, *trip_time)
+
+def od_table_lookup(table, start_lat, start_lng, end_lat, end_lng, datetime_str):
+    """
+    Median duration of a trip from the OD duration table.
+
+    Returns:
+        tuple: (median seconds or None, result) with result 'hit', 'sparse'
+               (fewer than od_table_min_count trips), 'holiday' or 'invalid_time'
+    """
+    trip_time = trip_hour_of_week(datetime_str)
+    if trip_time is None:
+        return None, "invalid_time"
+    hour_of_week, holiday = trip_time
+    if holiday:
+        # Holidays are left out of the table
+        return None, "holiday"
+    median_s, count = table.lookup_one(start_lat, start_lng, end_lat, end_lng, hour_of_week)
+    if count < config.SERVING['od_table_min_count']:
+        return None, "sparse"
+    return median_s, "hit"
+
+def create_feature_vector(start_lat, start_lng, end_lat, end_lng, datetime_str):
     """Create a feature vector for prediction"""
     try:
         # Calculate distances
-        df = pd.DataFrame({
-            'start_lat': [start_lat],
-            'start_lng': [start_lng],
-            'end_lat': [end_lat],
-            'end_lng': [end_lng]
-        })
-        
-        manhattan_dist = calc_distance(df, method='manhattan')[0]
-        euclidean_dist = calc_distance(df, method='euclidean')[0]
+        with PREDICT_STAGE_LATENCY.labels(stage="distance_features").time():
+            manhattan_dist, euclidean_dist = calc_distance_fast(start_lat, start_lng, end_lat, end_lng)
         
         # Extract time features
-        dt = pd.to_datetime(datetime_str)
-        weekday = dt.weekday() + 1
-        hour = dt.hour
+        with PREDICT_STAGE_LATENCY.labels(stage="time_features").time():
+            dt = pd.to_datetime(datetime_str)
+            weekday = dt.weekday() + 1
+            hour = dt.hour
         
         # Create feature vector (simplified - you may need to adjust based on your model's expected features)
         features = [
@@ -372,83 +865,701 @@ async def create_feature_vector(start_lat, start_lng, end_lat, end_lng, datetime
         logging.error(f"Feature vector creation error: {e}")
         raise HTTPException(status_code=500, detail=f"Feature vector creation failed: {e}")
 
+def create_plan_features(plan, start_lat, start_lng, end_lat, end_lng, datetime_str):
+    """Build the (1, n_features) matrix for one trip with a model's feature plan"""
+    try:
+        with PREDICT_STAGE_LATENCY.labels(stage="feature_plan").time():
+            dt = pd.Timestamp(datetime_str)
+            if dt.tzinfo is not None:
+                dt = dt.tz_localize(None)
+            return plan.transform(start_lat, start_lng, end_lat, end_lng, [dt.to_datetime64()])
+    except Exception as e:
+        logging.error(f"Feature vector creation error: {e}")
+        raise HTTPException(status_code=500, detail=f"Feature vector creation failed: {e}")
+
+def predict_with_model(served, start_lat, start_lng, end_lat, end_lng, datetime_str):
+    """Build the feature vector and predict minutes; returns None if the model fails"""
+    if served.plan is not None:
+        features = create_plan_features(served.plan, start_lat, start_lng, end_lat, end_lng, datetime_str)
+    else:
+        features = [create_feature_vector(start_lat, start_lng, end_lat, end_lng, datetime_str)]
+    try:
+        with PREDICT_STAGE_LATENCY.labels(stage="model_inference").time():
+            pred = model_predict(served, features)[0]
+        return float(pred) / 60.0
+    except Exception:
+        return None
+
+def predict_coalesced(served, trips):
+    """
+    Score coalesced single-trip requests with one model.predict call.
+
+    Args:
+        served: ServedModel shared by all trips
+        trips: List of (start_lat, start_lng, end_lat, end_lng, datetime_str) tuples
+
+    Returns:
+        list: Minutes per trip (None if the model failed), or an HTTPException
+              for trips whose start time could not be parsed
+    """
+    trips_df = pd.DataFrame(trips, columns=['start_lat', 'start_lng', 'end_lat', 'end_lng', 'datetime_str'])
+    with PREDICT_STAGE_LATENCY.labels(stage="time_features").time():
+        trips_df['datetime'] = parse_trip_datetimes(trips_df['datetime_str'])
+
+    results: List[Any] = [None] * len(trips)
+    bad_time = trips_df['datetime'].isna().to_numpy()
+    for pos in np.flatnonzero(bad_time):
+        results[pos] = HTTPException(
+            status_code=500,
+            detail=f"Feature vector creation failed: invalid datetime '{trips[pos][4]}'"
+        )
+
+    good = np.flatnonzero(~bad_time)
+    if len(good):
+        features = model_features(served, trips_df.iloc[good])
+        try:
+            with PREDICT_STAGE_LATENCY.labels(stage="model_inference").time():
+                preds = np.ravel(model_predict(served, features))
+            for pos, pred in zip(good, preds):
+                results[pos] = float(pred) / 60.0
+        except Exception as e:
+            logging.warning(f"Coalesced prediction failed, using fallback: {e}")
+
+    return results
+
+def fallback_minutes(distance_km):
+    """Distance heuristic used when no trained model can answer (25 km/h, min 5 minutes)"""
+    base_speed = 25.0
+    return max(5.0, (distance_km / base_speed) * 60.0)
+
+def parse_trip_datetimes(datetime_strs):
+    """
+    Parse trip start times in one vectorized pass.
+
+    Falls back to parsing item by item when the batch mixes formats or
+    timezones, so a single bad value only invalidates its own row.
+
+    Returns:
+        pd.Series of naive timestamps (NaT where parsing failed)
+    """
+    series = pd.Series(datetime_strs, dtype=object)
+    try:
+        parsed = pd.to_datetime(series, errors='coerce')
+        if getattr(parsed.dt, 'tz', None) is not None:
+            parsed = parsed.dt.tz_localize(None)
+        if not parsed.isna().any():
+            return parsed
+    except Exception:
+        parsed = pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns]')
+
+    values = []
+    for value, ts in zip(series, parsed):
+        if not pd.isna(ts):
+            values.append(ts)
+            continue
+        try:
+            ts = pd.Timestamp(value)
+            values.append(ts.tz_localize(None) if ts.tzinfo is not None else ts)
+        except Exception:
+            values.append(pd.NaT)
+    return pd.Series(pd.to_datetime(values), index=series.index)
+
+def create_feature_matrix(trips_df):
+    """
+    Vectorized counterpart of create_feature_vector for many trips.
+
+    Args:
+        trips_df: DataFrame with start_lat, start_lng, end_lat, end_lng and
+                  a parsed 'datetime' column
+
+    Returns:
+        tuple: (feature matrix of shape (n, 14), euclidean distances in meters)
+    """
+    with PREDICT_STAGE_LATENCY.labels(stage="distance_features").time():
+        manhattan_dist, euclidean_dist = calc_distance_fast(
+            trips_df['start_lat'].to_numpy(), trips_df['start_lng'].to_numpy(),
+            trips_df['end_lat'].to_numpy(), trips_df['end_lng'].to_numpy()
+        )
+
+    dt = trips_df['datetime']
+
+    # Same column layout as create_feature_vector
+    features = np.zeros((len(trips_df), 14))
+    features[:, 0] = trips_df['start_lat'].to_numpy()
+    features[:, 1] = trips_df['start_lng'].to_numpy()
+    features[:, 2] = trips_df['end_lat'].to_numpy()
+    features[:, 3] = trips_df['end_lng'].to_numpy()
+    features[:, 4] = manhattan_dist
+    features[:, 5] = euclidean_dist
+    features[:, 6] = dt.dt.weekday.to_numpy() + 1
+    features[:, 7] = dt.dt.hour.to_numpy()
+
+    return features, euclidean_dist
+
+def predict_trips(trips_df, model_set):
+    """
+    Score a frame of validated trips, one model.predict call per model.
+
+    Args:
+        trips_df: DataFrame from create_feature_matrix input plus a 'model_name' column
+        model_set: ModelSet pinned by the request
+
+    Returns:
+        tuple: (minutes array, distance_km array)
+    """
+    features, euclidean_dist = create_feature_matrix(trips_df)
+    distance_km = euclidean_dist / 1000.0
+    minutes = np.full(len(trips_df), np.nan)
+
+    model_names = trips_df['model_name'].to_numpy()
+    for model_name in pd.unique(model_names):
+        served = model_set.get(model_name)
+        if served is None:
+            continue
+        rows = np.flatnonzero(model_names == model_name)
+        try:
+            model_rows = model_features(served, trips_df.iloc[rows], features[rows])
+            with PREDICT_STAGE_LATENCY.labels(stage="model_inference").time():
+                preds = np.ravel(model_predict(served, model_rows))
+            minutes[rows] = preds.astype(float) / 60.0
+        except Exception as e:
+            logging.warning(f"Batch prediction with {model_name} failed, using fallback: {e}")
+
+    # Fallback estimate wherever no model answered
+    missing = np.isnan(minutes)
+    if missing.any():
+        minutes[missing] = np.maximum(5.0, distance_km[missing] / 25.0 * 60.0)
+
+    return minutes, distance_km
+
+prediction_batcher = MicroBatcher(
+    inference_executor,
+    predict_coalesced,
+    max_batch_size=config.SERVING['batch_max_size'],
+    min_window_s=config.SERVING['batch_min_window_ms'] / 1000.0,
+    max_window_s=config.SERVING['batch_max_window_ms'] / 1000.0
+) if config.SERVING['batching_enabled'] else None
+
+# Shed on requests waiting in micro-batches, not on the batches queued for workers
+if load_shedder is not None:
+    load_shedder.batcher = prediction_batcher
+
+def collect_serving_metrics():
+    """Expose executor, batching, weather and cache stats as Prometheus families"""
+    families = []
+    executors = [io_executor, inference_executor]
+    families.append(("gopredict_executor_queue_depth", "gauge", "Tasks waiting for a worker",
+                     [({"pool": e.name}, e.queued) for e in executors]))
+    families.append(("gopredict_executor_running", "gauge", "Tasks currently running",
+                     [({"pool": e.name}, e.running) for e in executors]))
+    families.append(("gopredict_executor_rejected_total", "counter", "Tasks rejected because the pool was saturated",
+                     [({"pool": e.name}, e.rejected) for e in executors]))
+    families.append(("gopredict_executor_timeouts_total", "counter", "Tasks that exceeded their timeout",
+                     [({"pool": e.name}, e.timeouts) for e in executors]))
+    families.append(("gopredict_executor_wait_seconds", "histogram", "Time tasks waited for a worker",
+                     [({"pool": e.name}, e.wait_time) for e in executors]))
+    families.append(("gopredict_executor_run_seconds", "histogram", "Time tasks ran on a worker",
+                     [({"pool": e.name}, e.run_time) for e in executors]))
+
+    if prediction_batcher is not None:
+        families.append(("gopredict_batch_size", "histogram", "Requests coalesced per model.predict call",
+                         [({}, prediction_batcher.batch_size)]))
+        families.append(("gopredict_batch_added_latency_seconds", "histogram", "Time requests waited to be batched",
+                         [({}, prediction_batcher.added_latency)]))
+
+    weather = weather_lookup.stats()
+    families.append(("gopredict_weather_lookups_total", "counter", "Weather lookups by serving tier",
+                     [({"tier": "table"}, weather['table_hits']), ({"tier": "cache"}, weather['cache_hits']),
+                      ({"tier": "fetch"}, weather['fetches']), ({"tier": "coalesced"}, weather['coalesced_fetches']),
+                      ({"tier": "offline_miss"}, weather['offline_misses'])]))
+    families.append(("gopredict_weather_fetch_seconds", "histogram", "Meteostat fetch latency",
+                     [({}, weather_lookup.fetch_latency)]))
+
+    memory = process_memory()
+    for key, help_text in (('rss_bytes', 'Resident set size of this worker'),
+                           ('uss_bytes', 'Unique set size (memory private to this worker)'),
+                           ('pss_bytes', 'Proportional set size of this worker')):
+        if memory[key] is not None:
+            families.append((f"gopredict_process_{key}", "gauge", help_text, [({}, memory[key])]))
+
+    if prediction_cache is not None:
+        cache_stats = prediction_cache.stats()
+        families.append(("gopredict_prediction_cache_lookups_total", "counter", "Prediction cache lookups by result",
+                         [({"result": "hit"}, cache_stats['hits']), ({"result": "miss"}, cache_stats['misses'])]))
+        families.append(("gopredict_prediction_cache_entries", "gauge", "Cached predictions",
+                         [({}, cache_stats['size'])]))
+    return families
+
+metrics.register_collector(collect_serving_metrics)
+
+@app.post("/predict/batch")
+async def predict_trip_duration_batch(request: Request, trips: List[Any] = Body(...)):
+    """
+    Predict trip durations for many trips in one call.
+
+    Each item has the same shape as the /predict JSON body. Invalid items are
+    reported individually and do not fail the rest of the batch.
+
+    The response format follows the Accept header: JSON (default) or, with
+    Accept: application/vnd.apache.arrow.stream, an Arrow IPC stream with one
+    row per trip (columns index, success, minutes, confidence, model_name,
+    model_version, model_set_version, distance_km, city, error; count, errors
+    and model_set_version also in the schema metadata), carrying the same
+    fields as the JSON body. As in /predict, model_version is the model name
+    and model_set_version the version of the model set that answered.
+
+    Args:
+        trips: List of trip objects (from, to, startTime, city, model_name)
+
+    Returns:
+        Results in input order; each item carries either a prediction or an error
+    """
+    media_type = response_media_type(request, columnar=True)
+
+    # Pin the published model set for the whole request
+    model_set = model_holder.current
+    try:
+        n = len(trips)
+        success = np.zeros(n, dtype=bool)
+        minutes = np.full(n, np.nan)
+        distance_km = np.full(n, np.nan)
+        model_name: List[Optional[str]] = [None] * n
+        city: List[Optional[str]] = [None] * n
+        error: List[Optional[str]] = [None] * n
+        valid_index = []
+        valid_trips = []
+
+        for i, item in enumerate(trips):
+            try:
+                valid_trips.append(PredictRequest.model_validate(item))
+                valid_index.append(i)
+            except ValidationError as e:
+                error[i] = "; ".join(
+                    f"{'.'.join(str(p) for p in err['loc']) or 'body'}: {err['msg']}"
+                    for err in e.errors()
+                )
+
+        if valid_trips:
+            trips_df = pd.DataFrame({
+                'start_lat': [t.from_.lat for t in valid_trips],
+                'start_lng': [t.from_.lon for t in valid_trips],
+                'end_lat': [t.to.lat for t in valid_trips],
+                'end_lng': [t.to.lon for t in valid_trips],
+                'model_name': [t.model_name or "XGBoost" for t in valid_trips],
+            })
+            trips_df['datetime'] = parse_trip_datetimes([t.startTime for t in valid_trips])
+
+            bad_time = trips_df['datetime'].isna().to_numpy()
+            for pos in np.flatnonzero(bad_time):
+                error[valid_index[pos]] = f"startTime: invalid datetime '{valid_trips[pos].startTime}'"
+
+            good = np.flatnonzero(~bad_time)
+            if len(good):
+                good_minutes, good_distance = await run_blocking(
+                    inference_executor, predict_trips, trips_df.iloc[good].reset_index(drop=True), model_set
+                )
+                rows = np.asarray(valid_index)[good]
+                success[rows] = True
+                # round() per value, as /predict does, so both endpoints agree exactly
+                minutes[rows] = [round(m, 1) for m in np.asarray(good_minutes, dtype=float).tolist()]
+                distance_km[rows] = [round(d, 1) for d in np.asarray(good_distance, dtype=float).tolist()]
+                for pos, i in zip(good, rows):
+                    trip = valid_trips[pos]
+                    model_name[i] = trip.model_name or "XGBoost"
+                    city[i] = trip.city or "new_york"
+
+        errors = int(n - success.sum())
+        if media_type == ARROW_MEDIA_TYPE:
+            return ArrowResponse({
+                "index": np.arange(n),
+                "success": success,
+                "minutes": minutes,
+                "confidence": np.where(success, 0.75, np.nan),
+                "model_name": model_name,
+                "model_version": model_name,
+                # Null for failed trips, which carry no model_set_version in JSON either
+                "model_set_version": [model_set.version if ok else None for ok in success.tolist()],
+                "distance_km": distance_km,
+                "city": city,
+                "error": error
+            }, metadata={"count": n, "errors": errors, "model_set_version": model_set.version})
+
+        results = []
+        for i, ok, trip_minutes, trip_distance in zip(
+                range(n), success.tolist(), minutes.tolist(), distance_km.tolist()):
+            if ok:
+                results.append({
+                    "index": i,
+                    "success": True,
+                    "minutes": trip_minutes,
+                    "confidence": 0.75,
+                    "model_name": model_name[i],
+                    "model_version": model_name[i],
+                    "model_set_version": model_set.version,
+                    "distance_km": trip_distance,
+                    "city": city[i]
+                })
+            else:
+                results.append({"index": i, "success": False, "error": error[i]})
+
+        return FastJSONResponse({
+            "success": True,
+            "count": n,
+            "errors": errors,
+            "model_set_version": model_set.version,
+            "results": results
+        })
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Batch prediction error: {e}")
+        raise HTTPException(status_code=500, detail=f"Batch prediction failed: {e}")
+
+# ===============================
+# BULK SCORING ENDPOINTS
+# ===============================
+
+# Columns of data/raw/test.csv used for scoring (row_id is optional)
+BULK_COLUMNS = ['start_lat', 'start_lng', 'end_lat', 'end_lng', 'datetime']
+CSV_CONTENT_TYPES = ("text/csv", "application/csv")
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+def bulk_row_ids(row_ids):
+    """
+    row_id column of a chunk as JSON-safe Python values.
+
+    A record without row_id (e.g. an NDJSON line that failed to parse) makes
+    pandas store the column as float64, so whole-number ids are turned back
+    into integers and missing ids become None instead of NaN.
+    """
+    if pd.api.types.is_float_dtype(row_ids):
+        present = row_ids.dropna()
+        if (present == np.floor(present)).all():
+            row_ids = row_ids.astype('Int64')
+    return [None if value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value)) else value
+            for value in row_ids.astype(object).tolist()]
+
+def score_trip_chunk(chunk, model_name, model_set, row_offset, output_format):
+    """
+    Validate, featurize, score and encode one chunk of a bulk request.
+
+    Args:
+        chunk: DataFrame with the data/raw/test.csv columns; an optional
+               '_error' column marks rows that could not be parsed
+        model_name: Model used for every row
+        model_set: ModelSet pinned by the request
+        row_offset: Position of the chunk's first row in the whole input
+        output_format: 'ndjson' or 'csv'
+
+    Returns:
+        tuple: (encoded rows as bytes, row count, rows with errors)
+    """
+    n = len(chunk)
+    chunk = chunk.reset_index(drop=True)
+    if 'row_id' in chunk:
+        ids = bulk_row_ids(chunk['row_id'])
+    else:
+        ids = list(range(row_offset, row_offset + n))
+
+    trips_df = pd.DataFrame({
+        column: pd.to_numeric(chunk[column], errors='coerce') if column in chunk else np.nan
+        for column in BULK_COLUMNS[:4]
+    }, index=chunk.index)
+    if 'datetime' in chunk:
+        trips_df['datetime'] = parse_trip_datetimes(chunk['datetime'].tolist())
+    else:
+        trips_df['datetime'] = pd.NaT
+
+    errors = np.full(n, None, dtype=object)
+    bad_coords = trips_df[BULK_COLUMNS[:4]].isna().any(axis=1).to_numpy()
+    errors[bad_coords] = "invalid coordinates"
+    errors[~bad_coords & trips_df['datetime'].isna().to_numpy()] = "invalid datetime"
+    if '_error' in chunk:
+        parse_errors = chunk['_error'].notna().to_numpy()
+        errors[parse_errors] = chunk['_error'][parse_errors].to_numpy()
+
+    minutes = np.full(n, np.nan)
+    distance_km = np.full(n, np.nan)
+    good = np.array([e is None for e in errors], dtype=bool)
+    if good.any():
+        good_trips = trips_df[good].reset_index(drop=True)
+        good_trips['model_name'] = model_name
+        minutes[good], distance_km[good] = predict_trips(good_trips, model_set)
+
+    minutes = np.round(minutes, 1)
+    distance_km = np.round(distance_km, 1)
+    if output_format == "csv":
+        out = pd.DataFrame({'row_id': pd.Series(ids, dtype=object), 'minutes': minutes, 'distance_km': distance_km, 'error': errors})
+        body = out.to_csv(index=False, header=False)
+    else:
+        lines = []
+        for i in range(n):
+            if errors[i] is None:
+                record = {"row_id": ids[i], "minutes": float(minutes[i]), "distance_km": float(distance_km[i])}
+            else:
+                record = {"row_id": ids[i], "error": errors[i]}
+            lines.append(json.dumps(record, allow_nan=False))
+        body = "\n".join(lines) + "\n" if lines else ""
+
+    return body.encode(), n, int(n - good.sum())
+
+def open_csv_chunks(file, chunk_size):
+    """Chunked pandas reader over an uploaded CSV file"""
+    return pd.read_csv(file, chunksize=chunk_size)
+
+async def iter_csv_chunks(file, chunk_size):
+    """Yield DataFrames of at most chunk_size rows, reading the file on the I/O pool"""
+    reader = await run_blocking(io_executor, open_csv_chunks, file, chunk_size)
+    while True:
+        chunk = await run_blocking(io_executor, next, reader, None)
+        if chunk is None:
+            return
+        yield chunk
+
+def parse_ndjson_line(line):
+    """Decode one NDJSON record, marking undecodable lines with an '_error' field"""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return {'_error': "invalid JSON"}
+    return record if isinstance(record, dict) else {'_error': "expected a JSON object"}
+
+async def iter_ndjson_chunks(stream, chunk_size):
+    """Yield DataFrames of at most chunk_size records while the body is still arriving"""
+    records = []
+    buffer = b""
+    async for data in stream:
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                records.append(parse_ndjson_line(line))
+            if len(records) >= chunk_size:
+                yield pd.DataFrame.from_records(records)
+                records = []
+    if buffer.strip():
+        records.append(parse_ndjson_line(buffer))
+    if records:
+        yield pd.DataFrame.from_records(records)
+
+@app.post("/predict/bulk")
+async def predict_trip_duration_bulk(
+    request: Request,
+    model_name: str = "XGBoost",
+    output_format: str = Query("ndjson", alias="format"),
+    chunk_size: int = Query(config.SERVING['bulk_chunk_size'], ge=1, le=1000000)
+):
+    """
+    Score a large trip file in fixed-size chunks and stream the results.
+
+    Accepts a multipart upload (field 'file') or a text/csv body with the
+    data/raw/test.csv columns, or an application/x-ndjson body with one
+    object per line using the same keys. Rows are read, featurized and
+    scored chunk by chunk, so memory is bounded by chunk_size rather than
+    the file size, and each chunk is streamed back as soon as it finishes.
+
+    The response ends with a summary: an NDJSON {"summary": {...}} line, or
+    for CSV a trailing '# ' comment line (pandas: read_csv(comment='#')),
+    reporting rows, errors, the model set version and rows per second.
+
+    Args:
+        model_name: Model used for every row
+        output_format: 'ndjson' (default) or 'csv'
+        chunk_size: Rows per chunk
+
+    Returns:
+        Streaming NDJSON or CSV with row_id, minutes, distance_km and error
+    """
+    if output_format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+
+    # Every chunk of the stream is scored with the model set published when it started
+    model_set = model_holder.current
+
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    # File object the CSV is read from; closed synchronously (UploadFile.close is a coroutine)
+    upload = None
+    try:
+        if content_type == "multipart/form-data":
+            form = await request.form()
+            form_file = form.get("file")
+            if not hasattr(form_file, "file"):
+                raise HTTPException(status_code=400, detail="multipart upload needs a 'file' field")
+            upload = form_file.file
+            chunks = iter_csv_chunks(upload, chunk_size)
+        elif content_type in CSV_CONTENT_TYPES:
+            # Spool the body to disk past 8 MB so large uploads do not sit in memory
+            upload = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+            async for data in request.stream():
+                upload.write(data)
+            upload.seek(0)
+            chunks = iter_csv_chunks(upload, chunk_size)
+        elif content_type in NDJSON_CONTENT_TYPES:
+            chunks = iter_ndjson_chunks(request.stream(), chunk_size)
+        else:
+            raise HTTPException(
+                status_code=415,
+                detail="Send a multipart CSV upload, a text/csv body or an application/x-ndjson body"
+            )
+
+        # Read the first chunk up front so malformed input fails with a 400, not mid-stream
+        try:
+            first_chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            first_chunk = None
+        except pd.errors.ParserError as e:
+            raise HTTPException(status_code=400, detail=f"Could not parse CSV: {e}")
+        except pd.errors.EmptyDataError:
+            first_chunk = None
+        if first_chunk is not None and content_type not in NDJSON_CONTENT_TYPES:
+            missing = [c for c in BULK_COLUMNS if c not in first_chunk.columns]
+            if missing:
+                raise HTTPException(status_code=400, detail=f"CSV is missing columns: {missing}")
+
+    except HTTPException:
+        if upload is not None:
+            upload.close()
+        raise
+    except Exception as e:
+        if upload is not None:
+            upload.close()
+        logging.error(f"Bulk prediction error: {e}")
+        raise HTTPException(status_code=500, detail=f"Bulk prediction failed: {e}")
+
+    async def stream_results():
+        started = time.perf_counter()
+        rows = errors = chunk_count = 0
+        chunk = first_chunk
+        try:
+            if output_format == "csv":
+                yield b"row_id,minutes,distance_km,error\n"
+            while chunk is not None:
+                body, n, n_errors = await guard_pool(
+                    inference_executor.run(
+                        score_trip_chunk, chunk, model_name, model_set, rows, output_format,
+                        timeout=config.SERVING['bulk_chunk_timeout_s']
+                    ),
+                    inference_executor
+                )
+                rows += n
+                errors += n_errors
+                chunk_count += 1
+                BULK_ROWS.inc(n - n_errors, result="scored")
+                BULK_ROWS.inc(n_errors, result="error")
+                yield body
+                chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            pass
+        except Exception as e:
+            # Headers are already sent; report the failure in-band and stop
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            logging.error(f"❌ Bulk prediction aborted after {rows} rows: {detail}")
+            if output_format == "csv":
+                yield f"# error: {detail}\n".encode()
+            else:
+                yield (json.dumps({"error": detail, "rows_completed": rows}) + "\n").encode()
+            return
+        finally:
+            if upload is not None:
+                upload.close()
+
+        elapsed = time.perf_counter() - started
+        summary = {
+            "rows": rows,
+            "errors": errors,
+            "chunks": chunk_count,
+            "chunk_size": chunk_size,
+            "model_set_version": model_set.version,
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else None
+        }
+        logging.info(f"✅ Bulk scored {rows} rows in {elapsed:.2f}s ({summary['rows_per_second']} rows/s)")
+        if output_format == "csv":
+            yield ("# " + " ".join(f"{k}={v}" for k, v in summary.items()) + "\n").encode()
+        else:
+            yield (json.dumps({"summary": summary}) + "\n").encode()
+
+    media_type = "text/csv" if output_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(stream_results(), media_type=media_type)
+
 # ===============================
 # MODEL MANAGEMENT ENDPOINTS
 # ===============================
 
 @app.post("/models/train")
 async def train_models(
-    background_tasks: BackgroundTasks,
     models_to_run: List[str] = ["XGBoost", "Random Forest"]
 ):
     """
-    Train ML models in the background.
+    Train ML models in a separate job process.
     
     Args:
         models_to_run: List of models to train
-        background_tasks: FastAPI background tasks
     
     Returns:
-        Training status
+        Training status and the job id to poll on /jobs/{job_id}
     """
-    try:
-        if not pipeline_instance:
-            raise HTTPException(status_code=500, detail="Pipeline not initialized")
-        
-        # Start training in background
-        background_tasks.add_task(train_models_background, models_to_run)
-        
-        return {
-            "success": True,
-            "message": "Model training started in background",
-            "models_to_train": models_to_run
-        }
-    
-    except Exception as e:
-        logging.error(f"Model training initiation error: {e}")
-        raise HTTPException(status_code=500, detail=f"Model training initiation failed: {e}")
-
-async def train_models_background(models_to_run):
-    """Background task for training models"""
-    global trained_models
-    try:
-        logging.info(f"Starting background training for models: {models_to_run}")
-        
-        # Load feature engineered data
-        train_df = pd.read_csv("data/processed/feature_engineered_train.csv")
-        
-        # Train models
-        models = run_regression_models(train_df, models_to_run)
-        trained_models.update(models)
-        
-        logging.info(f"✅ Successfully trained {len(models)} models")
-    
-    except Exception as e:
-        logging.error(f"❌ Background training failed: {e}")
+    return start_job("train", "Model training", models_to_run=models_to_run)
 
 @app.get("/models")
 async def list_models():
     """List all available trained models"""
+    model_set = model_holder.current
+    return {
+        "success": True,
+        "models": model_set.names(),
+        "count": len(model_set),
+        "model_set_version": model_set.version
+    }
+
+@app.get("/models/versions")
+async def list_model_versions():
+    """Current model set, versions retained for rollback and versions still draining"""
+    return {"success": True, **model_holder.versions()}
+
+@app.post("/models/rollback")
+async def rollback_models(version: Optional[int] = None):
+    """
+    Republish a retained previous model set as a new version.
+
+    Requests already in flight finish on the version they pinned.
+
+    Args:
+        version: Version to restore (defaults to the previous one; see /models/versions)
+    """
+    try:
+        model_set = model_holder.rollback(version)
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    logging.info(f"Model set rolled back: v{model_set.version} ({model_set.source})")
+    if prediction_cache is not None:
+        prediction_cache.invalidate()
     return {
         "success": True,
-        "models": list(trained_models.keys()),
-        "count": len(trained_models)
+        "model_set_version": model_set.version,
+        "source": model_set.source,
+        "models": model_set.names()
     }
 
 @app.get("/models/{model_name}")
 async def get_model_info(model_name: str):
     """Get information about a specific model"""
-    if model_name not in trained_models:
+    model_set = model_holder.current
+    served = model_set.get(model_name)
+    if served is None:
         raise HTTPException(status_code=404, detail=f"Model '{model_name}' not found")
     
-    model = trained_models[model_name]
+    model = served.model
     
     return {
         "success": True,
         "model_name": model_name,
         "model_type": type(model).__name__,
+        "model_set_version": served.version,
         "has_feature_names": hasattr(model, 'feature_names_in_'),
-        "feature_names": getattr(model, 'feature_names_in_', None)
+        "feature_names": list(model.feature_names_in_) if hasattr(model, 'feature_names_in_') else None,
+        "feature_plan": served.plan.columns if served.plan is not None else None
     }
 
 # ===============================
@@ -456,66 +1567,15 @@ async def get_model_info(model_name: str):
 # ===============================
 
 @app.post("/data/preprocess")
-async def preprocess_data(background_tasks: BackgroundTasks):
-    """Start data preprocessing in the background"""
-    try:
-        if not pipeline_instance:
-            raise HTTPException(status_code=500, detail="Pipeline not initialized")
-        
-        background_tasks.add_task(preprocess_data_background)
-        
-        return {
-            "success": True,
-            "message": "Data preprocessing started in background"
-        }
-    
-    except Exception as e:
-        logging.error(f"Data preprocessing initiation error: {e}")
-        raise HTTPException(status_code=500, detail=f"Data preprocessing initiation failed: {e}")
-
-async def preprocess_data_background():
-    """Background task for data preprocessing"""
-    try:
-        logging.info("Starting background data preprocessing")
-        
-        # Run preprocessing steps
-        train_df, test_df = pipeline_instance.step1_data_preprocessing()
-        
-        logging.info("✅ Data preprocessing completed")
-    
-    except Exception as e:
-        logging.error(f"❌ Background preprocessing failed: {e}")
+async def preprocess_data(force: bool = Query(False)):
+    """Start data preprocessing in a separate job process (force skips the stage cache)"""
+    return start_job("preprocess", "Data preprocessing", force=force)
 
 @app.post("/data/feature-engineering")
-async def feature_engineering(background_tasks: BackgroundTasks):
-    """Start feature engineering in the background"""
-    try:
-        if not pipeline_instance:
-            raise HTTPException(status_code=500, detail="Pipeline not initialized")
-        
-        background_tasks.add_task(feature_engineering_background)
-        
-        return {
-            "success": True,
-            "message": "Feature engineering started in background"
-        }
-    
-    except Exception as e:
-        logging.error(f"Feature engineering initiation error: {e}")
-        raise HTTPException(status_code=500, detail=f"Feature engineering initiation failed: {e}")
-
-async def feature_engineering_background():
-    """Background task for feature engineering"""
-    try:
-        logging.info("Starting background feature engineering")
-        
-        # Run feature engineering steps
-        train_df, test_df = pipeline_instance.step2_feature_engineering()
-        
-        logging.info("✅ Feature engineering completed")
-    
-    except Exception as e:
-        logging.error(f"❌ Background feature engineering failed: {e}")
+async def feature_engineering(chunk_size: Optional[int] = Query(None, ge=1000), force: bool = Query(False)):
+    """Start feature engineering in a separate job process (chunk_size streams it out of core,
+    force recomputes cached stages)"""
+    return start_job("feature_engineering", "Feature engineering", chunk_size=chunk_size, force=force)
 
 # ===============================
 # PIPELINE ENDPOINTS
@@ -523,43 +1583,76 @@ async def feature_engineering_background():
 
 @app.post("/pipeline/run")
 async def run_complete_pipeline(
-    background_tasks: BackgroundTasks,
-    models_to_run: List[str] = ["XGBoost", "Random Forest"]
+    models_to_run: List[str] = ["XGBoost", "Random Forest"],
+    chunk_size: Optional[int] = Query(None, ge=1000),
+    force: bool = Query(False)
 ):
-    """Run the complete ML pipeline in the background"""
+    """Run the complete ML pipeline in a separate job process (force recomputes cached stages)"""
+    return start_job("pipeline", "Complete pipeline", models_to_run=models_to_run, chunk_size=chunk_size,
+                     force=force)
+
+# ===============================
+# JOB ENDPOINTS
+# ===============================
+
+def start_job(kind, description, **params):
+    """
+    Submit a pipeline job to the job manager.
+
+    Args:
+        kind: Job kind (preprocess, feature_engineering, train, pipeline)
+        description: Human readable job name for the response message
+        **params: Job parameters passed to the child process
+
+    Returns:
+        Job submission response
+    """
     try:
         if not pipeline_instance:
             raise HTTPException(status_code=500, detail="Pipeline not initialized")
-        
-        background_tasks.add_task(run_pipeline_background, models_to_run)
-        
-        return {
+
+        job = job_manager.submit(kind, params)
+        response = {
             "success": True,
-            "message": "Complete pipeline started in background",
-            "models_to_run": models_to_run
+            "message": f"{description} job {job['status']}",
+            "job_id": job['id'],
+            "job": job
         }
-    
-    except Exception as e:
-        logging.error(f"Pipeline initiation error: {e}")
-        raise HTTPException(status_code=500, detail=f"Pipeline initiation failed: {e}")
+        if 'models_to_run' in params:
+            response["models_to_run"] = params['models_to_run']
+        return response
 
-async def run_pipeline_background(models_to_run):
-    """Background task for running complete pipeline"""
-    global trained_models
-    try:
-        logging.info(f"Starting complete pipeline with models: {models_to_run}")
-        
-        # Run complete pipeline
-        results = pipeline_instance.run_complete_pipeline(models_to_run=models_to_run)
-        
-        # Update global models
-        if 'models' in results:
-            trained_models.update(results['models'])
-        
-        logging.info("✅ Complete pipeline finished successfully")
-    
+    except HTTPException:
+        raise
     except Exception as e:
-        logging.error(f"❌ Complete pipeline failed: {e}")
+        logging.error(f"{description} initiation error: {e}")
+        raise HTTPException(status_code=500, detail=f"{description} initiation failed: {e}")
+
+@app.get("/jobs")
+async def list_jobs():
+    """List pipeline jobs with status, stage progress and timing"""
+    jobs = job_manager.list()
+    return {
+        "success": True,
+        "jobs": jobs,
+        "count": len(jobs)
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get the status, current stage and stage timings of a job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return {"success": True, "job": job}
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a queued job or terminate a running one"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return {"success": True, "job": job}
 
 # ===============================
 # HEALTH AND STATUS ENDPOINTS
@@ -572,8 +1665,10 @@ async def health_check():
         "status": "healthy",
         "service": "GoPredict API",
         "version": "1.0.0",
-        "models_loaded": len(trained_models),
-        "pipeline_initialized": pipeline_instance is not None
+        "models_loaded": len(model_holder.current),
+        "model_set_version": model_holder.current.version,
+        "pipeline_initialized": pipeline_instance is not None,
+        "ready": models_ready
     }
 
 
@@ -586,6 +1681,11 @@ async def root_redirect():
         "health": f"{os.environ.get('ROOT_URL', '')}/health" if os.environ.get('ROOT_URL') else "/health"
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics in text exposition format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/status")
 async def get_status():
     """Get detailed status of the API"""
@@ -593,14 +1693,28 @@ async def get_status():
         "success": True,
         "status": {
             "api_version": "1.0.0",
-            "models_available": list(trained_models.keys()),
-            "models_count": len(trained_models),
+            "models_available": model_holder.current.names(),
+            "models_count": len(model_holder.current),
+            "model_versions": model_holder.versions(),
             "pipeline_ready": pipeline_instance is not None,
+            "executors": {
+                io_executor.name: io_executor.stats(),
+                inference_executor.name: inference_executor.stats()
+            },
+            "batching": prediction_batcher.stats() if prediction_batcher is not None else None,
+            "load_shedding": load_shedder.stats() if load_shedder is not None else None,
+            "weather": weather_lookup.stats(),
+            "prediction_cache": prediction_cache.stats() if prediction_cache is not None else None,
+            "prediction_mode": config.SERVING['prediction_mode'],
+            "od_table": od_table.stats() if od_table is not None else None,
+            "jobs": job_manager.stats(),
+            "memory": process_memory(),
+            "models_preloaded": models_preloaded,
             "data_files_exist": {
                 "train_data": os.path.exists("data/raw/train.csv"),
                 "test_data": os.path.exists("data/raw/test.csv"),
-                "feature_train": os.path.exists("data/processed/feature_engineered_train.csv"),
-                "feature_test": os.path.exists("data/processed/feature_engineered_test.csv")
+                "feature_train": pipeline_instance is not None and pipeline_instance.paths['feature_train'].exists(),
+                "feature_test": pipeline_instance is not None and pipeline_instance.paths['feature_test'].exists()
             }
         }
     }
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+API Load Test
+
+Starts the API in a separate uvicorn process (or targets --url), replays
+trips from data/raw/test.csv against /predict (query parameters and JSON
+body), /distance, /weather and /time-features with a weighted request mix,
+and reports throughput and p50/p95/p99 latency per endpoint for each
+concurrency level. Requests are closed-loop: every client sends its next
+request as soon as the previous one returns.
+
+Weather fetches in the started server go to a local stand-in with a fixed
+latency instead of Meteostat, so runs do not depend on the network. Unless
+--saved-models is given, the server scores /predict with a small
+RandomForest on the API's 14-column feature layout (the same model for
+every run) rather than whatever happens to be in saved_models/.
+
+Results are written as JSON. With a baseline file (written earlier with
+--save-baseline on the same machine) every endpoint is compared against it
+and the script exits with 1 when throughput drops or p95/p99 latency grows
+by more than --tolerance.
+
+Usage:
+    python benchmarks/bench_api_load.py --concurrency 1,8,32 --requests 3000
+    python benchmarks/bench_api_load.py --save-baseline
+    python benchmarks/bench_api_load.py --mix predict_json=1 --url http://127.0.0.1:8000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+DEFAULT_MIX = "predict=3,predict_json=3,distance=2,weather=1,time_features=1"
+DEFAULT_OUTPUT = PROJECT_ROOT / "output" / "api_load.json"
+DEFAULT_BASELINE = PROJECT_ROOT / "benchmarks" / "baselines" / "api_load.json"
+MODEL_NAME = "Random Forest"
+
+
+# ===============================
+# SERVER
+# ===============================
+
+class WeatherStandIn:
+    """Replaces the Meteostat fetch: fixed latency, weather derived from the hour"""
+
+    def __init__(self, latency_ms):
+        self.latency_s = latency_ms / 1000.0
+
+    def __call__(self, latitude, longitude, timestamp):
+        time.sleep(self.latency_s)
+        return {
+            'temp': 10.0 + (timestamp.hour % 12),
+            'humidity': 60.0,
+            'wind_speed': 12.0,
+            'visibility': 10.0,
+            'weather_condition_code': 1.0
+        }
+
+
+def install_model(api_main):
+    """Publish a small RandomForest with the API's 14-column feature layout"""
+    from sklearn.ensemble import RandomForestRegressor
+
+    rng = np.random.default_rng(0)
+    X = rng.random((2000, 14))
+    y = rng.random(2000) * 3600
+    models = {MODEL_NAME: RandomForestRegressor(n_estimators=50, random_state=0).fit(X, y)}
+    api_main.publish_models(models, api_main.flatten_tree_models(models))
+
+
+def serve(args):
+    """Run the API with the weather stand-in (child process of the load test)"""
+    import uvicorn
+
+    sys.path.append(str(PROJECT_ROOT))
+    import api.main as api_main
+
+    api_main.weather_lookup.fetch_fn = WeatherStandIn(args.weather_latency_ms)
+    api_main.weather_lookup.offline = False
+    if not args.saved_models:
+        install_model(api_main)
+        # Skip the warm start from saved_models so every run scores the same model
+        api_main.warm_start_models = mark_ready(api_main)
+    uvicorn.run(api_main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def mark_ready(api_main):
+    async def warm_start_models():
+        api_main.models_ready = True
+    return warm_start_models
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args):
+    """Start `serve` in a child process and wait until /health reports ready"""
+    port = free_port()
+    command = [sys.executable, str(Path(__file__).resolve()), "--serve", "--port", str(port),
+               "--weather-latency-ms", str(args.weather_latency_ms)]
+    if args.saved_models:
+        command.append("--saved-models")
+    process = subprocess.Popen(command, cwd=str(PROJECT_ROOT))
+
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{url}/health", timeout=1.0).json().get("ready"):
+                return process, url
+        except (httpx.HTTPError, ValueError):
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"API server not ready after {args.startup_timeout}s")
+
+
+# ===============================
+# REQUESTS
+# ===============================
+
+def load_trips(n_trips):
+    df = pd.read_csv(PROJECT_ROOT / "data" / "raw" / "test.csv", nrows=n_trips)
+    df['timestamp'] = pd.to_datetime(df['datetime']).dt.strftime("%Y-%m-%dT%H:%M:%S")
+    return list(df[['start_lat', 'start_lng', 'end_lat', 'end_lng', 'timestamp']].itertuples(index=False))
+
+
+def predict_request(trip):
+    return "POST", "/predict", {
+        "params": {"start_lat": trip.start_lat, "start_lng": trip.start_lng,
+                   "end_lat": trip.end_lat, "end_lng": trip.end_lng,
+                   "datetime_str": trip.timestamp, "model_name": MODEL_NAME}
+    }
+
+
+def predict_json_request(trip):
+    return "POST", "/predict", {
+        "json": {"from": {"lat": trip.start_lat, "lon": trip.start_lng},
+                 "to": {"lat": trip.end_lat, "lon": trip.end_lng},
+                 "startTime": trip.timestamp, "city": "new_york", "model_name": MODEL_NAME}
+    }
+
+
+def distance_request(trip):
+    return "POST", "/distance", {
+        "params": {"start_lat": trip.start_lat, "start_lng": trip.start_lng,
+                   "end_lat": trip.end_lat, "end_lng": trip.end_lng}
+    }
+
+
+def weather_request(trip):
+    return "GET", "/weather", {
+        "params": {"latitude": trip.start_lat, "longitude": trip.start_lng, "timestamp": trip.timestamp}
+    }
+
+
+def time_features_request(trip):
+    return "POST", "/time-features", {"params": {"datetime_str": trip.timestamp}}
+
+
+REQUEST_BUILDERS = {
+    "predict": predict_request,
+    "predict_json": predict_json_request,
+    "distance": distance_request,
+    "weather": weather_request,
+    "time_features": time_features_request,
+}
+
+
+def parse_mix(mix):
+    """'predict=3,distance=1' -> {'predict': 0.75, 'distance': 0.25}"""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in REQUEST_BUILDERS:
+            raise ValueError(f"Unknown endpoint '{name}' in mix, expected one of {list(REQUEST_BUILDERS)}")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    return {name: weight / total for name, weight in weights.items()}
+
+
+def build_schedule(mix, trips, n_requests, seed):
+    """Reproducible (endpoint, trip) sequence for one run"""
+    rng = np.random.default_rng(seed)
+    names = list(mix)
+    endpoints = rng.choice(len(names), size=n_requests, p=[mix[name] for name in names])
+    rows = rng.integers(0, len(trips), size=n_requests)
+    return [(names[e], trips[r]) for e, r in zip(endpoints, rows)]
+
+
+# ===============================
+# LOAD GENERATION
+# ===============================
+
+async def run_level(url, schedule, concurrency, timeout):
+    """Send the schedule with `concurrency` closed-loop clients"""
+    scheduled = {name for name, _ in schedule}
+    latencies = {name: [] for name in REQUEST_BUILDERS if name in scheduled}
+    errors = {name: 0 for name in latencies}
+    pending = iter(schedule)
+
+    async def client_loop(client):
+        for name, trip in pending:
+            method, path, kwargs = REQUEST_BUILDERS[name](trip)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies[name].append(time.perf_counter() - start)
+            if not ok:
+                errors[name] += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    endpoints = {name: summarize(latencies[name], errors[name], elapsed) for name in latencies}
+    overall = summarize([t for values in latencies.values() for t in values], sum(errors.values()), elapsed)
+    return {"concurrency": concurrency, "duration_s": round(elapsed, 3), "overall": overall, "endpoints": endpoints}
+
+
+def summarize(latencies, errors, elapsed):
+    latencies_ms = np.asarray(latencies) * 1000.0
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99]) if len(latencies_ms) else (0.0, 0.0, 0.0)
+    return {
+        "requests": len(latencies_ms),
+        "errors": errors,
+        "throughput_rps": round(len(latencies_ms) / elapsed, 2),
+        "mean_ms": round(float(latencies_ms.mean()) if len(latencies_ms) else 0.0, 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+    }
+
+
+# ===============================
+# REPORTING
+# ===============================
+
+def print_run(run):
+    print(f"\nConcurrency {run['concurrency']} ({run['duration_s']:.1f}s)")
+    print(f"  {'endpoint':<15}{'requests':>9}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in list(run['endpoints'].items()) + [("overall", run['overall'])]:
+        print(f"  {name:<15}{stats['requests']:>9}{stats['errors']:>8}{stats['throughput_rps']:>10.1f}"
+              f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+
+
+def compare(results, baseline, tolerance):
+    """Print changes against the baseline; returns the list of regressions"""
+    regressions = []
+    previous = {run['concurrency']: run for run in baseline['runs']}
+    print(f"\nComparison with baseline from {baseline.get('created', 'unknown')} (tolerance {tolerance:.0%})")
+    for run in results['runs']:
+        base_run = previous.get(run['concurrency'])
+        if base_run is None:
+            print(f"  concurrency {run['concurrency']}: not in baseline")
+            continue
+        endpoints = dict(run['endpoints'], overall=run['overall'])
+        base_endpoints = dict(base_run['endpoints'], overall=base_run['overall'])
+        for name, stats in endpoints.items():
+            base = base_endpoints.get(name)
+            if base is None:
+                continue
+            problems = []
+            if stats['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+                problems.append("throughput")
+            for key in ('p95_ms', 'p99_ms'):
+                if stats[key] > base[key] * (1 + tolerance):
+                    problems.append(key[:3])
+            if stats['errors'] > base['errors']:
+                problems.append("errors")
+            status = "REGRESSION " + ",".join(problems) if problems else "ok"
+            print(f"  c={run['concurrency']:<4}{name:<15}"
+                  f"req/s {change(stats['throughput_rps'], base['throughput_rps']):>8}  "
+                  f"p95 {change(stats['p95_ms'], base['p95_ms']):>8}  "
+                  f"p99 {change(stats['p99_ms'], base['p99_ms']):>8}  {status}")
+            if problems:
+                regressions.append((run['concurrency'], name, problems))
+    return regressions
+
+
+def change(value, base):
+    return f"{(value - base) / base:+.0%}" if base else "n/a"
+
+
+def write_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API load test")
+    parser.add_argument("--url", help="Target a running API instead of starting one")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated client counts, one run each")
+    parser.add_argument("--requests", type=int, default=3000, help="Requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=200, help="Unmeasured requests before the first run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted endpoint mix, e.g. predict=3,distance=1")
+    parser.add_argument("--trips", type=int, default=10000, help="Rows of test.csv to replay")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the request schedule")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout (s)")
+    parser.add_argument("--weather-latency-ms", type=float, default=50.0, help="Latency of the weather stand-in")
+    parser.add_argument("--saved-models", action="store_true", help="Serve the models in saved_models/")
+    parser.add_argument("--startup-timeout", type=float, default=60.0, help="Seconds to wait for the server")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT, help="Where to write the results JSON")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Also write the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative change before a regression")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=8000, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    mix = parse_mix(args.mix)
+    levels = [int(c) for c in args.concurrency.split(",")]
+    trips = load_trips(args.trips)
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(args)
+    try:
+        asyncio.run(run_level(url, build_schedule(mix, trips, args.warmup, args.seed + 1), max(levels), args.timeout))
+        runs = []
+        for concurrency in levels:
+            schedule = build_schedule(mix, trips, args.requests, args.seed)
+            runs.append(asyncio.run(run_level(url, schedule, concurrency, args.timeout)))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "mix": mix, "requests": args.requests, "warmup": args.warmup, "seed": args.seed,
+            "weather_latency_ms": args.weather_latency_ms, "saved_models": args.saved_models,
+            "url": args.url, "serving_env": {k: v for k, v in os.environ.items() if k.startswith("GOPREDICT_")}
+        },
+        "environment": {
+            "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()
+        },
+        "runs": runs,
+    }
+
+    print("API Load Test")
+    print("=" * 75)
+    print(f"Mix: {', '.join(f'{name}={share:.0%}' for name, share in mix.items())}")
+    for run in runs:
+        print_run(run)
+
+    write_json(args.output, results)
+    print(f"\nResults written to {args.output}")
+
+    regressions = []
+    if args.save_baseline:
+        write_json(args.baseline, results)
+        print(f"Baseline written to {args.baseline}")
+    elif args.baseline.exists():
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+    else:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
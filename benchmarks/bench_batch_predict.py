@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Batch Prediction Throughput Benchmark
+
+Compares trips/second of the single-trip /predict endpoint against
+/predict/batch, using coordinates replayed from data/raw/test.csv and an
+in-memory RandomForest so that the model path (not the fallback) is timed.
+
+Usage:
+    python benchmarks/bench_batch_predict.py --trips 2000 --batch-size 500
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+from sklearn.ensemble import RandomForestRegressor
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+import api.main as api_main
+
+
+def load_trips(n_trips):
+    """Build /predict JSON bodies from the raw test set"""
+    df = pd.read_csv(PROJECT_ROOT / "data" / "raw" / "test.csv", nrows=n_trips)
+    return [
+        {
+            "from": {"lat": row.start_lat, "lon": row.start_lng},
+            "to": {"lat": row.end_lat, "lon": row.end_lng},
+            "startTime": str(row.datetime),
+            "city": "new_york",
+            "model_name": "Random Forest"
+        }
+        for row in df.itertuples()
+    ]
+
+
+def install_model():
+    """Register a small RandomForest with the API's 14-column feature layout"""
+    rng = np.random.default_rng(0)
+    X = rng.random((2000, 14))
+    y = rng.random(2000) * 3600
+    model = RandomForestRegressor(n_estimators=50, random_state=0).fit(X, y)
+    api_main.publish_models({"Random Forest": model})
+
+
+def bench_single(client, trips):
+    start = time.perf_counter()
+    for trip in trips:
+        response = client.post("/predict", json=trip)
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def bench_batch(client, trips, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(trips), batch_size):
+        response = client.post("/predict/batch", json=trips[i:i + batch_size])
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch prediction throughput benchmark")
+    parser.add_argument("--trips", type=int, default=2000, help="Number of trips to score")
+    parser.add_argument("--batch-size", type=int, default=500, help="Trips per /predict/batch call")
+    args = parser.parse_args()
+
+    trips = load_trips(args.trips)
+    install_model()
+    client = TestClient(api_main.app)
+
+    # Warm up both paths
+    client.post("/predict", json=trips[0])
+    client.post("/predict/batch", json=trips[:10])
+
+    single_s = bench_single(client, trips)
+    batch_s = bench_batch(client, trips, args.batch_size)
+
+    print("Batch Prediction Benchmark")
+    print("=" * 50)
+    print(f"Trips:               {len(trips)}")
+    print(f"Batch size:          {args.batch_size}")
+    print(f"/predict:            {len(trips) / single_s:10.1f} trips/s ({single_s:.3f}s)")
+    print(f"/predict/batch:      {len(trips) / batch_s:10.1f} trips/s ({batch_s:.3f}s)")
+    print(f"Speedup:             {single_s / batch_s:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Chunked Feature Engineering Benchmark
+
+Writes a preprocessed train/test pair of --rows trips each (data/raw/test.csv
+repeated with small coordinate jitter, synthetic durations) and matching
+gmaps files to a temporary directory, then runs feature engineering twice,
+each in its own process:
+
+- memory:  the in-memory stages of CompleteMLPipeline.step2_feature_engineering
+- chunked: feature_pipe.run_chunked_feature_engineering with --chunk-size
+           rows per chunk and DBSCAN fitted on --sample-size endpoints
+
+Reports wall time and peak RSS of both, then compares the outputs: every
+column except the location flags must match exactly; for airport,
+citycenter and standalone the share of rows whose flag agrees is reported
+(they can differ where sampling moves a cluster's border). The in-memory run
+clusters every endpoint at once, so DBSCAN memory grows steeply with
+--rows; keep it within what the machine can hold.
+
+Usage:
+    python benchmarks/bench_chunked_features.py --rows 30000 --chunk-size 5000
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT / "src"))
+
+LOCATION_FLAGS = ['airport', 'citycenter', 'standalone']
+
+
+def write_inputs(workdir, n_rows, seed):
+    """Preprocessed train/test datasets and gmaps files of n_rows trips each"""
+    from dataset_store import apply_schema, write_dataset
+    from features.distance import calc_distance_fast
+
+    raw = pd.read_csv(PROJECT_ROOT / "data" / "raw" / "test.csv", index_col='row_id', parse_dates=['datetime'])
+    rng = np.random.default_rng(seed)
+    for name in ('train', 'test'):
+        df = raw.iloc[rng.integers(0, len(raw), n_rows)].reset_index(drop=True).rename_axis('row_id')
+        for column in ('start_lat', 'start_lng', 'end_lat', 'end_lng'):
+            df[column] += rng.normal(0.0, 0.0005, n_rows)
+        manhattan, _ = calc_distance_fast(df.start_lat, df.start_lng, df.end_lat, df.end_lng)
+        if name == 'train':
+            df['duration'] = np.round(manhattan / 6.0 * rng.lognormal(0.0, 0.3, n_rows) + 60.0)
+        write_dataset(apply_schema(df), str(workdir / f"eda_{name}.parquet"))
+
+        gmaps = pd.DataFrame({
+            'gmaps_distance': np.round(manhattan * rng.uniform(0.9, 1.3, n_rows)),
+            'gmaps_duration': np.round(manhattan / 9.0),
+        }, index=df.index)
+        gmaps.iloc[rng.random(n_rows) < 0.01] = np.nan  # rows the gmaps join drops
+        gmaps.to_csv(workdir / f"gmaps_{name}.csv")
+
+
+def run_memory(workdir, args):
+    from feature_pipe import (
+        load_eda_data, calc_manhattan_euclidean_dist, add_gmaps_features, add_time_features,
+        add_cluster_features, add_precipitation_data, marking_outliers, save_feature_eng_data
+    )
+    combine = list(load_eda_data(str(workdir / "eda_train.parquet"), str(workdir / "eda_test.parquet")))
+    combine = calc_manhattan_euclidean_dist(combine)
+    combine = add_gmaps_features(combine, workdir / "gmaps_train.csv", workdir / "gmaps_test.csv")
+    combine = add_time_features(combine)
+    combine = add_cluster_features(combine, workdir / "memory_index.npz", min_sample=args.min_samples)
+    combine = add_precipitation_data(combine)
+    combine = marking_outliers(combine)
+    save_feature_eng_data(combine[0], combine[1], str(workdir / "memory_train.parquet"),
+                          str(workdir / "memory_test.parquet"))
+
+
+def run_chunked(workdir, args):
+    from feature_pipe import run_chunked_feature_engineering
+    run_chunked_feature_engineering(
+        workdir / "eda_train.parquet", workdir / "eda_test.parquet",
+        workdir / "chunked_train.parquet", workdir / "chunked_test.parquet",
+        workdir / "gmaps_train.csv", workdir / "gmaps_test.csv",
+        location_index_path=workdir / "chunked_index.npz",
+        chunk_size=args.chunk_size, sample_size=args.sample_size, min_sample=args.min_samples
+    )
+
+
+def child(mode, workdir, args):
+    """Run one mode and print its wall time and peak RSS as JSON"""
+    import logging
+    logging.disable(logging.INFO)
+    started = time.perf_counter()
+    (run_memory if mode == 'memory' else run_chunked)(Path(workdir), args)
+    elapsed = time.perf_counter() - started
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'seconds': elapsed, 'peak_rss_mib': peak_kib / 1024}))
+
+
+def compare(workdir):
+    """Mismatching cells outside the flags, and agreement per location flag"""
+    from dataset_store import read_dataset
+
+    mismatches, agreement = 0, {}
+    for name in ('train', 'test'):
+        memory = read_dataset(str(workdir / f"memory_{name}.parquet"))
+        chunked = read_dataset(str(workdir / f"chunked_{name}.parquet"))
+        if list(memory.columns) != list(chunked.columns) or len(memory) != len(chunked):
+            print(f"  {name}: columns or row counts differ: {list(memory.columns)} / {list(chunked.columns)}, "
+                  f"{len(memory)} / {len(chunked)}")
+            return 1, {}
+        other = [c for c in memory.columns if c not in LOCATION_FLAGS]
+        same = (memory[other].to_numpy() == chunked[other].to_numpy()) | (memory[other].isna() & chunked[other].isna()).to_numpy()
+        mismatches += int((~same).sum())
+        for flag in LOCATION_FLAGS:
+            agreement.setdefault(flag, []).append((memory[flag].to_numpy() == chunked[flag].to_numpy()).mean())
+    return mismatches, {flag: float(np.mean(v)) for flag, v in agreement.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunked feature engineering benchmark")
+    parser.add_argument("--rows", type=int, default=30000, help="Trips in each of train and test")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows per chunk")
+    parser.add_argument("--sample-size", type=int, default=40000, help="Endpoints DBSCAN is fitted on")
+    parser.add_argument("--min-samples", type=int, default=200,
+                        help="DBSCAN min_samples on the full data (the pipeline uses 2500 on the real set)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "WORKDIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        write_inputs(workdir, args.rows, args.seed)
+
+        results = {}
+        for mode in ('memory', 'chunked'):
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", mode, tmp] + sys.argv[1:],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+
+        mismatches, agreement = compare(workdir)
+
+    print("Chunked Feature Engineering Benchmark")
+    print("=" * 60)
+    print(f"Rows: {args.rows} train + {args.rows} test, chunk size {args.chunk_size}, "
+          f"cluster sample {args.sample_size} of {4 * args.rows} endpoints")
+    for mode, result in results.items():
+        print(f"  {mode:<8} {result['seconds']:8.2f} s   peak RSS {result['peak_rss_mib']:8.1f} MiB")
+    print(f"Mismatching cells outside the location flags: {mismatches}")
+    print("Location flag agreement: " + ", ".join(f"{flag} {share:.4%}" for flag, share in agreement.items()))
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
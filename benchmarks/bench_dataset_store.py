@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Dataset Store Benchmark
+
+Builds a feature engineered table of --rows trips (data/raw/test.csv
+repeated, with distance, time, location and outlier columns computed the way
+feature_pipe.py does and synthetic durations) plus the preprocessed table
+with its datetime column, then writes and reads both in every dataset
+format:
+
+- csv:     the previous text format (reads apply the schema)
+- parquet: snappy-compressed columnar file
+- feather: uncompressed Arrow IPC file, memory-mapped on read
+
+Reports write time, full read time, a projected read of the four
+coordinate columns and the file size. Every read is compared with the
+source frame (values and dtypes).
+
+Usage:
+    python benchmarks/bench_dataset_store.py --rows 1000000
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT / "src"))
+
+from dataset_store import DATASET_STORES, apply_schema, get_store, pyarrow
+from features.distance import calc_distance_fast
+
+COORDINATES = ['start_lng', 'start_lat', 'end_lng', 'end_lat']
+
+
+def build_tables(n_rows, seed):
+    """(preprocessed, feature engineered) frames of n_rows trips"""
+    raw = pd.read_csv(PROJECT_ROOT / "data" / "raw" / "test.csv", index_col='row_id', parse_dates=['datetime'])
+    raw = raw.iloc[np.arange(n_rows) % len(raw)].reset_index(drop=True).rename_axis('row_id')
+    rng = np.random.default_rng(seed)
+    manhattan, euclidean = calc_distance_fast(raw.start_lat, raw.start_lng, raw.end_lat, raw.end_lng)
+
+    eda = raw.copy()
+    eda['duration'] = np.round(manhattan / 6.0 * rng.lognormal(0.0, 0.3, n_rows) + 60.0)
+
+    features = eda.drop(columns=['datetime'])
+    features['manhattan'] = manhattan
+    features['euclidean'] = euclidean
+    features['gmaps_distance'] = manhattan * rng.uniform(0.9, 1.3, n_rows)
+    features['gmaps_duration'] = features['gmaps_distance'] / 11.0
+    features['weekday'] = raw['datetime'].dt.weekday + 1
+    features['hour'] = raw['datetime'].dt.hour
+    features['holiday'] = rng.integers(0, 2, n_rows)
+    for flag in ('airport', 'citycenter', 'standalone'):
+        features[flag] = rng.integers(0, 2, n_rows)
+    features['precipitation'] = np.round(rng.exponential(0.1, n_rows), 2)
+    features['routing_error'] = ((features.gmaps_distance > 500) & (features.manhattan < 50)).astype(float)
+    features['short_trip'] = ((features.gmaps_distance < 500) & (features.manhattan < 50)).astype(float)
+    return apply_schema(eda), apply_schema(features)
+
+
+def timed(fn, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def mismatches(expected, actual):
+    """0 if actual equals expected in values, dtypes and index, else 1"""
+    try:
+        pd.testing.assert_frame_equal(expected, actual, check_exact=True, check_index_type=False)
+        return 0
+    except AssertionError as e:
+        print(f"    mismatch: {str(e).splitlines()[0]}")
+        return 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dataset store benchmark")
+    parser.add_argument("--rows", type=int, default=1000000, help="Trips per table")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing runs per measurement (best is kept)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic columns")
+    args = parser.parse_args()
+
+    formats = list(DATASET_STORES)
+    if pyarrow is None:
+        print("pyarrow not installed, only csv is measured")
+        formats = ['csv']
+
+    tables = dict(zip(('preprocessed', 'features'), build_tables(args.rows, args.seed)))
+
+    print("Dataset Store Benchmark")
+    print("=" * 78)
+    print(f"{'table':<13}{'format':<9}{'write ms':>10}{'read ms':>10}{'4 cols ms':>11}{'MiB':>9}  speedup")
+    failed = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, df in tables.items():
+            csv_read = None
+            for fmt in formats:
+                store = get_store(fmt)
+                path = store.path(Path(tmp) / name)
+                write_s, _ = timed(lambda: store.write(df, path), args.repeat)
+                read_s, loaded = timed(lambda: store.read(path), args.repeat)
+                project_s, projected = timed(lambda: store.read(path, columns=COORDINATES), args.repeat)
+                failed += mismatches(df, loaded) + mismatches(df[COORDINATES], projected)
+                csv_read = csv_read or read_s
+                print(f"{name:<13}{fmt:<9}{write_s * 1e3:10.1f}{read_s * 1e3:10.1f}{project_s * 1e3:11.1f}"
+                      f"{path.stat().st_size / 1024 ** 2:9.1f}  {csv_read / read_s:5.1f}x")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Distance Feature Microbenchmark
+
+Measures per-call latency of single-trip distance features before (one-row
+DataFrame + two calc_distance calls, as the API used to do) and after
+(calc_distance_fast), and checks that both paths agree bit-for-bit on every
+trip in data/raw/test.csv.
+
+Usage:
+    python benchmarks/bench_distance.py --calls 2000
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT / "src"))
+
+from features.distance import calc_distance, calc_distance_fast
+
+
+def dataframe_path(start_lat, start_lng, end_lat, end_lng):
+    """Previous API hot path"""
+    df = pd.DataFrame({
+        'start_lat': [start_lat],
+        'start_lng': [start_lng],
+        'end_lat': [end_lat],
+        'end_lng': [end_lng]
+    })
+    return calc_distance(df, method='manhattan')[0], calc_distance(df, method='euclidean')[0]
+
+
+def check_identical(df):
+    """Compare the fast path against calc_distance for arrays and scalars"""
+    manhattan = np.asarray(calc_distance(df, method='manhattan'))
+    euclidean = np.asarray(calc_distance(df, method='euclidean'))
+
+    fast_m, fast_e = calc_distance_fast(df.start_lat, df.start_lng, df.end_lat, df.end_lng)
+    array_mismatches = int((fast_m != manhattan).sum() + (fast_e != euclidean).sum())
+
+    scalar_mismatches = 0
+    for i, row in enumerate(df.itertuples()):
+        m, e = calc_distance_fast(row.start_lat, row.start_lng, row.end_lat, row.end_lng)
+        scalar_mismatches += int(m != manhattan[i]) + int(e != euclidean[i])
+
+    return array_mismatches, scalar_mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distance feature microbenchmark")
+    parser.add_argument("--calls", type=int, default=2000, help="Calls per timing run")
+    args = parser.parse_args()
+
+    df = pd.read_csv(PROJECT_ROOT / "data" / "raw" / "test.csv")
+    trip = (40.767937, -73.982155, 40.748817, -73.985428)
+    small = df.head(16)
+    small_args = (small.start_lat.to_numpy(), small.start_lng.to_numpy(),
+                  small.end_lat.to_numpy(), small.end_lng.to_numpy())
+
+    before = min(timeit.repeat(lambda: dataframe_path(*trip), number=args.calls, repeat=3)) / args.calls
+    after = min(timeit.repeat(lambda: calc_distance_fast(*trip), number=args.calls, repeat=3)) / args.calls
+    small_before = min(timeit.repeat(lambda: (calc_distance(small, 'manhattan'), calc_distance(small, 'euclidean')),
+                                     number=args.calls, repeat=3)) / args.calls
+    small_after = min(timeit.repeat(lambda: calc_distance_fast(*small_args), number=args.calls, repeat=3)) / args.calls
+
+    array_mismatches, scalar_mismatches = check_identical(df)
+
+    print("Distance Feature Microbenchmark")
+    print("=" * 50)
+    print(f"Single trip, DataFrame path: {before * 1e6:10.1f} us/call")
+    print(f"Single trip, fast path:      {after * 1e6:10.1f} us/call ({before / after:.0f}x)")
+    print(f"16 trips, calc_distance x2:  {small_before * 1e6:10.1f} us/call")
+    print(f"16 trips, fast path:         {small_after * 1e6:10.1f} us/call ({small_before / small_after:.0f}x)")
+    print(f"Mismatches vs calc_distance ({len(df)} trips): array={array_mismatches}, scalar={scalar_mismatches}")
+
+    if array_mismatches or scalar_mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Grid Clustering Benchmark
+
+Builds a train/test pair of --rows trips each (data/raw/test.csv repeated
+with small coordinate jitter) and runs the cluster feature stage of
+feature_pipe.py on it with the exact DBSCAN fit and with the grid fit
+(features.geolocation.GridDBSCAN) for each cell size of --grid-sizes, each
+in its own process so peak memory is measured per method.
+
+Reports wall time and peak RSS of the clustering (the RSS before it is
+shown separately), the number of points DBSCAN was fitted on, and how well
+the grid fit reproduces the exact one: the share of endpoints with the same
+cluster id and the share of trips with the same airport, citycenter and
+standalone flags. The run fails if a grid fit finds a different number of
+clusters or any flag agrees on fewer than --tolerance of the trips. The
+exact fit computes the neighbourhood of every endpoint, so its memory grows
+steeply with --rows; keep it within what the machine can hold.
+
+Usage:
+    python benchmarks/bench_grid_clustering.py --rows 30000 --grid-sizes 0.00025,0.0005,0.001
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT / "src"))
+
+LOCATION_FLAGS = ['airport', 'citycenter', 'standalone']
+
+
+def build_trips(n_rows, seed):
+    """Train and test frames of n_rows trips each"""
+    raw = pd.read_csv(PROJECT_ROOT / "data" / "raw" / "test.csv", index_col='row_id')
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in ('train', 'test'):
+        df = raw.iloc[rng.integers(0, len(raw), n_rows)].reset_index(drop=True).rename_axis('row_id')
+        for column in ('start_lat', 'start_lng', 'end_lat', 'end_lng'):
+            df[column] += rng.normal(0.0, 0.0005, n_rows)
+        frames.append(df)
+    return frames
+
+
+def child(method, grid_size, workdir, args):
+    """Cluster with one method, save the flags and endpoint labels, print time and RSS as JSON"""
+    from features.geolocation import prepare_coordinates, cluster_coordinates, label_clusters, add_cluster_features
+
+    combine = build_trips(args.rows, args.seed)
+    baseline_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # The steps of features.geolocation.clustering, keeping the fitted DBSCAN
+    started = time.perf_counter()
+    coordinates = prepare_coordinates(combine[0], combine[1])
+    db = cluster_coordinates(coordinates, eps=args.eps, min_sample=args.min_samples, method=method,
+                             grid_size=grid_size)
+    add_cluster_features(combine[0], combine[1], coordinates, label_clusters(db))
+    elapsed = time.perf_counter() - started
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    np.savez(Path(workdir) / f"{method}_{grid_size}.npz", labels=db.labels_,
+             **{f"{name}_{flag}": df[flag].to_numpy() for name, df in zip(('train', 'test'), combine)
+                for flag in LOCATION_FLAGS})
+    print(json.dumps({
+        'seconds': elapsed,
+        'baseline_rss_mib': baseline_kib / 1024,
+        'peak_rss_mib': peak_kib / 1024,
+        'clusters': int(db.labels_.max()) + 1,
+        'fitted_points': int(getattr(db, 'n_cells_', len(db.labels_))),
+    }))
+
+
+def run_child(method, grid_size, workdir):
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", method, str(grid_size), workdir] + sys.argv[1:],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def agreement(workdir, exact_name, grid_name):
+    """Share of endpoints with the same cluster id, and of trips with the same value per flag"""
+    with np.load(Path(workdir) / exact_name) as exact, np.load(Path(workdir) / grid_name) as grid:
+        labels = float((exact['labels'] == grid['labels']).mean())
+        flags = {}
+        for flag in LOCATION_FLAGS:
+            same = np.concatenate([exact[f"{name}_{flag}"] == grid[f"{name}_{flag}"] for name in ('train', 'test')])
+            flags[flag] = float(same.mean())
+    return labels, flags
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grid clustering benchmark")
+    parser.add_argument("--rows", type=int, default=30000, help="Trips in each of train and test")
+    parser.add_argument("--grid-sizes", type=str, default="0.00025,0.0005,0.001",
+                        help="Comma-separated grid cell sizes (degrees)")
+    parser.add_argument("--eps", type=float, default=0.005, help="DBSCAN eps (degrees)")
+    parser.add_argument("--min-samples", type=int, default=200,
+                        help="DBSCAN min_samples (the pipeline uses 2500 on the real set)")
+    parser.add_argument("--tolerance", type=float, default=0.998,
+                        help="Lowest share of trips whose location flags must match the exact fit")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data")
+    parser.add_argument("--child", nargs=3, metavar=("METHOD", "GRID_SIZE", "WORKDIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], float(args.child[1]), args.child[2], args)
+        return
+
+    grid_sizes = [float(size) for size in args.grid_sizes.split(',')]
+    with tempfile.TemporaryDirectory() as tmp:
+        exact = run_child('exact', 0.0, tmp)
+        grids = {}
+        for size in grid_sizes:
+            grids[size] = run_child('grid', size, tmp)
+            grids[size]['labels'], grids[size]['flags'] = agreement(tmp, "exact_0.0.npz", f"grid_{size}.npz")
+
+    print("Grid Clustering Benchmark")
+    print("=" * 108)
+    print(f"Rows: {args.rows} train + {args.rows} test ({4 * args.rows} endpoints), eps {args.eps}, "
+          f"min_samples {args.min_samples}; RSS before clustering {exact['baseline_rss_mib']:.1f} MiB")
+    print(f"{'method':<16}{'points':>9}{'clusters':>10}{'time s':>9}{'speedup':>9}{'peak RSS MiB':>14}"
+          f"{'labels':>10}" + ''.join(f"{flag:>12}" for flag in LOCATION_FLAGS))
+    print(f"{'exact':<16}{exact['fitted_points']:>9}{exact['clusters']:>10}{exact['seconds']:9.2f}"
+          f"{1.0:8.2f}x{exact['peak_rss_mib']:14.1f}")
+    failed = 0
+    for size, result in grids.items():
+        print(f"{'grid ' + str(size):<16}{result['fitted_points']:>9}{result['clusters']:>10}"
+              f"{result['seconds']:9.2f}{exact['seconds'] / result['seconds']:8.2f}x"
+              f"{result['peak_rss_mib']:14.1f}{result['labels']:10.4%}"
+              + ''.join(f"{result['flags'][flag]:12.4%}" for flag in LOCATION_FLAGS))
+        if result['clusters'] != exact['clusters'] or min(result['flags'].values()) < args.tolerance:
+            failed += 1
+    print(f"Within tolerance ({args.tolerance:.2%} of trips per flag): {'yes' if not failed else 'NO'}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Location Index Benchmark
+
+Fits DBSCAN on the start and end points of data/raw/test.csv, builds a
+LocationIndex from its core samples, and checks that assigning the fitted
+points again reproduces the DBSCAN labels: core and noise points must match
+exactly, border points within eps of several clusters may go to the nearest
+core sample instead. Reports per-call latency of the scalar lookup (/predict)
+and per-point cost of the vectorized assignment (batch scoring).
+
+Usage:
+    python benchmarks/bench_location_index.py --min-samples 100
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT / "src"))
+
+from features.geolocation import LocationIndex, cluster_coordinates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Location index benchmark")
+    parser.add_argument("--eps", type=float, default=0.005, help="DBSCAN eps (degrees)")
+    parser.add_argument("--min-samples", type=int, default=100,
+                        help="DBSCAN min_samples (the pipeline uses 2500 on the full train+test set)")
+    parser.add_argument("--calls", type=int, default=2000, help="Scalar lookups per timing run")
+    args = parser.parse_args()
+
+    df = pd.read_csv(PROJECT_ROOT / "data" / "raw" / "test.csv")
+    coordinates = pd.DataFrame({
+        'lat': np.concatenate([df.start_lat, df.end_lat]),
+        'lng': np.concatenate([df.start_lng, df.end_lng]),
+    })
+
+    db = cluster_coordinates(coordinates, eps=args.eps, min_sample=args.min_samples)
+    index = LocationIndex.from_dbscan(db, coordinates)
+    assigned = index.assign(coordinates.lat, coordinates.lng)
+
+    is_core = np.zeros(len(coordinates), dtype=bool)
+    is_core[db.core_sample_indices_] = True
+    noise = db.labels_ == -1
+    border = ~is_core & ~noise
+    core_mismatches = int((assigned[is_core] != db.labels_[is_core]).sum())
+    noise_mismatches = int((assigned[noise] != -1).sum())
+    border_mismatches = int((assigned[border] != db.labels_[border]).sum())
+
+    lat, lng = float(coordinates.lat[0]), float(coordinates.lng[0])
+    scalar = min(timeit.repeat(lambda: index.lookup(lat, lng), number=args.calls, repeat=3)) / args.calls
+    sample = coordinates.sample(10000, random_state=0)
+    vectorized = min(timeit.repeat(lambda: index.assign(sample.lat, sample.lng), number=5, repeat=3)) / 5
+
+    print("Location Index Benchmark")
+    print("=" * 50)
+    print(f"Points: {len(coordinates)}, clusters: {db.labels_.max() + 1}, "
+          f"indexed core samples: {len(index)}")
+    print(f"Mismatches vs DBSCAN: core={core_mismatches}/{int(is_core.sum())}, "
+          f"noise={noise_mismatches}/{int(noise.sum())}, border={border_mismatches}/{int(border.sum())}")
+    print(f"Scalar lookup:     {scalar * 1e6:10.1f} us/call")
+    print(f"Vectorized assign: {vectorized / len(sample) * 1e6:10.3f} us/point (10000 points)")
+
+    if core_mismatches or noise_mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+OD Duration Table Benchmark
+
+Builds an ODDurationTable from the trips of data/raw/test.csv (test.csv has
+no durations, so each trip gets a seeded synthetic one from its distance),
+saves and memory-maps it again, and checks every lookup against a pandas
+groupby median/count over the same cells and hour of week. Reports build
+time, size on disk, per-call latency of the scalar lookup (/predict table
+mode) and per-trip cost of the vectorized lookup.
+
+Usage:
+    python benchmarks/bench_od_table.py --grid-deg 0.005
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT / "src"))
+
+from features.distance import calc_distance_fast
+from model.od_table import ODDurationTable
+
+
+def load_trips(seed):
+    """test.csv trips with weekday/hour columns and a synthetic duration in seconds"""
+    df = pd.read_csv(PROJECT_ROOT / "data" / "raw" / "test.csv", parse_dates=['datetime'])
+    manhattan, _ = calc_distance_fast(df.start_lat, df.start_lng, df.end_lat, df.end_lng)
+    rng = np.random.default_rng(seed)
+    df['weekday'] = df['datetime'].dt.weekday + 1
+    df['hour'] = df['datetime'].dt.hour
+    df['holiday'] = 0
+    df['duration'] = np.round(manhattan / 6.0 * rng.lognormal(0.0, 0.3, len(df)) + 60.0)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OD duration table benchmark")
+    parser.add_argument("--grid-deg", type=float, default=0.005, help="Cell size in degrees")
+    parser.add_argument("--calls", type=int, default=10000, help="Scalar lookups per timing run")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic durations")
+    args = parser.parse_args()
+
+    df = load_trips(args.seed)
+    started = time.perf_counter()
+    table = ODDurationTable.build(df, grid_deg=args.grid_deg)
+    build_s = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as tmp:
+        table.save(Path(tmp) / "od_table")
+        size = sum(f.stat().st_size for f in (Path(tmp) / "od_table").iterdir())
+        table = ODDurationTable.load(Path(tmp) / "od_table")
+
+        cells = pd.DataFrame({
+            name: np.floor(df[name] / args.grid_deg)
+            for name in ('start_lat', 'start_lng', 'end_lat', 'end_lng')
+        })
+        cells['hour_of_week'] = (df['weekday'] - 1) * 24 + df['hour']
+        keys = list(cells.columns)
+        expected = cells.assign(duration=df['duration']).groupby(keys)['duration'].agg(['median', 'count'])
+        expected = expected.reindex(pd.MultiIndex.from_frame(cells))
+
+        median_s, count = table.lookup(df.start_lat, df.start_lng, df.end_lat, df.end_lng, cells['hour_of_week'])
+        median_mismatches = int((median_s != expected['median'].to_numpy(dtype=np.float32)).sum())
+        count_mismatches = int((count != expected['count'].to_numpy()).sum())
+        scalar_mismatches = sum(
+            table.lookup_one(*trip) != (float(m), int(c))
+            for trip, m, c in zip(
+                zip(df.start_lat[:1000], df.start_lng[:1000], df.end_lat[:1000], df.end_lng[:1000],
+                    cells['hour_of_week'][:1000].tolist()),
+                median_s[:1000], count[:1000]
+            )
+        )
+
+        trip = (float(df.start_lat[0]), float(df.start_lng[0]), float(df.end_lat[0]), float(df.end_lng[0]),
+                int(cells['hour_of_week'][0]))
+        scalar = min(timeit.repeat(lambda: table.lookup_one(*trip), number=args.calls, repeat=3)) / args.calls
+        vectorized = min(timeit.repeat(
+            lambda: table.lookup(df.start_lat, df.start_lng, df.end_lat, df.end_lng, cells['hour_of_week']),
+            number=3, repeat=3
+        )) / 3
+
+        print("OD Duration Table Benchmark")
+        print("=" * 50)
+        print(f"Trips: {len(df)}, cell pairs: {len(table)}, grid: {args.grid_deg} deg, "
+              f"built in {build_s * 1e3:.1f} ms, {size / 1024:.1f} KiB on disk")
+        print(f"Cell pairs with >= 10 trips: {int((table.count >= 10).sum())}")
+        print(f"Mismatches vs pandas: median={median_mismatches}, count={count_mismatches}, "
+              f"scalar={scalar_mismatches}/1000")
+        print(f"Scalar lookup:     {scalar * 1e6:10.2f} us/call")
+        print(f"Vectorized lookup: {vectorized / len(df) * 1e6:10.3f} us/trip ({len(df)} trips)")
+
+        # Release the loaded table's files before the directory is removed
+        table = None
+
+    if median_mismatches or count_mismatches or scalar_mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
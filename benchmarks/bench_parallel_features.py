@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Parallel Feature Stages Benchmark
+
+Builds a table of --rows trips (data/raw/test.csv repeated with small
+coordinate and time jitter, plus a synthetic gmaps_distance column) and runs
+the row-local feature stages of feature_pipe.py on it:
+
+- distance:      calc_manhattan_euclidean_dist
+- time:          add_time_features
+- precipitation: add_precipitation_data
+- outliers:      marking_outliers
+
+first serially (the existing code path), then on a PartitionExecutor with
+each worker count of --workers. Worker start-up is timed separately
+(warm_up) and not included in the stage times. Every parallel result is
+compared with the serial one column by column, byte for byte (values,
+dtypes, column order and index); any difference fails the run.
+
+Usage:
+    python benchmarks/bench_parallel_features.py --rows 2000000 --workers 1,2,4,8,16
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT / "src"))
+
+from feature_pipe import calc_manhattan_euclidean_dist, add_time_features, add_precipitation_data, marking_outliers
+from partition_executor import PartitionExecutor
+
+PRECIPITATION = PROJECT_ROOT / "data" / "external" / "precipitation.csv"
+STAGES = ('distance', 'time', 'precipitation', 'outliers')
+
+
+def build_trips(n_rows, seed):
+    raw = pd.read_csv(PROJECT_ROOT / "data" / "raw" / "test.csv", index_col='row_id', parse_dates=['datetime'])
+    rng = np.random.default_rng(seed)
+    df = raw.iloc[rng.integers(0, len(raw), n_rows)].reset_index(drop=True).rename_axis('row_id')
+    for column in ('start_lat', 'start_lng', 'end_lat', 'end_lng'):
+        df[column] += rng.normal(0.0, 0.0005, n_rows)
+    df['datetime'] = (df['datetime'] + pd.to_timedelta(rng.integers(-86400, 86400, n_rows), unit='s')).astype(
+        'datetime64[ns]')
+    df['gmaps_distance'] = np.round(rng.lognormal(7.5, 1.0, n_rows))
+    return df
+
+
+def run_stages(df, executor):
+    """(frame after all stages, {stage: seconds})"""
+    combine = [df.copy()]
+    stages = {
+        'distance': lambda c: calc_manhattan_euclidean_dist(c, executor),
+        'time': lambda c: add_time_features(c, executor),
+        'precipitation': lambda c: add_precipitation_data(c, PRECIPITATION, executor),
+        'outliers': lambda c: marking_outliers(c, executor),
+    }
+    seconds = {}
+    for name in STAGES:
+        started = time.perf_counter()
+        combine = stages[name](combine)
+        seconds[name] = time.perf_counter() - started
+    return combine[0], seconds
+
+
+def differences(expected, actual):
+    """Columns of actual that are not byte-identical to expected"""
+    if list(expected.columns) != list(actual.columns) or not expected.index.equals(actual.index):
+        return ['<columns or index>']
+    return [c for c in expected.columns
+            if expected[c].dtype != actual[c].dtype
+            or expected[c].to_numpy().tobytes() != actual[c].to_numpy().tobytes()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel feature stages benchmark")
+    parser.add_argument("--rows", type=int, default=2000000, help="Trips in the table")
+    parser.add_argument("--workers", type=str, default="1,2,4,8,16", help="Comma-separated worker counts")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing runs per worker count (best is kept)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic table")
+    args = parser.parse_args()
+
+    df = build_trips(args.rows, args.seed)
+    serial, serial_s = None, None
+    for _ in range(args.repeat):
+        result, seconds = run_stages(df, None)
+        serial = result
+        serial_s = seconds if serial_s is None else {k: min(v, seconds[k]) for k, v in serial_s.items()}
+
+    print("Parallel Feature Stages Benchmark")
+    print("=" * 102)
+    print(f"Rows: {args.rows}, CPUs: {os.cpu_count()}")
+    print(f"{'workers':<10}{'start s':>9}" + ''.join(f"{name + ' ms':>18}" for name in STAGES)
+          + f"{'total ms':>11}{'speedup':>9}")
+    serial_total = sum(serial_s.values())
+    print(f"{'serial':<10}{'':>9}" + ''.join(f"{serial_s[name] * 1e3:18.1f}" for name in STAGES)
+          + f"{serial_total * 1e3:11.1f}{1.0:8.2f}x")
+
+    failed = 0
+    for workers in [int(w) for w in args.workers.split(',')]:
+        with PartitionExecutor(workers) as executor:
+            started = time.perf_counter()
+            executor.warm_up()
+            start_s = time.perf_counter() - started
+            best = None
+            for _ in range(args.repeat):
+                result, seconds = run_stages(df, executor)
+                best = seconds if best is None else {k: min(v, seconds[k]) for k, v in best.items()}
+                mismatched = differences(serial, result)
+                if mismatched:
+                    print(f"    {workers} workers: not identical to serial in {mismatched}")
+                    failed += 1
+        total = sum(best.values())
+        print(f"{workers:<10}{start_s:9.2f}" + ''.join(f"{best[name] * 1e3:18.1f}" for name in STAGES)
+              + f"{total * 1e3:11.1f}{serial_total / total:8.2f}x")
+
+    print(f"Bit-identical to serial: {'yes' if not failed else 'NO'}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Response Format Benchmark
+
+Encodes /predict/batch payloads of 1, 1000 and 10000 rows (coordinates
+replayed from data/raw/test.csv) in every format the API can return and
+reports encode time and payload size:
+
+- default:  what a handler returning a dict costs (jsonable_encoder + JSONResponse)
+- json:     FastJSONResponse with the standard json module
+- orjson:   FastJSONResponse with orjson
+- arrow:    ArrowResponse (Arrow IPC stream, columnar)
+
+Every encoding is decoded again and compared with the source rows.
+
+Usage:
+    python benchmarks/bench_response_formats.py --rows 1,1000,10000
+"""
+
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT / "src"))
+
+from features.distance import calc_distance_fast
+from serving import encoding
+
+
+def load_columns(n_rows):
+    """Batch result columns as /predict/batch builds them, every 20th row an error"""
+    df = pd.read_csv(PROJECT_ROOT / "data" / "raw" / "test.csv", nrows=n_rows)
+    _, euclidean = calc_distance_fast(df.start_lat, df.start_lng, df.end_lat, df.end_lng)
+    success = np.arange(len(df)) % 20 != 19
+    minutes = np.where(success, np.round(euclidean / 250.0 + 4, 1), np.nan)
+    distance_km = np.where(success, np.round(euclidean / 1000.0, 1), np.nan)
+    return {
+        "index": np.arange(len(df)),
+        "success": success,
+        "minutes": minutes,
+        "confidence": np.where(success, 0.75, np.nan),
+        "model_version": [("XGBoost" if ok else None) for ok in success],
+        "distance_km": distance_km,
+        "city": [("new_york" if ok else None) for ok in success],
+        "error": [(None if ok else "startTime: invalid datetime") for ok in success],
+    }
+
+
+def json_payload(columns):
+    """The JSON body of /predict/batch built from result columns"""
+    results = []
+    for i, ok in enumerate(columns["success"].tolist()):
+        if ok:
+            results.append({
+                "index": i, "success": True,
+                "minutes": float(columns["minutes"][i]), "confidence": 0.75,
+                "model_version": columns["model_version"][i],
+                "distance_km": float(columns["distance_km"][i]), "city": columns["city"][i]
+            })
+        else:
+            results.append({"index": i, "success": False, "error": columns["error"][i]})
+    errors = int((~columns["success"]).sum())
+    return {"success": True, "count": len(results), "errors": errors, "results": results}
+
+
+def encode_default(columns):
+    return JSONResponse(jsonable_encoder(json_payload(columns))).body
+
+
+def encode_json(columns):
+    orjson, encoding.orjson = encoding.orjson, None
+    try:
+        return encoding.FastJSONResponse(json_payload(columns)).body
+    finally:
+        encoding.orjson = orjson
+
+
+def encode_orjson(columns):
+    return encoding.FastJSONResponse(json_payload(columns)).body
+
+
+def encode_arrow(columns):
+    return encoding.ArrowResponse(columns, metadata={"count": len(columns["index"])}).body
+
+
+def decode_rows(fmt, body):
+    """(index, success, minutes, distance_km) per row of an encoded payload"""
+    if fmt == "arrow":
+        table = encoding.pyarrow.ipc.open_stream(body).read_all().to_pydict()
+        return list(zip(table["index"], table["success"], table["minutes"], table["distance_km"]))
+    return [(r["index"], r["success"], r.get("minutes"), r.get("distance_km")) for r in json.loads(body)["results"]]
+
+
+def expected_rows(columns):
+    return [
+        (i, ok, float(m) if ok else None, float(d) if ok else None)
+        for i, ok, m, d in zip(columns["index"].tolist(), columns["success"].tolist(),
+                               columns["minutes"], columns["distance_km"])
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response format benchmark")
+    parser.add_argument("--rows", default="1,1000,10000", help="Comma-separated payload sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs per measurement (best is kept)")
+    args = parser.parse_args()
+
+    formats = {"default": encode_default, "json": encode_json}
+    if encoding.orjson is not None:
+        formats["orjson"] = encode_orjson
+    else:
+        print("orjson not installed, skipping")
+    if encoding.pyarrow is not None:
+        formats["arrow"] = encode_arrow
+    else:
+        print("pyarrow not installed, skipping")
+
+    print("Response Format Benchmark")
+    print("=" * 60)
+    failed = False
+    for n_rows in [int(n) for n in args.rows.split(",")]:
+        columns = load_columns(n_rows)
+        expected = expected_rows(columns)
+        print(f"{n_rows} rows")
+        baseline = None
+        for fmt, encode in formats.items():
+            body = encode(columns)
+            mismatches = sum(a != b for a, b in zip(decode_rows(fmt, body), expected))
+            failed |= bool(mismatches)
+            number = max(1, 10000 // n_rows)
+            seconds = min(timeit.repeat(lambda: encode(columns), number=number, repeat=args.repeat)) / number
+            baseline = baseline or seconds
+            print(f"  {fmt:<8} {seconds * 1e3:9.3f} ms ({baseline / seconds:5.1f}x)  "
+                  f"{len(body) / 1024:9.1f} KiB  mismatches={mismatches}")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
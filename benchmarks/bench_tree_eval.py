@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Flattened Tree Ensemble Benchmark
+
+Trains XGBoost (the pipeline's hyperparameters) and RandomForest models on
+the API's 14-column feature layout built from data/raw/test.csv, checks that
+FlatTreeEnsemble agrees exactly with model.predict on every row (including
+rows with missing values), and compares per-call latency at batch sizes 1,
+16 and 1024.
+
+Usage:
+    python benchmarks/bench_tree_eval.py --rows 20000 --rf-trees 100
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from xgboost import XGBRegressor
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT / "src"))
+
+from features.distance import calc_distance_fast
+from model.tree_ensemble import FlatTreeEnsemble
+
+BATCH_SIZES = (1, 16, 1024)
+
+
+def load_features(n_rows):
+    """API feature matrix (create_feature_matrix layout) and a synthetic duration target"""
+    df = pd.read_csv(PROJECT_ROOT / "data" / "raw" / "test.csv", nrows=n_rows)
+    dt = pd.to_datetime(df['datetime'])
+    manhattan, euclidean = calc_distance_fast(df.start_lat, df.start_lng, df.end_lat, df.end_lng)
+
+    X = np.zeros((len(df), 14))
+    X[:, 0:4] = df[['start_lat', 'start_lng', 'end_lat', 'end_lng']].to_numpy()
+    X[:, 4] = manhattan
+    X[:, 5] = euclidean
+    X[:, 6] = dt.dt.weekday.to_numpy() + 1
+    X[:, 7] = dt.dt.hour.to_numpy()
+
+    rng = np.random.default_rng(0)
+    speed = 6.0 + 2.0 * np.sin(X[:, 7] / 24 * 2 * np.pi) + rng.random(len(df))
+    y = euclidean / speed + 120
+    return X, y
+
+
+def count_mismatches(model, ensemble, X):
+    """Rows where the flattened ensemble differs from model.predict, batched and row by row"""
+    expected = model.predict(X)
+    batched = int((ensemble.predict(X) != expected).sum())
+    single = sum(int(ensemble.predict(X[i:i + 1])[0] != expected[i]) for i in range(min(len(X), 500)))
+    return batched, single
+
+
+def latency(fn, X, calls):
+    return min(timeit.repeat(lambda: fn(X), number=calls, repeat=3)) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flattened tree ensemble benchmark")
+    parser.add_argument("--rows", type=int, default=20000, help="Rows of test.csv used for training and checks")
+    parser.add_argument("--rf-trees", type=int, default=100, help="Trees in the RandomForest")
+    parser.add_argument("--calls", type=int, default=50, help="Calls per timing run")
+    args = parser.parse_args()
+
+    X, y = load_features(args.rows)
+    X_missing = X.copy()
+    X_missing[np.random.default_rng(1).random(X.shape) < 0.05] = np.nan
+
+    models = {
+        "XGBoost": XGBRegressor(n_estimators=500, learning_rate=0.045, max_depth=9, reg_lambda=0.5, verbosity=0),
+        "Random Forest": RandomForestRegressor(n_estimators=args.rf_trees, random_state=0),
+    }
+
+    print("Flattened Tree Ensemble Benchmark")
+    print("=" * 60)
+    failed = False
+    for name, model in models.items():
+        model.fit(X, y)
+        ensemble = FlatTreeEnsemble.from_model(model)
+        print(f"{name}: {ensemble.n_trees} trees, {ensemble.n_nodes} nodes, depth {ensemble.max_depth}")
+
+        batched, single = count_mismatches(model, ensemble, X)
+        print(f"  Mismatches vs model.predict: batched={batched}, single-row={single}")
+        failed |= bool(batched or single)
+        if name == "XGBoost":
+            # RandomForest rejects NaN inputs, XGBoost routes them along the default branch
+            batched, single = count_mismatches(model, ensemble, X_missing)
+            print(f"  Mismatches with missing values: batched={batched}, single-row={single}")
+            failed |= bool(batched or single)
+
+        for batch_size in BATCH_SIZES:
+            batch = X[:batch_size]
+            before = latency(model.predict, batch, args.calls)
+            after = latency(ensemble.predict, batch, args.calls)
+            print(f"  Batch {batch_size:>5}: model.predict {before * 1e3:8.3f} ms, "
+                  f"flattened {after * 1e3:8.3f} ms ({before / after:.1f}x)")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,16 +5,52 @@ This file contains all configuration settings for the GoPredict project.
 Modify these settings to customize the pipeline behavior.
 """
 
+import os
+
 # Data paths
 DATA_PATHS = {
     'raw_train': 'data/raw/train.csv',
     'raw_test': 'data/raw/test.csv',
-    'processed_train': 'data/processed/feature_engineered_train.csv',
-    'processed_test': 'data/processed/feature_engineered_test.csv',
+    'processed_train': 'data/processed/feature_engineered_train.parquet',
+    'processed_test': 'data/processed/feature_engineered_test.parquet',
     'precipitation': 'data/external/precipitation.csv',
     'gmaps_train': 'data/processed/gmapsdata/gmaps_train_data.csv',
     'gmaps_test': 'data/processed/gmapsdata/gmaps_test_data.csv',
-    'historical_weather': 'data/processed/historical_weather.csv'
+    'historical_weather': 'data/processed/historical_weather.csv',
+    'od_table': 'data/processed/od_table'
+}
+
+# Intermediate datasets written by the pipeline (see src/dataset_store.py):
+# 'parquet', 'feather' (memory-mapped reads) or 'csv'; export_csv also writes
+# a CSV copy of the feature engineered tables
+DATASETS = {
+    'format': os.environ.get('GOPREDICT_DATASET_FORMAT', 'parquet'),
+    'export_csv': os.environ.get('GOPREDICT_DATASET_EXPORT_CSV', '0') == '1',
+    # Rows per chunk of out-of-core feature engineering (0 loads the data whole)
+    'feature_chunk_size': int(os.environ.get('GOPREDICT_FEATURE_CHUNK_SIZE', 0)),
+    # Trip endpoints DBSCAN is fitted on in chunked feature engineering
+    'cluster_sample_size': int(os.environ.get('GOPREDICT_CLUSTER_SAMPLE_SIZE', 200000)),
+    # Processes computing the row-local feature stages on row partitions (1 = serial)
+    'feature_workers': int(os.environ.get('GOPREDICT_FEATURE_WORKERS', 1)),
+}
+
+# DBSCAN clustering of trip endpoints into airport/city center/standalone locations;
+# method 'grid' fits DBSCAN on grid cells of grid_size degrees weighted by their
+# point counts (much less time and memory, see features.geolocation.GridDBSCAN)
+# instead of on every endpoint ('exact')
+CLUSTERING = {
+    'eps': float(os.environ.get('GOPREDICT_DBSCAN_EPS', 0.005)),
+    'min_samples': int(os.environ.get('GOPREDICT_DBSCAN_MIN_SAMPLES', 2500)),
+    'method': os.environ.get('GOPREDICT_CLUSTER_METHOD', 'exact'),
+    'grid_size': float(os.environ.get('GOPREDICT_CLUSTER_GRID_SIZE', 0.0005)),
+}
+
+# Content-hashed cache of preprocessing/feature engineering outputs (see
+# src/stage_cache.py); keep is the number of entries kept per stage
+CACHE = {
+    'enabled': os.environ.get('GOPREDICT_CACHE', '1') == '1',
+    'dir': os.environ.get('GOPREDICT_CACHE_DIR', 'data/cache'),
+    'keep': int(os.environ.get('GOPREDICT_CACHE_KEEP', 2)),
 }
 
 # Output paths
@@ -110,3 +146,64 @@ FEATURE_COLUMNS = {
 
 # Target column
 TARGET_COLUMN = 'duration'
+
+# API serving settings (each can be overridden with an environment variable)
+SERVING = {
+    # Thread pool for blocking I/O such as Meteostat weather lookups
+    'io_workers': int(os.environ.get('GOPREDICT_IO_WORKERS', 16)),
+    'io_max_queue': int(os.environ.get('GOPREDICT_IO_MAX_QUEUE', 64)),
+    'io_timeout_s': float(os.environ.get('GOPREDICT_IO_TIMEOUT_S', 10.0)),
+    # Pool for feature building and model inference
+    'inference_workers': int(os.environ.get('GOPREDICT_INFERENCE_WORKERS', os.cpu_count() or 2)),
+    'inference_max_queue': int(os.environ.get('GOPREDICT_INFERENCE_MAX_QUEUE', 256)),
+    'inference_timeout_s': float(os.environ.get('GOPREDICT_INFERENCE_TIMEOUT_S', 5.0)),
+    # Micro-batching of concurrent /predict calls; the window adapts between
+    # 0 (low traffic) and the max as load grows
+    'batching_enabled': os.environ.get('GOPREDICT_BATCHING', '1') == '1',
+    'batch_max_size': int(os.environ.get('GOPREDICT_BATCH_MAX_SIZE', 64)),
+    'batch_min_window_ms': float(os.environ.get('GOPREDICT_BATCH_MIN_WINDOW_MS', 0.5)),
+    'batch_max_window_ms': float(os.environ.get('GOPREDICT_BATCH_MAX_WINDOW_MS', 2.0)),
+    # Weather lookups: bulk table (DATA_PATHS['historical_weather']), then LRU+TTL cache
+    'weather_table': os.environ.get('GOPREDICT_WEATHER_TABLE', DATA_PATHS['historical_weather']),
+    'weather_table_radius_km': float(os.environ.get('GOPREDICT_WEATHER_TABLE_RADIUS_KM', 50.0)),
+    'weather_cache_size': int(os.environ.get('GOPREDICT_WEATHER_CACHE_SIZE', 10000)),
+    'weather_cache_ttl_s': float(os.environ.get('GOPREDICT_WEATHER_CACHE_TTL_S', 3600.0)),
+    'weather_offline': os.environ.get('GOPREDICT_WEATHER_OFFLINE', '0') == '1',
+    # Optional /predict result cache keyed by snapped origin/destination and hour-of-week
+    'prediction_cache_enabled': os.environ.get('GOPREDICT_PREDICTION_CACHE', '0') == '1',
+    'prediction_cache_grid_deg': float(os.environ.get('GOPREDICT_PREDICTION_CACHE_GRID_DEG', 0.001)),
+    'prediction_cache_size': int(os.environ.get('GOPREDICT_PREDICTION_CACHE_SIZE', 100000)),
+    # Load shedding: past either threshold /predict answers from the distance
+    # heuristic (flagged degraded) until both drop below resume_ratio of it;
+    # the queue depth counts waiting requests, including those in micro-batches
+    'shed_enabled': os.environ.get('GOPREDICT_LOAD_SHEDDING', '1') == '1',
+    'shed_queue_depth': int(os.environ.get('GOPREDICT_SHED_QUEUE_DEPTH', 128)),
+    'shed_latency_ms': float(os.environ.get('GOPREDICT_SHED_LATENCY_MS', 500.0)),
+    'shed_resume_ratio': float(os.environ.get('GOPREDICT_SHED_RESUME_RATIO', 0.5)),
+    'shed_probe_every': int(os.environ.get('GOPREDICT_SHED_PROBE_EVERY', 10)),
+    # Prediction mode of /predict: 'model', or 'table' to answer from the
+    # origin-destination duration table (DATA_PATHS['od_table']) and use the
+    # model only for cell pairs with fewer than od_table_min_count trips
+    'prediction_mode': os.environ.get('GOPREDICT_PREDICTION_MODE', 'model'),
+    'od_table': os.environ.get('GOPREDICT_OD_TABLE', DATA_PATHS['od_table']),
+    'od_table_min_count': int(os.environ.get('GOPREDICT_OD_TABLE_MIN_COUNT', 10)),
+    # Previous model set versions kept in memory for POST /models/rollback
+    'model_history': int(os.environ.get('GOPREDICT_MODEL_HISTORY', 2)),
+    # Batches up to this many rows use the flattened tree evaluator (0 disables it)
+    'tree_eval_max_rows': int(os.environ.get('GOPREDICT_TREE_EVAL_MAX_ROWS', 64)),
+    # ...for models of at most this many tree nodes; the flat copy costs ~10 bytes
+    # per node, so large forests keep model.predict (0 flattens any size)
+    'tree_eval_max_nodes': int(os.environ.get('GOPREDICT_TREE_EVAL_MAX_NODES', 2000000)),
+    # /predict/bulk: rows scored per chunk (bounds memory) and time allowed per chunk
+    'bulk_chunk_size': int(os.environ.get('GOPREDICT_BULK_CHUNK_SIZE', 10000)),
+    'bulk_chunk_timeout_s': float(os.environ.get('GOPREDICT_BULK_CHUNK_TIMEOUT_S', 120.0)),
+}
+
+# Holiday calendar (see src/features/holidays.py) of the 'holiday' feature, used
+# alike by feature engineering, the feature plans saved with the models and the
+# API; region is a key of features.holidays.REGIONS
+HOLIDAYS = {
+    'first_year': int(os.environ.get('GOPREDICT_HOLIDAY_FIRST_YEAR', 2012)),
+    'last_year': int(os.environ.get('GOPREDICT_HOLIDAY_LAST_YEAR', 2030)),
+    'region': os.environ.get('GOPREDICT_HOLIDAY_REGION', 'new_york'),
+}
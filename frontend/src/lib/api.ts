@@ -15,14 +15,19 @@ export interface PredictionRequest {
   };
   startTime: string;
   city: 'new_york' | 'san_francisco';
+  mode?: 'model' | 'table';
 }
 
 export interface PredictionResponse {
   minutes: number;
   confidence?: number;
+  model_name?: string;
   model_version?: string;
+  model_set_version?: number;
   distance_km?: number;
   city?: string;
+  degraded?: boolean;
+  source?: 'model' | 'od_table' | 'fallback';
 }
 
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
@@ -9,6 +9,10 @@ Usage:
     python main.py                           # Run complete pipeline
     python main.py --models XGB,RF           # Train specific models
     python main.py --tune-xgb                # Enable hyperparameter tuning
+    python main.py --chunk-size 500000       # Out-of-core feature engineering
+    python main.py --feature-workers 16      # Row-local feature stages on 16 processes
+    python main.py --force                   # Recompute every cached stage
+    python main.py --force features.cluster  # Recompute one stage
 """
 
 import argparse
@@ -42,6 +46,15 @@ def main():
                        help="Comma-separated list of models to train")
     parser.add_argument("--tune-xgb", action="store_true",
                        help="Enable XGBoost hyperparameter tuning")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                       help="Stream feature engineering in chunks of this many rows (0 loads the data whole)")
+    parser.add_argument("--feature-workers", type=int, default=None,
+                       help="Processes for the distance/time/precipitation/outlier features (1 runs them serially)")
+    parser.add_argument("--force", nargs="?", const="all", default=None, metavar="STAGES",
+                       help="Recompute cached stages instead of restoring them: all, or comma-separated "
+                            "names (preprocessing, features, features.cluster, od_table, ...)")
+    parser.add_argument("--no-cache", action="store_true",
+                       help="Do not read or write the stage cache")
     parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
                        default="INFO", help="Logging level")
     
@@ -61,13 +74,16 @@ def main():
     
     # Parse models
     models_to_run = [model.strip() for model in args.models.split(",")]
+    force = args.force == "all" or [stage.strip() for stage in (args.force or "").split(",") if stage.strip()]
     
     try:
         # Run complete pipeline
-        pipeline = CompleteMLPipeline()
+        pipeline = CompleteMLPipeline(force=force, use_cache=False if args.no_cache else None)
         results = pipeline.run_complete_pipeline(
             models_to_run=models_to_run,
-            tune_xgb=args.tune_xgb
+            tune_xgb=args.tune_xgb,
+            chunk_size=args.chunk_size,
+            feature_workers=args.feature_workers
         )
         
         logging.info("Pipeline completed successfully!")
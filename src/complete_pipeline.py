@@ -16,26 +16,42 @@ warnings.filterwarnings("ignore")
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
 import logging
-import os
 import sys
+import time
 from pathlib import Path
-import pandas as pd
 
-# Add src to path
+# Add src and the project root (config.py) to path
 sys.path.append(str(Path(__file__).parent))
+sys.path.append(str(Path(__file__).parent.parent))
+
+import config
 
 # Import preprocessing modules
+import data_preprocessing
+import feature_pipe
+import partition_executor
+import features.distance
+import features.geolocation
+import features.holidays
+import features.precipitation
+import features.time
 from data_preprocessing import load_data, preprocess, save_data as save_preprocessed_data
 from feature_pipe import (
-    load_eda_data, calc_manhattan_euclidean_dist, add_gmaps_features,
-    add_time_features, add_cluster_features, add_precipitation_data,
-    marking_outliers, save_feature_eng_data, cleanup_intermediate_files
+    load_eda_data, save_feature_eng_data, cleanup_intermediate_files,
+    run_chunked_feature_engineering, feature_stages, export_csv_copy
 )
 
 # Import model modules
-from model.models import run_complete_pipeline, run_regression_models
-from model.save_models import save_model, save_model_results
+from model.models import run_regression_models, NORMALIZED_MODELS
+from model.save_models import save_model, save_model_results, export_tree_ensemble, save_feature_plan
+from features.feature_plan import FeaturePlan
+from features.holidays import HolidayCalendar
 from model.evaluation import evaluate_model, compare_models
+from model import od_table as od_table_module
+from model.od_table import ODDurationTable, OD_TABLE_COLUMNS
+from dataset_store import get_store, read_dataset
+from stage_cache import StageCache, run_frame_stages
+from partition_executor import PartitionExecutor
 
 # Setup logging
 logging.basicConfig(
@@ -44,6 +60,9 @@ logging.basicConfig(
     datefmt="%Y-%m-%d %H:%M:%S"
 )
 
+# Step names reported to the progress callback of run_complete_pipeline
+PIPELINE_STAGES = ('preprocessing', 'feature_engineering', 'od_table', 'training', 'evaluation', 'prediction')
+
 class CompleteMLPipeline:
     """
     Complete End-to-End ML Pipeline
@@ -55,26 +74,48 @@ class CompleteMLPipeline:
     4. Prediction generation and submission
     """
     
-    def __init__(self, project_root=None):
+    def __init__(self, project_root=None, dataset_format=None, export_csv=None, force=False, use_cache=None):
         """
         Initialize the complete pipeline
         
         Args:
             project_root: Path to project root directory
+            dataset_format: Format of the intermediate datasets ('parquet', 'feather'
+                            or 'csv'; defaults to config.DATASETS['format'])
+            export_csv: Also write CSV copies of the feature engineered data
+                        (defaults to config.DATASETS['export_csv'])
+            force: Recompute cached stages instead of restoring them: True for
+                   all, or stage names ('preprocessing', 'features', 'features.cluster', ...)
+            use_cache: Use the stage cache (defaults to config.CACHE['enabled'])
         """
         if project_root is None:
             self.project_root = Path(__file__).resolve().parents[1]
         else:
             self.project_root = Path(project_root)
         
+        self.store = get_store(dataset_format or config.DATASETS['format'])
+        self.export_csv = config.DATASETS['export_csv'] if export_csv is None else export_csv
+        # One holiday calendar for the holiday feature and the feature plans
+        self.holiday_calendar = HolidayCalendar(**config.HOLIDAYS)
+        
         # Define all paths
         self.setup_paths()
         
+        # Outputs of preprocessing, feature engineering and the OD table keyed by
+        # a hash of their inputs, parameters and code
+        self.cache = StageCache(
+            self.project_root / config.CACHE['dir'],
+            enabled=config.CACHE['enabled'] if use_cache is None else use_cache,
+            force=force,
+            keep=config.CACHE['keep']
+        )
+        
         # Create necessary directories
         self.create_directories()
         
         logging.info(f"Complete ML Pipeline initialized")
         logging.info(f"Project root: {self.project_root}")
+        logging.info(f"Dataset format: {self.store.name}")
     
     def setup_paths(self):
         """Setup all file paths"""
@@ -83,17 +124,23 @@ class CompleteMLPipeline:
             'raw_train': self.project_root / "data" / "raw" / "train.csv",
             'raw_test': self.project_root / "data" / "raw" / "test.csv",
             
-            # Intermediate processed data paths
-            'eda_train': self.project_root / "data" / "processed" / "eda_processed_train.csv",
-            'eda_test': self.project_root / "data" / "processed" / "eda_processed_test.csv",
+            # Intermediate processed data paths (suffix of the dataset format)
+            'eda_train': self.store.path(self.project_root / "data" / "processed" / "eda_processed_train"),
+            'eda_test': self.store.path(self.project_root / "data" / "processed" / "eda_processed_test"),
             
             # Google Maps data paths
             'gmaps_train': self.project_root / "data" / "processed" / "gmapsdata" / "gmaps_train_data.csv",
             'gmaps_test': self.project_root / "data" / "processed" / "gmapsdata" / "gmaps_test_data.csv",
             
             # Final feature engineered data paths
-            'feature_train': self.project_root / "data" / "processed" / "feature_engineered_train.csv",
-            'feature_test': self.project_root / "data" / "processed" / "feature_engineered_test.csv",
+            'feature_train': self.store.path(self.project_root / "data" / "processed" / "feature_engineered_train"),
+            'feature_test': self.store.path(self.project_root / "data" / "processed" / "feature_engineered_test"),
+            
+            # DBSCAN core samples for assigning location clusters to new points
+            'location_index': self.project_root / "data" / "processed" / "location_index.npz",
+            
+            # Median duration per origin/destination cell and hour of week (memory-mapped by the API)
+            'od_table': self.project_root / "data" / "processed" / "od_table",
             
             # External data paths
             'precipitation': self.project_root / "data" / "external" / "precipitation.csv",
@@ -123,11 +170,26 @@ class CompleteMLPipeline:
         - Load raw data
         - Clean and preprocess data
         - Save intermediate processed data
+        
+        Restored from the stage cache when the raw data and preprocessing code
+        are unchanged.
         """
         logging.info("=" * 60)
         logging.info("STEP 1: DATA PREPROCESSING")
         logging.info("=" * 60)
         
+        outputs = {'eda_train': self.paths['eda_train'], 'eda_test': self.paths['eda_test']}
+        key = self.cache.key(
+            'preprocessing',
+            inputs=[self.paths['raw_train'], self.paths['raw_test']],
+            params={'format': self.store.name},
+            code=[data_preprocessing]
+        )
+        if self.cache.restore('preprocessing', key, outputs):
+            logging.info("✅ Preprocessed data restored from the stage cache!")
+            return read_dataset(self.paths['eda_train']), read_dataset(self.paths['eda_test'])
+        started = time.perf_counter()
+        
         # Load raw data
         logging.info("Loading raw data...")
         train_df, test_df = load_data(
@@ -152,11 +214,12 @@ class CompleteMLPipeline:
             str(self.paths['eda_train']),
             str(self.paths['eda_test'])
         )
+        self.cache.store('preprocessing', key, outputs, time.perf_counter() - started)
         
         logging.info("✅ Data preprocessing completed!")
         return train_df, test_df
     
-    def step2_feature_engineering(self):
+    def step2_feature_engineering(self, chunk_size=None, load=True, workers=None):
         """
         Step 2: Feature Engineering
         - Load preprocessed data
@@ -166,62 +229,68 @@ class CompleteMLPipeline:
         - Add cluster features
         - Add precipitation data
         - Mark outliers
+        
+        Args:
+            chunk_size: Stream the data in chunks of this many rows instead of
+                        loading it whole (defaults to config.DATASETS['feature_chunk_size'];
+                        0 runs in memory)
+            load: In chunked mode, read the feature engineered data back and return it
+                  (otherwise returns (None, None))
+            workers: Processes computing the row-local stages (distance, time,
+                     precipitation, outliers) on row partitions (defaults to
+                     config.DATASETS['feature_workers']; 1 runs them serially)
         """
         logging.info("=" * 60)
         logging.info("STEP 2: FEATURE ENGINEERING")
         logging.info("=" * 60)
         
-        # Load EDA processed data
-        logging.info("Loading preprocessed data...")
-        train_df, test_df = load_eda_data(
-            str(self.paths['eda_train']),
-            str(self.paths['eda_test'])
-        )
-        combine = [train_df, test_df]
-        
-        logging.info(f"Preprocessed train data shape: {train_df.shape}")
-        logging.info(f"Preprocessed test data shape: {test_df.shape}")
-        
-        # Add distance features
-        logging.info("Adding distance features...")
-        combine = calc_manhattan_euclidean_dist(combine)
-        logging.info("✅ Distance features added!")
-        
-        # Add Google Maps features
-        logging.info("Adding Google Maps features...")
-        combine = add_gmaps_features(
-            combine,
-            str(self.paths['gmaps_train']),
-            str(self.paths['gmaps_test'])
+        chunk_size = config.DATASETS['feature_chunk_size'] if chunk_size is None else chunk_size
+        workers = config.DATASETS['feature_workers'] if workers is None else workers
+        executor = PartitionExecutor(workers) if workers > 1 else None
+        try:
+            if chunk_size:
+                return self._chunked_feature_engineering(chunk_size, load, executor)
+            return self._in_memory_feature_engineering(executor)
+        finally:
+            if executor is not None:
+                executor.close()
+    
+    def _in_memory_feature_engineering(self, executor):
+        """Step 2 on whole tables, each sub-stage cached (see feature_pipe.feature_stages)"""
+        def load_preprocessed():
+            logging.info("Loading preprocessed data...")
+            train_df, test_df = load_eda_data(
+                str(self.paths['eda_train']),
+                str(self.paths['eda_test'])
+            )
+            logging.info(f"Preprocessed train data shape: {train_df.shape}")
+            logging.info(f"Preprocessed test data shape: {test_df.shape}")
+            return [train_df, test_df]
+        
+        # Distance, Google Maps, time, cluster, precipitation and outlier
+        # features, resuming from the last sub-stage found in the stage cache
+        stages = feature_stages(
+            self.paths['gmaps_train'],
+            self.paths['gmaps_test'],
+            location_index_path=self.paths['location_index'],
+            precipitation_path=self.paths['precipitation'],
+            eps=config.CLUSTERING['eps'],
+            min_sample=config.CLUSTERING['min_samples'],
+            cluster_method=config.CLUSTERING['method'],
+            grid_size=config.CLUSTERING['grid_size'],
+            executor=executor,
+            calendar=self.holiday_calendar
         )
-        logging.info("✅ Google Maps features added!")
-        
-        # Add time features
-        logging.info("Adding time features...")
-        combine = add_time_features(combine)
-        logging.info("✅ Time features added!")
-        
-        # Add cluster features
-        logging.info("Adding cluster features...")
-        combine = add_cluster_features(combine)
-        logging.info("✅ Cluster features added!")
-        
-        # Add precipitation data
-        logging.info("Adding precipitation data...")
-        combine = add_precipitation_data(combine)
-        logging.info("✅ Precipitation data added!")
-        
-        # Mark outliers
-        logging.info("Marking outliers...")
-        combine = marking_outliers(combine)
-        logging.info("✅ Outliers marked!")
+        combine = run_frame_stages(self.cache, stages, [self.paths['eda_train'], self.paths['eda_test']],
+                                   load_preprocessed)
         
         # Save feature engineered data
         logging.info("Saving feature engineered data...")
         train_df, test_df = save_feature_eng_data(
             combine[0], combine[1],
             str(self.paths['feature_train']),
-            str(self.paths['feature_test'])
+            str(self.paths['feature_test']),
+            export_csv=self.export_csv
         )
         
         logging.info(f"Final train data shape: {train_df.shape}")
@@ -237,6 +306,108 @@ class CompleteMLPipeline:
         logging.info("✅ Feature engineering completed!")
         return train_df, test_df
     
+    def _chunked_feature_engineering(self, chunk_size, load, executor=None):
+        """Step 2 streamed chunk by chunk (see feature_pipe.run_chunked_feature_engineering),
+        cached as a whole"""
+        outputs = {
+            'feature_train': self.paths['feature_train'],
+            'feature_test': self.paths['feature_test'],
+            'location_index': self.paths['location_index']
+        }
+        params = {
+            'chunk_size': chunk_size,
+            'sample_size': config.DATASETS['cluster_sample_size'],
+            'eps': config.CLUSTERING['eps'],
+            'min_sample': config.CLUSTERING['min_samples'],
+            'cluster_method': config.CLUSTERING['method'],
+            'grid_size': config.CLUSTERING['grid_size'] if config.CLUSTERING['method'] == 'grid' else None,
+            'holidays': self.holiday_calendar.settings
+        }
+        key = self.cache.key(
+            'features.chunked',
+            inputs=[self.paths[name] for name in ('eda_train', 'eda_test', 'gmaps_train', 'gmaps_test',
+                                                   'precipitation')],
+            params=params,
+            code=[feature_pipe, partition_executor, features.distance, features.time, features.holidays,
+                  features.geolocation, features.precipitation]
+        )
+        if self.cache.restore('features.chunked', key, outputs):
+            logging.info("✅ Feature engineered data restored from the stage cache!")
+            if self.export_csv:
+                export_csv_copy(self.paths['feature_train'], chunk_size)
+                export_csv_copy(self.paths['feature_test'], chunk_size)
+            if not load:
+                return None, None
+            return read_dataset(self.paths['feature_train']), read_dataset(self.paths['feature_test'])
+        
+        logging.info(f"Streaming feature engineering in chunks of {chunk_size} rows...")
+        started = time.perf_counter()
+        result = run_chunked_feature_engineering(
+            self.paths['eda_train'], self.paths['eda_test'],
+            self.paths['feature_train'], self.paths['feature_test'],
+            self.paths['gmaps_train'], self.paths['gmaps_test'],
+            location_index_path=self.paths['location_index'],
+            chunk_size=chunk_size,
+            sample_size=params['sample_size'],
+            eps=params['eps'],
+            min_sample=params['min_sample'],
+            cluster_method=params['cluster_method'],
+            grid_size=config.CLUSTERING['grid_size'],
+            precipitation_path=self.paths['precipitation'],
+            export_csv=self.export_csv,
+            executor=executor,
+            calendar=self.holiday_calendar
+        )
+        self.cache.store('features.chunked', key, outputs, time.perf_counter() - started)
+        logging.info(f"Final train rows: {result['train_rows']}, test rows: {result['test_rows']}")
+        
+        # Clean up intermediate files
+        logging.info("Cleaning up intermediate files...")
+        cleanup_intermediate_files(
+            Path(self.paths['eda_train']),
+            Path(self.paths['eda_test'])
+        )
+        
+        logging.info("✅ Feature engineering completed!")
+        if not load:
+            return None, None
+        return read_dataset(self.paths['feature_train']), read_dataset(self.paths['feature_test'])
+    
+    def build_od_table(self, train_df=None):
+        """
+        Step 2b: Origin-Destination Duration Table
+        - Aggregate the feature engineered training data into the median
+          duration per (origin cell, destination cell, hour of week)
+        - Save it for table-mode predictions in the API
+        
+        Args:
+            train_df: Feature engineered training data (read from the dataset
+                      store, only the columns the table needs, if None)
+        """
+        logging.info("=" * 60)
+        logging.info("STEP 2b: OD DURATION TABLE")
+        logging.info("=" * 60)
+        
+        outputs = {'od_table': self.paths['od_table']}
+        key = self.cache.key('od_table', inputs=[self.paths['feature_train']], code=[od_table_module])
+        if self.cache.restore('od_table', key, outputs):
+            logging.info("✅ OD duration table restored from the stage cache!")
+            return ODDurationTable.load(self.paths['od_table'])
+        started = time.perf_counter()
+        
+        if train_df is None:
+            train_df = read_dataset(self.paths['feature_train'], columns=OD_TABLE_COLUMNS)
+        
+        od_table = ODDurationTable.build(train_df)
+        od_table.save(self.paths['od_table'])
+        self.cache.store('od_table', key, outputs, time.perf_counter() - started)
+        
+        stats = od_table.stats()
+        logging.info(f"OD table: {stats['entries']} cell pairs from {stats['trips']} trips, "
+                     f"{stats['bytes'] / 1024 ** 2:.1f} MB")
+        logging.info("✅ OD duration table saved!")
+        return od_table
+    
     def step3_model_training(self, train_df, models_to_run=None, tune_xgb=False):
         """
         Step 3: Model Training
@@ -256,6 +427,10 @@ class CompleteMLPipeline:
         # Train models
         models = run_regression_models(train_df, models_to_run)
         
+        # Column order and lookups the API needs to rebuild these features
+        feature_plan = FeaturePlan.fit(train_df, self.paths['precipitation'], self.paths['location_index'],
+                                       calendar=self.holiday_calendar)
+        
         # Save trained models
         logging.info("Saving trained models...")
         saved_models = {}
@@ -263,8 +438,12 @@ class CompleteMLPipeline:
             model_path = save_model(
                 model=model,
                 model_name=model_name.replace(' ', '_').lower(),
-                output_dir=str(self.paths['models'])
+                output_dir=str(self.paths['models']),
+                metadata={'display_name': model_name}
             )
+            export_tree_ensemble(model, model_path, max_nodes=config.SERVING['tree_eval_max_nodes'])
+            if model_name not in NORMALIZED_MODELS:
+                save_feature_plan(feature_plan, model_path)
             saved_models[model_name] = model_path
             logging.info(f"✅ Saved {model_name}")
         
@@ -296,7 +475,7 @@ class CompleteMLPipeline:
             logging.info(f"Evaluating {model_name}...")
             
             # Make predictions
-            if model_name in ['Linear Regression', 'Ridge Regression', 'Lasso Regression', 'Neural Network']:
+            if model_name in NORMALIZED_MODELS:
                 # Use normalized data for these models
                 from model.models import normalize_features
                 Xn = normalize_features(X)
@@ -365,13 +544,17 @@ class CompleteMLPipeline:
         logging.info("✅ Prediction generation completed!")
         return test_predictions, submission_file
     
-    def run_complete_pipeline(self, models_to_run=None, tune_xgb=False):
+    def run_complete_pipeline(self, models_to_run=None, tune_xgb=False, progress=None, chunk_size=None,
+                              feature_workers=None):
         """
         Run the complete end-to-end pipeline
         
         Args:
             models_to_run: List of models to train
             tune_xgb: Whether to perform XGBoost hyperparameter tuning
+            progress: Optional callback progress(stage, index, total) called before each step
+            chunk_size: Run feature engineering out of core in chunks of this many rows
+            feature_workers: Processes for the row-local feature stages
         
         Returns:
             dict: Complete pipeline results
@@ -379,20 +562,33 @@ class CompleteMLPipeline:
         logging.info("🚀 Starting Complete End-to-End ML Pipeline")
         logging.info("=" * 80)
         
+        def report(stage, index):
+            if progress is not None:
+                progress(stage, index, len(PIPELINE_STAGES))
+        
         try:
             # Step 1: Data Preprocessing
+            report(PIPELINE_STAGES[0], 0)
             train_df_preprocessed, test_df_preprocessed = self.step1_data_preprocessing()
             
             # Step 2: Feature Engineering
-            train_df_features, test_df_features = self.step2_feature_engineering()
+            report(PIPELINE_STAGES[1], 1)
+            train_df_features, test_df_features = self.step2_feature_engineering(chunk_size, workers=feature_workers)
+            
+            # Step 2b: OD Duration Table
+            report(PIPELINE_STAGES[2], 2)
+            self.build_od_table(train_df_features)
             
             # Step 3: Model Training
+            report(PIPELINE_STAGES[3], 3)
             models, saved_models = self.step3_model_training(train_df_features, models_to_run, tune_xgb)
             
             # Step 4: Model Evaluation
+            report(PIPELINE_STAGES[4], 4)
             evaluation_results, comparison_df = self.step4_model_evaluation(models, train_df_features)
             
             # Step 5: Prediction Generation
+            report(PIPELINE_STAGES[5], 5)
             test_predictions, submission_file = self.step5_prediction_generation(
                 models, test_df_features, comparison_df
             )
@@ -421,6 +617,10 @@ class CompleteMLPipeline:
             logging.info(f"   Best RMSE: {results['best_rmse']:.4f}")
             logging.info(f"   Submission file: {results['submission_file']}")
             
+            results['cache'] = self.cache.report
+            for line in self.cache.summary():
+                logging.info(line)
+            
             return results
             
         except Exception as e:
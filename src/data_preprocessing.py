@@ -2,12 +2,13 @@ import warnings
 warnings.filterwarnings("ignore")
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
-import os
 import logging
 import pandas as pd
 
 from pathlib import Path
 
+from dataset_store import write_dataset
+
 PROJECT_ROOT = Path(__file__).resolve().parents[1]  
 logging.basicConfig(
     level=logging.INFO,
@@ -101,16 +102,14 @@ def preprocess(train_df, test_df):
 
 
 def save_data(train_df, test_df, train_output_path, test_output_path):
-    '''Save processed train and test data to specified paths.'''
-    os.makedirs(os.path.dirname(train_output_path), exist_ok=True)
-    os.makedirs(os.path.dirname(test_output_path), exist_ok=True)
-    
+    '''Save processed train and test data to specified paths; the format
+    (.parquet, .feather or .csv) follows the file suffix (see dataset_store.py)'''
     # Preserve row_id as index
     train_df.index.name = 'row_id'
     test_df.index.name = 'row_id'
     
-    train_df.to_csv(train_output_path, index=True, index_label='row_id')
-    test_df.to_csv(test_output_path, index=True, index_label='row_id')
+    write_dataset(train_df, train_output_path)
+    write_dataset(test_df, test_output_path)
     
 
 
@@ -0,0 +1,330 @@
+"""
+Dataset stores for the pipeline's intermediate tables.
+
+Preprocessing and feature engineering hand their tables to the next step
+(and to training jobs) through files. As CSV every float and timestamp is
+formatted as text and parsed again on each read, which dominates pipeline
+wall time and loses dtypes on the way (datetimes come back as strings).
+
+A DatasetStore writes a frame in one format and reads it back with the same
+dtypes:
+
+- ParquetStore: compressed columnar file (default), column-projected reads
+- FeatherStore: uncompressed Arrow IPC file, memory-mapped reads
+- CsvStore: the previous text format, kept for export and for tools that
+  need CSV; reads apply DATASET_SCHEMA so dtypes match the binary formats
+
+Columns listed in DATASET_SCHEMA are cast to their dtype before writing, so
+a table reads back identically whatever the format. The row_id index is
+stored as a column and restored on read. read_dataset()/write_dataset()
+pick the store from the file suffix, so callers passing .csv paths keep
+their behaviour. Parquet and Feather require pyarrow.
+
+For tables larger than memory, iter_chunks() reads a dataset as frames of
+at most chunk_size rows and writer() appends frames to a new dataset one at
+a time (see feature_pipe.run_chunked_feature_engineering).
+"""
+
+import logging
+import os
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pyarrow is optional; only CSV datasets are then available
+    pyarrow = None
+
+INDEX_COLUMN = 'row_id'
+
+# dtype of every column the pipeline writes (raw, preprocessed and feature tables)
+DATASET_SCHEMA = {
+    'start_lng': 'float64',
+    'start_lat': 'float64',
+    'end_lng': 'float64',
+    'end_lat': 'float64',
+    'datetime': 'datetime64[ns]',
+    'duration': 'float64',
+    'manhattan': 'float64',
+    'euclidean': 'float64',
+    'gmaps_distance': 'float64',
+    'gmaps_duration': 'float64',
+    'weekday': 'int64',
+    'hour': 'int64',
+    'holiday': 'int64',
+    'airport': 'int64',
+    'citycenter': 'int64',
+    'standalone': 'int64',
+    'precipitation': 'float64',
+    'routing_error': 'float64',
+    'short_trip': 'float64',
+}
+
+
+def apply_schema(df, schema=None):
+    """Cast the columns of df listed in schema to their dtype (returns a new frame if any change)"""
+    schema = DATASET_SCHEMA if schema is None else schema
+    casts = {c: dtype for c, dtype in schema.items() if c in df.columns and str(df[c].dtype) != dtype}
+    if not casts:
+        return df
+    try:
+        return df.astype(casts)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Dataset does not match the schema ({casts}): {e}") from e
+
+
+def _with_index_column(df):
+    df = apply_schema(df)
+    if df.index.name is None:
+        df = df.rename_axis(INDEX_COLUMN)
+    return df.reset_index()
+
+
+def _restore_index(df):
+    if INDEX_COLUMN in df.columns:
+        df = df.set_index(INDEX_COLUMN)
+    return df
+
+
+def _projection(columns):
+    if columns is None:
+        return None
+    return [INDEX_COLUMN] + [c for c in columns if c != INDEX_COLUMN]
+
+
+class DatasetStore:
+    """Writes and reads DataFrames in one file format"""
+
+    name = None
+    suffix = None
+
+    def path(self, stem):
+        """Path of the dataset stem (a path without suffix) in this format"""
+        stem = Path(stem)
+        return stem.with_name(stem.name + self.suffix)
+
+    def write(self, df, path):
+        raise NotImplementedError
+
+    def read(self, path, columns=None):
+        """
+        Read a dataset written by write().
+
+        Args:
+            path: Dataset file
+            columns: Columns to read (None reads all); the row_id index is always read
+        """
+        raise NotImplementedError
+
+    def iter_chunks(self, path, chunk_size, columns=None):
+        """Read a dataset as consecutive frames of at most chunk_size rows"""
+        raise NotImplementedError
+
+    def writer(self, path):
+        """ChunkWriter appending frames to a new dataset at path (use as a context manager)"""
+        raise NotImplementedError
+
+
+class ChunkWriter:
+    """Writes a dataset one frame at a time; every frame must have the same columns"""
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.chunks = 0
+
+    def write(self, df):
+        self._write(df)
+        self.rows += len(df)
+        self.chunks += 1
+
+    def _write(self, df):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _CsvChunkWriter(ChunkWriter):
+    def _write(self, df):
+        _with_index_column(df).to_csv(self.path, index=False, mode='a' if self.chunks else 'w',
+                                      header=not self.chunks)
+
+    def close(self):
+        if not self.chunks:
+            # No frames written: leave an empty dataset with only the index column
+            with open(self.path, 'w') as f:
+                f.write(INDEX_COLUMN + '\n')
+
+
+class _ArrowChunkWriter(ChunkWriter):
+    """Appends record batches; later frames are cast to the schema of the first"""
+
+    def __init__(self, path, open_writer):
+        super().__init__(path)
+        self._open_writer = open_writer
+        self._writer = None
+        self._schema = None
+
+    def _write(self, df):
+        table = pyarrow.Table.from_pandas(_with_index_column(df), preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema
+            self._writer = self._open_writer(self.path, self._schema)
+        else:
+            table = table.cast(self._schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is None:
+            # No frames written: leave an empty dataset with only the index column
+            self._write(pd.DataFrame(index=pd.Index([], name=INDEX_COLUMN, dtype='int64')))
+        self._writer.close()
+
+
+class CsvStore(DatasetStore):
+    name = 'csv'
+    suffix = '.csv'
+
+    def write(self, df, path):
+        _with_index_column(df).to_csv(path, index=False)
+
+    def read(self, path, columns=None):
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = [c for c in _projection(columns) if c in header] if columns is not None else None
+        selected = usecols if usecols is not None else header
+        dtypes = {c: t for c, t in DATASET_SCHEMA.items() if c in selected and not t.startswith('datetime')}
+        dates = [c for c, t in DATASET_SCHEMA.items() if c in selected and t.startswith('datetime')]
+        # round_trip parses floats back to the exact values written
+        df = pd.read_csv(path, usecols=usecols, dtype=dtypes, parse_dates=dates, float_precision='round_trip')
+        return _restore_index(apply_schema(df))
+
+    def iter_chunks(self, path, chunk_size, columns=None):
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = [c for c in _projection(columns) if c in header] if columns is not None else None
+        selected = usecols if usecols is not None else header
+        dtypes = {c: t for c, t in DATASET_SCHEMA.items() if c in selected and not t.startswith('datetime')}
+        dates = [c for c, t in DATASET_SCHEMA.items() if c in selected and t.startswith('datetime')]
+        for chunk in pd.read_csv(path, usecols=usecols, dtype=dtypes, parse_dates=dates,
+                                 float_precision='round_trip', chunksize=chunk_size):
+            yield _restore_index(apply_schema(chunk))
+
+    def writer(self, path):
+        return _CsvChunkWriter(path)
+
+
+class ParquetStore(DatasetStore):
+    name = 'parquet'
+    suffix = '.parquet'
+
+    def __init__(self, compression='snappy'):
+        self.compression = compression
+
+    def write(self, df, path):
+        table = pyarrow.Table.from_pandas(_with_index_column(df), preserve_index=False)
+        pyarrow.parquet.write_table(table, path, compression=self.compression)
+
+    def read(self, path, columns=None):
+        table = pyarrow.parquet.read_table(path, columns=_projection(columns), memory_map=True)
+        return _restore_index(table.to_pandas())
+
+    def iter_chunks(self, path, chunk_size, columns=None):
+        parquet_file = pyarrow.parquet.ParquetFile(path, memory_map=True)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=_projection(columns)):
+            yield _restore_index(batch.to_pandas())
+
+    def writer(self, path):
+        return _ArrowChunkWriter(
+            path, lambda p, schema: pyarrow.parquet.ParquetWriter(p, schema, compression=self.compression)
+        )
+
+
+class FeatherStore(DatasetStore):
+    name = 'feather'
+    suffix = '.feather'
+
+    def __init__(self, compression='uncompressed'):
+        """compression: 'uncompressed' lets reads map the file instead of decompressing it"""
+        self.compression = compression
+
+    def write(self, df, path):
+        pyarrow.feather.write_feather(_with_index_column(df), path, compression=self.compression)
+
+    def read_table(self, path, columns=None):
+        """Memory-mapped Arrow table of the dataset (no copy for uncompressed files)"""
+        return pyarrow.feather.read_table(path, columns=_projection(columns), memory_map=True)
+
+    def read(self, path, columns=None):
+        return _restore_index(self.read_table(path, columns).to_pandas())
+
+    def iter_chunks(self, path, chunk_size, columns=None):
+        # Slices of the mapped table: only the current chunk is converted to pandas
+        table = self.read_table(path, columns)
+        for offset in range(0, table.num_rows, chunk_size):
+            yield _restore_index(table.slice(offset, chunk_size).to_pandas())
+
+    def writer(self, path):
+        compression = None if self.compression == 'uncompressed' else self.compression
+        options = pyarrow.ipc.IpcWriteOptions(compression=compression)
+        return _ArrowChunkWriter(path, lambda p, schema: pyarrow.ipc.new_file(p, schema, options=options))
+
+
+DATASET_STORES = {store.name: store for store in (CsvStore, ParquetStore, FeatherStore)}
+ARROW_FORMATS = ('parquet', 'feather')
+
+
+def get_store(fmt='parquet'):
+    """
+    Dataset store for a format name ('parquet', 'feather' or 'csv').
+
+    Falls back to CSV with a warning when pyarrow is not installed.
+    """
+    if fmt not in DATASET_STORES:
+        raise ValueError(f"Unknown dataset format '{fmt}'; expected one of {list(DATASET_STORES)}")
+    if fmt in ARROW_FORMATS and pyarrow is None:
+        logging.warning(f"pyarrow is not installed; writing {fmt} datasets as CSV instead")
+        fmt = 'csv'
+    return DATASET_STORES[fmt]()
+
+
+def store_for_path(path):
+    """Dataset store matching the suffix of path"""
+    suffix = Path(path).suffix.lower()
+    for store in DATASET_STORES.values():
+        if store.suffix == suffix:
+            if store.name in ARROW_FORMATS and pyarrow is None:
+                raise ImportError(f"Reading or writing {path} requires pyarrow")
+            return store()
+    raise ValueError(f"Unknown dataset file type '{suffix}' ({path})")
+
+
+def write_dataset(df, path):
+    """Write df to path in the format of its suffix, creating the directory"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    store_for_path(path).write(df, path)
+
+
+def read_dataset(path, columns=None):
+    """Read the dataset at path in the format of its suffix, optionally only some columns"""
+    return store_for_path(path).read(path, columns)
+
+
+def iter_dataset(path, chunk_size, columns=None):
+    """Read the dataset at path as frames of at most chunk_size rows"""
+    return store_for_path(path).iter_chunks(path, chunk_size, columns)
+
+
+def dataset_writer(path):
+    """ChunkWriter for a new dataset at path in the format of its suffix"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return store_for_path(path).writer(path)
@@ -5,10 +5,19 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 import logging
 import numpy as np
 import pandas as pd
+import features.distance
+import features.geolocation
+import features.holidays
+import features.precipitation
+import features.time
 from features.distance import calc_distance
 from features.time import extract_time_features
-from features.geolocation import clustering
-from features.precipitation import extract_precipitation_data
+from features.holidays import get_calendar
+from features.geolocation import clustering, fit_location_index, add_location_flags
+from features.precipitation import extract_precipitation_data, load_precipitation, merge_precipitation
+from dataset_store import read_dataset, write_dataset, iter_dataset, dataset_writer, CsvStore
+from stage_cache import FrameStage
+from partition_executor import distance_kernel, time_kernel, precipitation_kernel, outlier_kernel
 
 
 from pathlib import Path
@@ -21,85 +30,144 @@ logging.basicConfig(
 )
 
 def load_eda_data(train_path, test_path):
-    '''Load EDA Processed train and test CSV files'''
-    train_df = pd.read_csv(train_path, index_col='row_id')
-    test_df = pd.read_csv(test_path, index_col='row_id')
+    '''Load EDA Processed train and test data (.parquet, .feather or .csv)'''
+    train_df = read_dataset(train_path)
+    test_df = read_dataset(test_path)
 
     return train_df,test_df
 
 
-def calc_manhattan_euclidean_dist(combine_df):
-    '''Calculating Manhattan and Euclidean (Havesine) distances'''
+def calc_manhattan_euclidean_dist(combine_df, executor=None):
+    '''Calculating Manhattan and Euclidean (Havesine) distances; with a
+    PartitionExecutor the rows are computed in parallel'''
 
     for df in combine_df:
+        if executor is not None:
+            coordinates = {c: df[c].to_numpy() for c in ('start_lat', 'start_lng', 'end_lat', 'end_lng')}
+            distances = executor.map(distance_kernel, coordinates)
+            df['manhattan'] = distances['manhattan']
+            df['euclidean'] = distances['euclidean']
+            continue
         df['manhattan'] = calc_distance(df,method='manhattan')
         df['euclidean'] = calc_distance(df,method='euclidean')
 
     return combine_df
 
 
+def load_gmaps_data(gmaps_path):
+    '''Load pre-generated gmaps data indexed by row_id, without rows that have NaNs'''
+    gmaps = pd.read_csv(gmaps_path, index_col='row_id')
+    return gmaps.dropna(subset=["gmaps_distance","gmaps_duration"])
+
+
+def join_gmaps_features(df, gmaps):
+    '''Add the gmaps features of df's rows (in place), fix Treasure Island
+    routing errors and drop rows without gmaps data'''
+    df['gmaps_distance'] = gmaps['gmaps_distance']
+    df['gmaps_duration'] = gmaps['gmaps_duration']
+
+    # Handle Treasure Island routing errors (0 distance cases)
+    TI_df = df[df['gmaps_distance']==0].loc[df.manhattan>2000]
+    # Replace with manhattan distance
+    df.loc[TI_df.index,"gmaps_distance"] = TI_df.manhattan
+    # Approximate gmaps_duration 
+    df.loc[TI_df.index,"gmaps_duration"] = TI_df.manhattan/11.0
+
+    # Finally, drop any rows that still have NaNs in gmaps metrics
+    df.dropna(subset=["gmaps_distance","gmaps_duration"], inplace=True)
+    return df
+
+
 def add_gmaps_features(combine_df, train_gmaps_path, test_gmaps_path):
     '''Add Google Maps distance and duration features from pre-generated data'''
     
     # Load pre-generated gmaps data
-    gmaps_train = pd.read_csv(train_gmaps_path, index_col='row_id')
-    gmaps_test = pd.read_csv(test_gmaps_path, index_col='row_id')
+    gmaps_train = load_gmaps_data(train_gmaps_path)
+    gmaps_test = load_gmaps_data(test_gmaps_path)
 
-    # Drop rows with NaNs in gmaps metrics from source files
-    gmaps_train = gmaps_train.dropna(subset=["gmaps_distance","gmaps_duration"])  
-    gmaps_test = gmaps_test.dropna(subset=["gmaps_distance","gmaps_duration"])  
-    
-    # Add gmaps features to train data
-    train_df = combine_df[0]
-    train_df['gmaps_distance'] = gmaps_train['gmaps_distance']
-    train_df['gmaps_duration'] = gmaps_train['gmaps_duration']
-    
-    # Add gmaps features to test data  
-    test_df = combine_df[1]
-    test_df['gmaps_distance'] = gmaps_test['gmaps_distance']
-    test_df['gmaps_duration'] = gmaps_test['gmaps_duration']
-    
-    # Handle Treasure Island routing errors (0 distance cases)
-    for df in combine_df:
-        TI_df = df[df['gmaps_distance']==0].loc[df.manhattan>2000]
-        # Replace with manhattan distance
-        df.loc[TI_df.index,"gmaps_distance"] = TI_df.manhattan
-        # Approximate gmaps_duration 
-        df.loc[TI_df.index,"gmaps_duration"] = TI_df.manhattan/11.0
-    
-    # Finally, drop any rows that still have NaNs in gmaps metrics
-    train_df.dropna(subset=["gmaps_distance","gmaps_duration"], inplace=True)
-    test_df.dropna(subset=["gmaps_distance","gmaps_duration"], inplace=True)
+    join_gmaps_features(combine_df[0], gmaps_train)
+    join_gmaps_features(combine_df[1], gmaps_test)
     
     return combine_df
 
 
-def add_time_features(combine_df):
+def add_time_features(combine_df, executor=None, calendar=None):
     '''Extract weekdays,hour and date columns and drop datetime
-    column. Add holidays column'''
-    extract_time_features(combine_df)
+    column. Add holidays column from calendar (a HolidayCalendar,
+    the default-range one if None)'''
+    if calendar is None:
+        calendar = get_calendar()
+    if executor is None:
+        extract_time_features(combine_df, calendar)
+        return combine_df
+
+    for df in combine_df:
+        df['datetime'] = pd.to_datetime(df['datetime'])
+        features = executor.map(time_kernel, {'datetime': df['datetime'].to_numpy()},
+                                {'holidays': calendar.dates})
+        for column in ('weekday', 'hour', 'date', 'holiday'):
+            df[column] = features[column]
+        df.drop(columns=['datetime'], inplace=True)
     return combine_df
 
 
-def add_cluster_features(combine_df):
+def add_cluster_features(combine_df, location_index_path=None, eps=0.005, min_sample=2500,
+                         method='exact', grid_size=0.0005):
     ''' Run DBSCAN clustering on coordinates to group locations 
-    into clusters of airports,city centers etc '''
+    into clusters of airports,city centers etc. The cluster core samples
+    are saved to location_index_path so new points can be assigned later.
+    method 'grid' clusters grid cells of grid_size degrees instead of points '''
     train_df = combine_df[0]
     test_df = combine_df[1]
 
-    clustering(train_df,test_df)
+    clustering(train_df,test_df,index_path=location_index_path,eps=eps,min_sample=min_sample,
+               method=method,grid_size=grid_size)
     return combine_df
 
 
-def add_precipitation_data(combine_df):
+def add_precipitation_data(combine_df, precipitation_path=None, executor=None):
     '''Add precipitation values to train/test df'''
-    extract_precipitation_data(combine_df)
+    if executor is None:
+        extract_precipitation_data(combine_df, precipitation_path)
+        return combine_df
+
+    precipitate = load_precipitation(precipitation_path)
+    for i in range(len(combine_df)):
+        combine_df[i] = lookup_precipitation(combine_df[i], precipitate, executor)
     return combine_df
 
 
-def marking_outliers(combine_df):
+def lookup_precipitation(df, precipitate, executor):
+    '''merge_precipitation computed on the executor: a lookup of each row's
+    date instead of a merge (falls back to the merge if dates repeat, where
+    the merge would repeat rows)'''
+    dates = pd.to_datetime(precipitate['date']).astype('datetime64[ns]')
+    if dates.empty or dates.duplicated().any():
+        return merge_precipitation(df, precipitate)
+    order = np.argsort(dates.to_numpy(), kind='stable')
+    table = {
+        'dates': dates.to_numpy()[order],
+        'values': precipitate['precipitation'].fillna(0.0).to_numpy(dtype=np.float64)[order],
+    }
+    days = pd.to_datetime(df['date']).dt.normalize().astype('datetime64[ns]').to_numpy()
+    values = executor.map(precipitation_kernel, {'date': days}, table)['precipitation']
+
+    # Same frame as the merge: date dropped, precipitation last, new RangeIndex
+    df = df.drop(columns=['date'])
+    df['precipitation'] = values
+    df.index = pd.RangeIndex(len(df))
+    return df
+
+
+def marking_outliers(combine_df, executor=None):
     '''marking routing errors and short trips'''
     for df in combine_df: 
+        if executor is not None:
+            columns = {'gmaps_distance': df['gmaps_distance'].to_numpy(), 'manhattan': df['manhattan'].to_numpy()}
+            flags = executor.map(outlier_kernel, columns)
+            df['routing_error'] = flags['routing_error']
+            df['short_trip'] = flags['short_trip']
+            continue
         df['routing_error'] = np.zeros(df.index.shape)
         df['short_trip'] = np.zeros(df.index.shape)
 
@@ -108,22 +176,43 @@ def marking_outliers(combine_df):
 
     return combine_df
     
-def save_feature_eng_data(train_df, test_df, train_output_path, test_output_path):
-    '''Save Feature engineered train and test data to specified paths.'''
+def save_feature_eng_data(train_df, test_df, train_output_path, test_output_path, export_csv=False):
+    '''Save Feature engineered train and test data to specified paths in the
+    format of their suffix; export_csv also writes a .csv copy next to each'''
     
     train_df.index.name = 'row_id'
     test_df.index.name = 'row_id'
 
     # Save feature engineered data with index label
-    train_df.to_csv(train_output_path, index=True, index_label='row_id')
-    test_df.to_csv(test_output_path, index=True, index_label='row_id')
+    write_dataset(train_df, train_output_path)
+    write_dataset(test_df, test_output_path)
     
     logging.info(f"Feature engineered train data saved to: {train_output_path}")
     logging.info(f"Feature engineered test data saved to: {test_output_path}")
+
+    if export_csv:
+        csv = CsvStore()
+        for df, path in ((train_df, train_output_path), (test_df, test_output_path)):
+            csv_path = Path(path).with_suffix(csv.suffix)
+            if csv_path != Path(path):
+                csv.write(df, csv_path)
+                logging.info(f"Exported CSV copy to: {csv_path}")
     
     return train_df, test_df
 
 
+def export_csv_copy(path, chunk_size=100000):
+    '''Write a .csv copy next to the dataset at path, chunk by chunk'''
+    csv = CsvStore()
+    csv_path = Path(path).with_suffix(csv.suffix)
+    if csv_path == Path(path):
+        return
+    with csv.writer(csv_path) as csv_writer:
+        for chunk in iter_dataset(path, chunk_size):
+            csv_writer.write(chunk)
+    logging.info(f"Exported CSV copy to: {csv_path}")
+
+
 def cleanup_intermediate_files(eda_train_path, eda_test_path):
     '''Delete intermediate EDA processed files after feature engineering is complete'''
     
@@ -140,6 +229,165 @@ def cleanup_intermediate_files(eda_train_path, eda_test_path):
         logging.warning(f"Could not delete intermediate files: {e}")
 
 
+# ===============================
+# CACHED STAGES
+# ===============================
+
+def feature_stages(train_gmaps_path, test_gmaps_path, location_index_path=None, precipitation_path=None,
+                   eps=0.005, min_sample=2500, cluster_method='exact', grid_size=0.0005, executor=None,
+                   calendar=None):
+    '''The in-memory feature engineering steps as FrameStages (for
+    stage_cache.run_frame_stages), each with the parameters, files and code
+    its output depends on. With a PartitionExecutor the row-local stages
+    (distance, time, precipitation, outliers) run in parallel; their output
+    is the same either way, so it is not part of the cache key. calendar is
+    the HolidayCalendar of the holiday column'''
+    if calendar is None:
+        calendar = get_calendar()
+    gmaps_paths = [Path(train_gmaps_path), Path(test_gmaps_path)]
+    if precipitation_path is None:
+        precipitation_path = PROJECT_ROOT / 'data' / 'external' / 'precipitation.csv'
+    return [
+        FrameStage('features.distance', lambda combine: calc_manhattan_euclidean_dist(combine, executor),
+                   'distance features', code=[calc_manhattan_euclidean_dist, features.distance, distance_kernel]),
+        FrameStage('features.gmaps', lambda combine: add_gmaps_features(combine, *gmaps_paths),
+                   'Google Maps features', inputs=gmaps_paths,
+                   code=[add_gmaps_features, load_gmaps_data, join_gmaps_features]),
+        FrameStage('features.time', lambda combine: add_time_features(combine, executor, calendar),
+                   'time features', params={'holidays': calendar.settings},
+                   code=[add_time_features, features.time, features.holidays, time_kernel]),
+        FrameStage('features.cluster',
+                   lambda combine: add_cluster_features(combine, location_index_path, eps, min_sample,
+                                                        cluster_method, grid_size),
+                   'cluster features',
+                   params={'eps': eps, 'min_sample': min_sample, 'method': cluster_method,
+                           'grid_size': grid_size if cluster_method == 'grid' else None},
+                   code=[add_cluster_features, features.geolocation],
+                   artifacts={'location_index': location_index_path} if location_index_path else None),
+        FrameStage('features.precipitation',
+                   lambda combine: add_precipitation_data(combine, precipitation_path, executor),
+                   'precipitation data', inputs=[Path(precipitation_path)],
+                   code=[add_precipitation_data, lookup_precipitation, features.precipitation,
+                         precipitation_kernel]),
+        FrameStage('features.outliers', lambda combine: marking_outliers(combine, executor), 'outlier flags',
+                   code=[marking_outliers, outlier_kernel]),
+    ]
+
+
+# ===============================
+# CHUNKED (OUT-OF-CORE) EXECUTION
+# ===============================
+
+def sample_cluster_coordinates(sources, gmaps_tables, chunk_size, sample_size, seed=0):
+    '''Uniform sample of at most sample_size trip endpoints of the source datasets,
+    streamed chunk by chunk. Only rows with gmaps data are sampled (the in-memory
+    path clusters after the gmaps join drops the others), and the sample keeps
+    the point order of prepare_coordinates (all starts, then all ends) so DBSCAN
+    numbers its clusters as on the full data.
+
+    Returns (lat, lng, total number of endpoints)'''
+    rng = np.random.default_rng(seed)
+    kept = None
+    total = 0
+    for source_id, (source, gmaps) in enumerate(zip(sources, gmaps_tables)):
+        position = 0
+        columns = ['start_lat', 'start_lng', 'end_lat', 'end_lng']
+        for chunk in iter_dataset(source, chunk_size, columns=columns):
+            chunk = chunk[chunk.index.isin(gmaps.index)]
+            n = len(chunk)
+            rows = np.arange(position, position + n)
+            position += n
+            points = np.column_stack([
+                np.r_[np.zeros(n), np.ones(n)],                   # 0 = start, 1 = end
+                np.full(2 * n, source_id),
+                np.r_[rows, rows],
+                np.r_[chunk.start_lat.to_numpy(), chunk.end_lat.to_numpy()],
+                np.r_[chunk.start_lng.to_numpy(), chunk.end_lng.to_numpy()],
+                rng.random(2 * n),                                # sampling key
+            ])
+            total += 2 * n
+            # Bottom-k sampling: keep the sample_size points with the smallest keys
+            kept = points if kept is None else np.vstack([kept, points])
+            if len(kept) > sample_size:
+                kept = kept[np.argpartition(kept[:, 5], sample_size - 1)[:sample_size]]
+    if kept is None:
+        return np.empty(0), np.empty(0), 0
+    kept = kept[np.lexsort((kept[:, 2], kept[:, 1], kept[:, 0]))]
+    return kept[:, 3], kept[:, 4], total
+
+
+def engineer_chunk(df, gmaps, location_index, precipitate, executor=None, calendar=None):
+    '''Run the row-local feature stages on one chunk, in the order of the
+    in-memory pipeline; location flags come from location_index'''
+    calc_manhattan_euclidean_dist([df], executor)
+    join_gmaps_features(df, gmaps)
+    add_time_features([df], executor, calendar)
+    add_location_flags(df, location_index)
+    if executor is not None:
+        df = lookup_precipitation(df, precipitate, executor)
+    else:
+        df = merge_precipitation(df, precipitate)
+    marking_outliers([df], executor)
+    return df
+
+
+def run_chunked_feature_engineering(train_path, test_path, train_output_path, test_output_path,
+                                    train_gmaps_path, test_gmaps_path, location_index_path=None,
+                                    chunk_size=100000, sample_size=200000, eps=0.005, min_sample=2500,
+                                    cluster_method='exact', grid_size=0.0005, precipitation_path=None, export_csv=False, seed=0, executor=None,
+                                    calendar=None):
+    '''Feature engineering that streams chunks of chunk_size rows from the
+    preprocessed datasets to the output datasets, so peak memory is bounded by
+    the chunk size rather than the data size.
+
+    DBSCAN is fitted once on a sample of sample_size trip endpoints with
+    min_sample scaled by the sampling fraction, and every chunk is assigned to
+    the fitted clusters through the LocationIndex of its core samples (saved
+    to location_index_path). With sample_size at least twice the row count
+    the fit is the same as on the full data; only border points within eps of
+    two clusters may be assigned differently (see benchmarks/bench_chunked_features.py).
+    cluster_method 'grid' fits on grid cells of the sample (see
+    features.geolocation.GridDBSCAN), so a larger sample fits in the same memory.
+    The gmaps lookups (three numbers per row) and the precipitation table stay
+    in memory. As in the in-memory path, output rows are renumbered 0..n-1.
+    With a PartitionExecutor the row-local stages of each chunk run in parallel.
+    calendar is the HolidayCalendar of the holiday column.
+
+    Returns dict with row counts of the outputs and the LocationIndex'''
+    sources = [train_path, test_path]
+    outputs = [train_output_path, test_output_path]
+    gmaps_tables = [load_gmaps_data(train_gmaps_path), load_gmaps_data(test_gmaps_path)]
+
+    logging.info(f"Sampling up to {sample_size} endpoints for clustering...")
+    lat, lng, total = sample_cluster_coordinates(sources, gmaps_tables, chunk_size, sample_size, seed)
+    fraction = len(lat) / total if total else 1.0
+    sample_min = max(2, int(round(min_sample * fraction)))
+    logging.info(f"Clustering {len(lat)} of {total} endpoints (min_samples {sample_min})...")
+    location_index = fit_location_index(lat, lng, eps=eps, min_sample=sample_min, method=cluster_method,
+                                        grid_size=grid_size)
+    if location_index_path is not None:
+        location_index.save(location_index_path)
+        logging.info(f"Location index saved to {location_index_path} ({len(location_index)} core samples)")
+
+    precipitate = load_precipitation(precipitation_path)
+    rows = {}
+    for name, source, output, gmaps in zip(('train', 'test'), sources, outputs, gmaps_tables):
+        offset = 0
+        with dataset_writer(output) as writer:
+            for chunk in iter_dataset(source, chunk_size):
+                chunk = engineer_chunk(chunk, gmaps, location_index, precipitate, executor, calendar)
+                chunk.index = pd.RangeIndex(offset, offset + len(chunk), name='row_id')
+                offset += len(chunk)
+                writer.write(chunk)
+        rows[name] = offset
+        logging.info(f"Feature engineered {name} data saved to: {output} ({offset} rows, {writer.chunks} chunks)")
+
+        if export_csv:
+            export_csv_copy(output, chunk_size)
+
+    return {'train_rows': rows['train'], 'test_rows': rows['test'], 'location_index': location_index}
+
+
 if __name__ == '__main__':
 
     # Input paths (EDA processed data)
@@ -153,6 +401,7 @@ if __name__ == '__main__':
     # Output paths (Feature engineered data)
     train_output_path = PROJECT_ROOT / "data" / "processed" / "feature_engineered_train.csv"
     test_output_path = PROJECT_ROOT / "data" / "processed" / "feature_engineered_test.csv"
+    location_index_path = PROJECT_ROOT / "data" / "processed" / "location_index.npz"
     
     # Load data
     train_df, test_df = load_eda_data(train_path, test_path)
@@ -177,7 +426,7 @@ if __name__ == '__main__':
 
     #Add Cluster features   
     logging.info("Adding cluster features...")
-    combine = add_cluster_features(combine)
+    combine = add_cluster_features(combine, location_index_path)
     logging.info("Cluster features added!")
 
     #Add Precipitation data
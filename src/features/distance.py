@@ -38,3 +38,42 @@ def calc_distance(df,method='manhattan'):
         distance = 0
     
     return distance
+
+
+def calc_distance_fast(start_lat, start_lng, end_lat, end_lng):
+
+    '''Manhattan and Euclidean (Havesine) distances from raw floats or arrays.
+
+    Fast path for single trips and small batches: skips DataFrame construction
+    and Series arithmetic but applies the same NumPy operations as calc_distance,
+    so results are bit-identical to the vectorized path. Inputs are always
+    evaluated as 1-D float64 arrays because NumPy's scalar math may differ from
+    its array loops in the last ulp.
+
+    Returns (manhattan, euclidean) as floats for scalar input, arrays otherwise.'''
+
+    scalar_input = np.ndim(start_lat) == 0
+    start_lat = np.asarray(start_lat, dtype=np.float64).reshape(-1)
+    start_lng = np.asarray(start_lng, dtype=np.float64).reshape(-1)
+    end_lat = np.asarray(end_lat, dtype=np.float64).reshape(-1)
+    end_lng = np.asarray(end_lng, dtype=np.float64).reshape(-1)
+
+    earthR = 6378137.0   # radius of Earth in meters
+    pi180 = np.pi / 180  # conversion factor from degrees to radians
+
+    dlat = (end_lat - start_lat) * pi180
+    dlng = (end_lng - start_lng) * pi180
+
+    #rows: north-south arc, east-west arc, great-circle arc
+    a = np.empty((3, dlat.shape[0]))
+    a[0] = np.sin(np.abs(dlat)/2)**2
+    a[1] = np.sin(np.abs(dlng)/2)**2
+    a[2] = (np.sin(dlat/2)**2 + np.cos(start_lat*pi180) * np.cos(end_lat*pi180) * np.sin(dlng/2)**2)
+    d = earthR * (2* np.arctan2(np.sqrt(a),np.sqrt(1-a)))
+
+    manhattan = np.abs(d[1]) + np.abs(d[0])
+    euclidean = d[2]
+
+    if scalar_input:
+        return float(manhattan[0]), float(euclidean[0])
+    return manhattan, euclidean
@@ -0,0 +1,240 @@
+'''
+Feature plan shared by training and serving.
+
+The training pipeline builds its feature table stage by stage in
+feature_pipe.py; a model then learns whatever column order that table had.
+FeaturePlan records that order together with the state the stages looked up
+(holiday dates, daily precipitation, Google Maps distance ratios) so serving
+code can rebuild the same columns for N trips straight from coordinates and
+start times, as one float32 matrix, without aligning columns by name.
+
+Plans are fitted in CompleteMLPipeline.step3_model_training and saved next
+to every model trained on the raw feature table (see
+model.save_models.save_feature_plan).
+'''
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from features.distance import calc_distance_fast
+from features.geolocation import LocationIndex
+from features.holidays import get_calendar, holiday_flags
+
+# Columns a plan knows how to rebuild at serving time
+PLAN_COLUMNS = (
+    'start_lng', 'start_lat', 'end_lng', 'end_lat',
+    'manhattan', 'euclidean', 'gmaps_distance', 'gmaps_duration',
+    'weekday', 'hour', 'holiday',
+    'airport', 'citycenter', 'standalone',
+    'precipitation', 'routing_error', 'short_trip'
+)
+
+# Google Maps route distance (m) and duration (s) per meter of manhattan
+# distance, used when a plan is fitted without gmaps columns
+DEFAULT_GMAPS_DISTANCE_RATIO = 1.0
+DEFAULT_GMAPS_DURATION_RATIO = 1.0 / 11.0
+
+
+class FeaturePlan:
+    '''
+    Column order and fitted lookups for rebuilding training features.
+
+    Google Maps features are not fetched at serving time; they are estimated
+    from the manhattan distance with the median ratios seen in training, and
+    the routing_error/short_trip flags are derived from that estimate exactly
+    as marking_outliers does. Location flags (airport, citycenter, standalone)
+    come from the LocationIndex saved by the clustering stage; without one
+    they are 0.
+    '''
+
+    def __init__(self, columns, holidays=(), precipitation_dates=(), precipitation_values=(),
+                 gmaps_distance_ratio=DEFAULT_GMAPS_DISTANCE_RATIO,
+                 gmaps_duration_ratio=DEFAULT_GMAPS_DURATION_RATIO, locations=None):
+        '''
+        Args:
+            columns: Feature names in the order the model was trained on
+            holidays: Holiday dates (anything np.datetime64 accepts)
+            precipitation_dates: Dates with a precipitation reading
+            precipitation_values: Precipitation per date (missing dates are 0)
+            gmaps_distance_ratio: Route distance per meter of manhattan distance
+            gmaps_duration_ratio: Route duration (s) per meter of manhattan distance
+            locations: LocationIndex of the training clusters (optional)
+        '''
+        unknown = [c for c in columns if c not in PLAN_COLUMNS]
+        if unknown:
+            raise ValueError(f"Feature plan cannot build columns {unknown}")
+        self.columns = list(columns)
+        self.holidays = np.unique(np.asarray(holidays, dtype='datetime64[D]'))
+
+        dates = np.asarray(precipitation_dates, dtype='datetime64[D]')
+        values = np.asarray(precipitation_values, dtype=np.float64)
+        order = np.argsort(dates, kind='stable')
+        self.precipitation_dates = dates[order]
+        self.precipitation_values = values[order]
+
+        self.gmaps_distance_ratio = float(gmaps_distance_ratio)
+        self.gmaps_duration_ratio = float(gmaps_duration_ratio)
+        self.locations = locations
+
+    @property
+    def n_features(self):
+        return len(self.columns)
+
+    @classmethod
+    def fit(cls, train_df, precipitation_path=None, location_index_path=None, calendar=None):
+        '''
+        Build a plan from a feature-engineered training frame.
+
+        Args:
+            train_df: Output of the feature pipeline (the 'duration' target is ignored)
+            precipitation_path: data/external/precipitation.csv (optional)
+            location_index_path: LocationIndex written by the clustering stage (optional)
+            calendar: HolidayCalendar the training holiday column was built with
+                      (the default-range one if None)
+        '''
+        if calendar is None:
+            calendar = get_calendar()
+        columns = [c for c in train_df.columns if c != 'duration']
+
+        dates, values = [], []
+        if precipitation_path is not None:
+            precipitate = pd.read_csv(precipitation_path)
+            precipitate['date'] = pd.to_datetime(precipitate['date'], dayfirst=True)
+            # Training merges on date, so the first reading of a date wins
+            precipitate = precipitate.drop_duplicates('date')
+            dates = precipitate['date'].to_numpy().astype('datetime64[D]')
+            values = precipitate['precipitation'].fillna(0.0).to_numpy(dtype=np.float64)
+
+        distance_ratio = DEFAULT_GMAPS_DISTANCE_RATIO
+        duration_ratio = DEFAULT_GMAPS_DURATION_RATIO
+        if {'gmaps_distance', 'gmaps_duration', 'manhattan'} <= set(train_df.columns):
+            routed = train_df[train_df['manhattan'] > 0]
+            if len(routed):
+                distance_ratio = float((routed['gmaps_distance'] / routed['manhattan']).median())
+                duration_ratio = float((routed['gmaps_duration'] / routed['manhattan']).median())
+
+        locations = None
+        if location_index_path is not None and os.path.exists(location_index_path):
+            locations = LocationIndex.load(location_index_path)
+
+        return cls(
+            columns,
+            holidays=calendar.dates,
+            precipitation_dates=dates,
+            precipitation_values=values,
+            gmaps_distance_ratio=distance_ratio,
+            gmaps_duration_ratio=duration_ratio,
+            locations=locations
+        )
+
+    def transform(self, start_lat, start_lng, end_lat, end_lng, start_time):
+        '''
+        Build the feature matrix for N trips.
+
+        Args:
+            start_lat, start_lng, end_lat, end_lng: Coordinates (arrays or scalars)
+            start_time: Trip start times (anything np.datetime64 accepts, no timezone)
+
+        Returns:
+            np.ndarray of shape (N, n_features), float32, columns in plan order
+        '''
+        start_lat = np.asarray(start_lat, dtype=np.float64).reshape(-1)
+        start_lng = np.asarray(start_lng, dtype=np.float64).reshape(-1)
+        end_lat = np.asarray(end_lat, dtype=np.float64).reshape(-1)
+        end_lng = np.asarray(end_lng, dtype=np.float64).reshape(-1)
+        start_time = np.asarray(start_time, dtype='datetime64[s]').reshape(-1)
+
+        manhattan, euclidean = calc_distance_fast(start_lat, start_lng, end_lat, end_lng)
+        days = start_time.astype('datetime64[D]')
+        gmaps_distance = manhattan * self.gmaps_distance_ratio
+
+        values = {
+            'start_lng': start_lng,
+            'start_lat': start_lat,
+            'end_lng': end_lng,
+            'end_lat': end_lat,
+            'manhattan': manhattan,
+            'euclidean': euclidean,
+            'gmaps_distance': gmaps_distance,
+            'gmaps_duration': manhattan * self.gmaps_duration_ratio,
+            # 1970-01-01 was a Thursday (weekday 3); features use Monday = 1
+            'weekday': (days.astype(np.int64) + 3) % 7 + 1,
+            'hour': (start_time - days).astype(np.int64) // 3600,
+            'holiday': holiday_flags(days, self.holidays),
+            'precipitation': self.precipitation(days),
+            'routing_error': (gmaps_distance > 500) & (manhattan < 50),
+            'short_trip': (gmaps_distance < 500) & (manhattan < 50),
+        }
+        if self.locations is not None:
+            start_loc = self.trip_locations(start_lat, start_lng)
+            end_loc = self.trip_locations(end_lat, end_lng)
+            values['airport'] = (start_loc == 'airport') | (end_loc == 'airport')
+            values['citycenter'] = (start_loc == 'city') | (end_loc == 'city')
+            values['standalone'] = (start_loc == 'standalone') | (end_loc == 'standalone')
+
+        features = np.zeros((len(start_lat), len(self.columns)), dtype=np.float32)
+        for i, column in enumerate(self.columns):
+            if column in values:
+                features[:, i] = values[column]
+        return features
+
+    def transform_frame(self, trips_df):
+        '''transform() for a frame with start/end coordinates and a parsed 'datetime' column'''
+        return self.transform(
+            trips_df['start_lat'].to_numpy(), trips_df['start_lng'].to_numpy(),
+            trips_df['end_lat'].to_numpy(), trips_df['end_lng'].to_numpy(),
+            trips_df['datetime'].to_numpy()
+        )
+
+    def trip_locations(self, lat, lng):
+        '''Readable location per point; single trips use the scalar index lookup'''
+        if len(lat) == 1:
+            return np.array([self.locations.location(lat[0], lng[0])], dtype=object)
+        return self.locations.locations(lat, lng)
+
+    def precipitation(self, days):
+        '''Precipitation per date (datetime64[D] array), 0 where there is no reading'''
+        result = np.zeros(len(days))
+        if not len(self.precipitation_dates):
+            return result
+        pos = np.searchsorted(self.precipitation_dates, days)
+        pos = np.minimum(pos, len(self.precipitation_dates) - 1)
+        found = self.precipitation_dates[pos] == days
+        result[found] = self.precipitation_values[pos[found]]
+        return result
+
+    def to_dict(self):
+        return {
+            'columns': self.columns,
+            'holidays': [str(d) for d in self.holidays],
+            'precipitation_dates': [str(d) for d in self.precipitation_dates],
+            'precipitation_values': self.precipitation_values.tolist(),
+            'gmaps_distance_ratio': self.gmaps_distance_ratio,
+            'gmaps_duration_ratio': self.gmaps_duration_ratio
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def save(self, path):
+        '''Write the plan as JSON, with the location index in a sibling '_locations.npz' file'''
+        data = self.to_dict()
+        if self.locations is not None:
+            locations_path = f"{os.path.splitext(path)[0]}_locations.npz"
+            self.locations.save(locations_path)
+            data['locations'] = os.path.basename(locations_path)
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        '''Read a plan written by save()'''
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('locations'):
+            data['locations'] = LocationIndex.load(os.path.join(os.path.dirname(path), data['locations']))
+        return cls.from_dict(data)
@@ -4,6 +4,7 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 
 import numpy as np
 import pandas as pd
+from scipy.spatial import cKDTree
 from sklearn.cluster import DBSCAN
 import gmplot
 import logging
@@ -41,27 +42,103 @@ def prepare_coordinates(train_df,test_df):
     return coordinates
 
 
-def cluster_coordinates(coordinates,eps=0.005,min_sample=2500):
-    '''Run DBSCAN clustering on coordinates to group locations 
-    into clusters of airports,city centers etc'''
+# Methods of cluster_coordinates: DBSCAN on every point, or on grid cells
+CLUSTER_METHODS = ('exact','grid')
+
 
-    db = DBSCAN(eps=eps,min_samples=min_sample).fit(coordinates[['lat','lng']])
+def cluster_coordinates(coordinates,eps=0.005,min_sample=2500,method='exact',grid_size=0.0005):
+    '''Run DBSCAN clustering on coordinates to group locations 
+    into clusters of airports,city centers etc. method 'grid' clusters
+    grid cells of grid_size degrees instead of points (see GridDBSCAN)'''
+
+    if method == 'exact':
+        db = DBSCAN(eps=eps,min_samples=min_sample).fit(coordinates[['lat','lng']])
+    elif method == 'grid':
+        db = GridDBSCAN(eps=eps,min_samples=min_sample,grid_size=grid_size).fit(coordinates[['lat','lng']])
+    else:
+        raise ValueError(f"Unknown clustering method '{method}' (expected one of {CLUSTER_METHODS})")
     print("Number of clusters found:",max(db.labels_)+1)
     return db
 
 
+def grid_cells(lat,lng,grid_size):
+    '''Collapse coordinates onto square cells of grid_size degrees.
+
+    Returns (cell_lat, cell_lng, counts, cell): the mean coordinate and the
+    number of points of every occupied cell, numbered in order of their first
+    point, and the cell of every point'''
+    lat = np.asarray(lat,dtype=np.float64)
+    lng = np.asarray(lng,dtype=np.float64)
+    rows = np.floor(lat/grid_size).astype(np.int64)
+    cols = np.floor(lng/grid_size).astype(np.int64)
+    keys = (rows-rows.min())*(cols.max()-cols.min()+1)+(cols-cols.min())
+    _,first,cell = np.unique(keys,return_index=True,return_inverse=True)
+    # Renumber cells by first occurrence: DBSCAN numbers clusters in the order
+    # it meets them, so the cells keep the cluster ids of the exact fit
+    order = np.argsort(first,kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    cell = rank[cell.reshape(-1)]
+    counts = np.bincount(cell,minlength=len(order))
+    return np.bincount(cell,weights=lat)/counts,np.bincount(cell,weights=lng)/counts,counts,cell
+
+
+class GridDBSCAN:
+    '''DBSCAN on grid cells weighted by their number of points.
+
+    The exact fit computes the eps-neighbourhood of every trip endpoint,
+    which dominates the time and memory of feature engineering. Endpoints
+    pile up on a few streets and terminals, so collapsing them onto cells of
+    grid_size degrees (default eps/10) leaves far fewer points; each cell is
+    placed at the mean of its points and weighs as many points as it holds
+    (DBSCAN sample_weight), so min_samples keeps its meaning. Every point
+    takes the label of its cell, and the points of core cells are the core
+    samples. Moving a point by at most the cell's diagonal only changes
+    labels next to a cluster's border: benchmarks/bench_grid_clustering.py
+    measures the agreement of the airport/citycenter/standalone flags with
+    the exact fit (at least 99.8% of trips per flag with the default grid).
+
+    Exposes the fitted attributes LocationIndex.from_dbscan uses: labels_,
+    core_sample_indices_ and eps.'''
+
+    def __init__(self,eps=0.005,min_samples=2500,grid_size=0.0005):
+        self.eps = eps
+        self.min_samples = min_samples
+        self.grid_size = grid_size
+
+    def fit(self,X):
+        points = np.asarray(X,dtype=np.float64)
+        cell_lat,cell_lng,counts,cell = grid_cells(points[:,0],points[:,1],self.grid_size)
+        db = DBSCAN(eps=self.eps,min_samples=self.min_samples).fit(
+            np.column_stack([cell_lat,cell_lng]),sample_weight=counts)
+        core_cells = np.zeros(len(counts),dtype=bool)
+        core_cells[db.core_sample_indices_] = True
+        self.n_cells_ = len(counts)
+        self.labels_ = db.labels_[cell]
+        self.core_sample_indices_ = np.flatnonzero(core_cells[cell])
+        return self
+
+
+# Readable location of each DBSCAN cluster; noise (-1) and any other cluster is standalone
+CLUSTER_LOCATIONS = {0: 'city', 1: 'city', 3: 'city', 4: 'city', 2: 'airport', 5: 'airport', 6: 'airport'}
+
+
+def location_label(cluster):
+    '''Readable location of a DBSCAN cluster id'''
+    return CLUSTER_LOCATIONS.get(cluster, 'standalone')
+
+
 def label_clusters(db):
     '''Assign readable cluster labels.'''
 
-    labels = []
-    for i in db.labels_:
-        if i == -1:
-            labels.append('standalone')
-        elif i in [0,1,3,4]:
-            labels.append('city')
-        elif i in [2,5,6]:
-            labels.append('airport')
-    return np.array(labels)
+    return np.array([location_label(i) for i in db.labels_])
+
+
+def fit_location_index(lat,lng,eps=0.005,min_sample=2500,method='exact',grid_size=0.0005):
+    '''Run DBSCAN on arrays of coordinates and index its core samples'''
+    coordinates = pd.DataFrame({'lat':np.asarray(lat,dtype=np.float64),'lng':np.asarray(lng,dtype=np.float64)})
+    db = cluster_coordinates(coordinates,eps=eps,min_sample=min_sample,method=method,grid_size=grid_size)
+    return LocationIndex.from_dbscan(db,coordinates)
 
 
 def visualize_clusters(coordinates,db):
@@ -102,25 +179,120 @@ def add_cluster_features(train_df,test_df,coordinates,labels):
         df['airport'] = ((df.start_loc == 'airport') | (df.end_loc == 'airport')).astype(int)
         df['citycenter'] = ((df.start_loc == 'city') | (df.end_loc == 'city')).astype(int)
         df['standalone'] = ((df.start_loc == 'standalone') | (df.end_loc == 'standalone')).astype(int)
-        df.drop(columns=['start_loc','end_loc','train_or_test'], axis=1, inplace=True)
+        df.drop(columns=['start_loc','end_loc','train_or_test'], inplace=True)
 
     return [train_df,test_df]
 
 
-def clustering(train_df,test_df):
-    '''final clustering function'''
+def add_location_flags(df,index):
+    '''airport/citycenter/standalone flags for the trips of df assigned by a
+    LocationIndex (in place); the counterpart of add_cluster_features for
+    frames that were not part of the DBSCAN fit'''
+    start_loc = index.locations(df.start_lat.to_numpy(),df.start_lng.to_numpy())
+    end_loc = index.locations(df.end_lat.to_numpy(),df.end_lng.to_numpy())
+    df['airport'] = ((start_loc == 'airport') | (end_loc == 'airport')).astype(int)
+    df['citycenter'] = ((start_loc == 'city') | (end_loc == 'city')).astype(int)
+    df['standalone'] = ((start_loc == 'standalone') | (end_loc == 'standalone')).astype(int)
+    return df
+
+
+class LocationIndex:
+    '''KD-tree over DBSCAN core samples that assigns new points to clusters.
+
+    DBSCAN has no predict: a point belongs to a cluster when it lies within
+    eps of one of the cluster's core samples. The index keeps the core
+    samples and their cluster ids from a fit and answers that question for
+    any coordinate in O(log n), taking the nearest core sample when several
+    clusters are in reach. Points with no core sample within eps are noise
+    (-1), i.e. standalone.'''
+
+    def __init__(self,lat,lng,cluster,eps=0.005):
+        '''lat/lng/cluster: core sample coordinates and cluster ids; eps: DBSCAN radius'''
+        self.lat = np.asarray(lat,dtype=np.float64)
+        self.lng = np.asarray(lng,dtype=np.float64)
+        self.cluster = np.asarray(cluster,dtype=np.int32)
+        self.eps = float(eps)
+        # DBSCAN neighbourhoods include points at exactly eps; the KD-tree bound is strict
+        self._radius = np.nextafter(self.eps,np.inf)
+        self._tree = cKDTree(np.column_stack([self.lat,self.lng])) if len(self.lat) else None
+
+    @classmethod
+    def from_dbscan(cls,db,coordinates):
+        '''Index the core samples of a fitted DBSCAN over coordinates[['lat','lng']]'''
+        core = np.asarray(db.core_sample_indices_)
+        points = coordinates[['lat','lng']].to_numpy(dtype=np.float64)[core]
+        clusters = np.asarray(db.labels_)[core]
+        # Duplicate coordinates are always in the same cluster
+        points,first = np.unique(points,axis=0,return_index=True)
+        return cls(points[:,0],points[:,1],clusters[first],eps=db.eps)
+
+    def __len__(self):
+        return len(self.cluster)
+
+    def assign(self,lat,lng):
+        '''Cluster id (-1 for standalone) for arrays of coordinates'''
+        lat = np.asarray(lat,dtype=np.float64).reshape(-1)
+        lng = np.asarray(lng,dtype=np.float64).reshape(-1)
+        clusters = np.full(len(lat),-1,dtype=np.int32)
+        if self._tree is None or not len(lat):
+            return clusters
+        _,nearest = self._tree.query(np.column_stack([lat,lng]),k=1,distance_upper_bound=self._radius)
+        found = nearest < len(self.cluster)
+        clusters[found] = self.cluster[nearest[found]]
+        return clusters
+
+    def lookup(self,lat,lng):
+        '''Cluster id (-1 for standalone) of a single coordinate'''
+        if self._tree is None:
+            return -1
+        _,nearest = self._tree.query((lat,lng),k=1,distance_upper_bound=self._radius)
+        return int(self.cluster[nearest]) if nearest < len(self.cluster) else -1
+
+    def locations(self,lat,lng):
+        '''Readable location ('city', 'airport', 'standalone') for arrays of coordinates'''
+        clusters = self.assign(lat,lng)
+        labels = np.full(len(clusters),'standalone',dtype=object)
+        for cluster,location in CLUSTER_LOCATIONS.items():
+            labels[clusters == cluster] = location
+        return labels
+
+    def location(self,lat,lng):
+        '''Readable location of a single coordinate'''
+        return location_label(self.lookup(lat,lng))
+
+    def save(self,path):
+        '''Write core samples, cluster ids and eps to an .npz file'''
+        np.savez(path,lat=self.lat,lng=self.lng,cluster=self.cluster,eps=self.eps)
+
+    @classmethod
+    def load(cls,path):
+        '''Read an index written by save()'''
+        with np.load(path) as data:
+            return cls(data['lat'],data['lng'],data['cluster'],eps=float(data['eps']))
+
+
+def clustering(train_df,test_df,index_path=None,eps=0.005,min_sample=2500,method='exact',grid_size=0.0005):
+    '''final clustering function; returns a LocationIndex of the fitted clusters,
+    also written to index_path when given. method/grid_size: see cluster_coordinates'''
 
     logging.info("Preparing coordinates...")
     coordinates = prepare_coordinates(train_df,test_df)
 
     logging.info("Preparing Clusters...")
-    db = cluster_coordinates(coordinates)
+    db = cluster_coordinates(coordinates,eps=eps,min_sample=min_sample,method=method,grid_size=grid_size)
 
     logging.info("Preparing labels for cluster...")
     labels = label_clusters(db)
 
+    logging.info("Indexing cluster core samples...")
+    index = LocationIndex.from_dbscan(db,coordinates)
+    if index_path is not None:
+        index.save(index_path)
+        logging.info(f"Location index saved to {index_path} ({len(index)} core samples)")
+
     logging.info("Adding cluster features to dataframes...")
     add_cluster_features(train_df,test_df,coordinates,labels)
 
     logging.info("Saved HTML Files in gmaps/...")
-    
\ No newline at end of file
+
+    return index
@@ -0,0 +1,162 @@
+'''
+Precomputed holiday calendars.
+
+The holiday feature used to come from a hard-coded list of 2015 dates, so
+trips from any other year were never flagged. The rules below reproduce that
+list (long weekends around Easter, Memorial Day, Independence Day and
+Thanksgiving, the Christmas to New Year days) for every year of a range, per
+region. A calendar keeps its dates as a sorted datetime64[D] array for
+vectorized column lookups and as a set for scalar lookups.
+'''
+
+import datetime
+
+import numpy as np
+
+# Years covered by the default calendars; trips in data/raw span 2012-2016
+FIRST_YEAR = 2012
+LAST_YEAR = 2030
+
+DEFAULT_REGION = 'new_york'
+
+
+def nth_weekday(year, month, weekday, n):
+    '''Date of the n-th weekday (Monday = 0) of a month; n = -1 is the last one'''
+    if n > 0:
+        first = datetime.date(year, month, 1)
+        return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    next_month = datetime.date(year + month // 12, month % 12 + 1, 1)
+    last = next_month - datetime.timedelta(days=1)
+    return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def easter_sunday(year):
+    '''Western Easter Sunday (anonymous Gregorian algorithm)'''
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+def _offset(rule, days):
+    return lambda year: rule(year) + datetime.timedelta(days=days)
+
+
+def _fixed(month, day):
+    return lambda year: datetime.date(year, month, day)
+
+
+# Holidays observed in New York City (the training data)
+_NEW_YORK_RULES = {
+    "New Years Day": _fixed(1, 1),
+    "Martin Luther King Day": lambda year: nth_weekday(year, 1, 0, 3),
+    "Easter Saturday": _offset(easter_sunday, -1),
+    "Easter Sunday": easter_sunday,
+    "Memorial Sunday": _offset(lambda year: nth_weekday(year, 5, 0, -1), -1),
+    "Memorial Day": lambda year: nth_weekday(year, 5, 0, -1),
+    "Independence Pre-day": _fixed(7, 3),
+    "Independence Day": _fixed(7, 4),
+    "Independence Post-day": _fixed(7, 5),
+    "Labor Day": lambda year: nth_weekday(year, 9, 0, 1),
+    "Thanksgiving Day": lambda year: nth_weekday(year, 11, 3, 4),
+    "Thanksgiving Post-day": _offset(lambda year: nth_weekday(year, 11, 3, 4), 1),
+    "Thanksgiving Post-post-day": _offset(lambda year: nth_weekday(year, 11, 3, 4), 2),
+    "Christmas Eve": _fixed(12, 24),
+    "Christmas Day": _fixed(12, 25),
+    "Christmas Post-day": _fixed(12, 26),
+    "New Years Eve": _fixed(12, 31),
+}
+
+# Region keys match the 'city' values sent by the frontend
+REGIONS = {
+    'new_york': _NEW_YORK_RULES,
+    'san_francisco': {
+        **_NEW_YORK_RULES,
+        "Presidents Day": lambda year: nth_weekday(year, 2, 0, 3),
+        "Cesar Chavez Day": _fixed(3, 31),
+    },
+}
+
+
+class HolidayCalendar:
+    '''Holiday dates of one region for a range of years'''
+
+    def __init__(self, first_year=FIRST_YEAR, last_year=LAST_YEAR, region=DEFAULT_REGION):
+        '''
+        Args:
+            first_year, last_year: Inclusive range of years to generate
+            region: Key of REGIONS
+        '''
+        if region not in REGIONS:
+            raise ValueError(f"Unknown holiday region {region!r}, expected one of {sorted(REGIONS)}")
+        if first_year > last_year:
+            raise ValueError(f"first_year {first_year} is after last_year {last_year}")
+        self.first_year = first_year
+        self.last_year = last_year
+        self.region = region
+
+        self.names = {}
+        for year in range(first_year, last_year + 1):
+            for name, rule in REGIONS[region].items():
+                self.names.setdefault(rule(year), name)
+        self.dates = np.array(sorted(self.names), dtype='datetime64[D]')
+        self.date_set = frozenset(self.names)
+
+    @property
+    def settings(self):
+        '''{first_year, last_year, region}: everything the dates depend on'''
+        return {'first_year': self.first_year, 'last_year': self.last_year, 'region': self.region}
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __contains__(self, date):
+        return date in self.date_set
+
+    def is_holiday(self, date):
+        '''Return 1 if date (datetime.date) is a holiday, else 0'''
+        return int(date in self.date_set)
+
+    def flags(self, days):
+        '''Holiday flag (bool) per date of a datetime64 array'''
+        return holiday_flags(days, self.dates)
+
+    def year(self, year):
+        '''{name: date} for one year of the range'''
+        return {name: date for date, name in self.names.items() if date.year == year}
+
+
+def holiday_flags(days, holidays):
+    '''
+    Vectorized holiday lookup.
+
+    Args:
+        days: Dates as a datetime64 array (times are truncated to the day)
+        holidays: Sorted datetime64[D] array of holiday dates
+
+    Returns:
+        np.ndarray of bool, one flag per date
+    '''
+    days = np.asarray(days).astype('datetime64[D]')
+    if not len(holidays):
+        return np.zeros(days.shape, dtype=bool)
+    pos = np.searchsorted(holidays, days)
+    return holidays[np.minimum(pos, len(holidays) - 1)] == days
+
+
+# Built once at import; ~20 dates per year per region
+CALENDARS = {region: HolidayCalendar(region=region) for region in REGIONS}
+
+
+def get_calendar(region=DEFAULT_REGION):
+    '''Default-range calendar of a region'''
+    if region not in CALENDARS:
+        raise ValueError(f"Unknown holiday region {region!r}, expected one of {sorted(REGIONS)}")
+    return CALENDARS[region]
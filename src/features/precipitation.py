@@ -1,8 +1,8 @@
 import pandas as pd
 from pathlib import Path
 
-def extract_precipitation_data(combine, precep_path=None):
-    '''Add precipitation values to train/test df (updates in place)'''
+def load_precipitation(precep_path=None):
+    '''Daily precipitation table with date (datetime.date) and precipitation columns'''
     
     # If no path provided, try to find the precipitation.csv file
     if precep_path is None:
@@ -16,28 +16,42 @@ def extract_precipitation_data(combine, precep_path=None):
     # Load and format precipitation data
     precipitate = pd.read_csv(precep_path)
     precipitate['date'] = pd.to_datetime(precipitate['date'], dayfirst=True).dt.date
+    return precipitate
 
-    for i in range(len(combine)):
-        df = combine[i]
 
-        # Ensure date is in proper format
-        df['date'] = pd.to_datetime(df['date']).dt.date
+def merge_precipitation(df, precipitate):
+    '''Frame of df's rows with a precipitation column looked up by date (the date
+    column is dropped; like any merge the result has a new RangeIndex)'''
+
+    # Merge on midnight timestamps of one resolution: much faster than
+    # datetime.date objects and works for either representation of date
+    df['date'] = pd.to_datetime(df['date']).dt.normalize().astype('datetime64[ns]')
+    daily = precipitate[['date', 'precipitation']].assign(
+        date=pd.to_datetime(precipitate['date']).astype('datetime64[ns]')
+    )
+
+    # Merge precipitation
+    df = df.merge(
+        daily,
+        on='date',
+        how='left',
+        suffixes=("", "_prec")
+    )
 
-        # Merge precipitation
-        df = df.merge(
-            precipitate[['date', 'precipitation']],
-            on='date',
-            how='left',
-            suffixes=("", "_prec")
-        )
+    # Replace NaNs with 0
+    df['precipitation'] = df['precipitation'].fillna(0.0)
 
-        # Replace NaNs with 0
-        df['precipitation'] = df['precipitation'].fillna(0.0)
+    # Drop the temporary date column
+    df.drop("date", axis=1, inplace=True)
+    return df
 
-        # Drop the temporary date column
-        df.drop("date", axis=1, inplace=True)
 
+def extract_precipitation_data(combine, precep_path=None):
+    '''Add precipitation values to train/test df (updates in place)'''
+    precipitate = load_precipitation(precep_path)
+
+    for i in range(len(combine)):
         # Write back into the same list
-        combine[i] = df
+        combine[i] = merge_precipitation(combine[i], precipitate)
 
     print("Added precipitation data successfully!")
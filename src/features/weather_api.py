@@ -1,6 +1,9 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import Future
 from meteostat import Point, Hourly
 import pandas as pd
+import threading
+import time
 import sys
 import os
 
@@ -11,6 +14,20 @@ PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..', '..')) # Go up two
 sys.path.append(PROJECT_ROOT)
 # --- End of path correction ---
 
+SRC_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+if SRC_DIR not in sys.path:
+    sys.path.append(SRC_DIR)
+
+from features.distance import calc_distance_fast
+from serving.cache import LRUCache
+from serving.metrics import Histogram
+
+# Where src/get_historical_weather.py fetches the bulk hourly table (Central Park)
+TABLE_LATITUDE = 40.785091
+TABLE_LONGITUDE = -73.968285
+
+EPOCH = datetime(1970, 1, 1)
+
 def get_weather_for_trip(latitude: float, longitude: float, timestamp: datetime) -> dict:
     """
     Fetches historical weather data for a specific location and time using Meteostat.
@@ -61,6 +78,174 @@ def get_weather_for_trip(latitude: float, longitude: float, timestamp: datetime)
         print(f"Error fetching weather data for {timestamp}: {e}")
         return {}
 
+def hour_bucket(timestamp: datetime) -> int:
+    """
+    Hours since the Unix epoch for a timestamp (naive timestamps are taken as UTC).
+    """
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return int((timestamp - EPOCH).total_seconds() // 3600)
+
+
+class WeatherLookup:
+    """
+    Weather lookups that avoid a Meteostat round trip per request.
+
+    Lookups are served, in order, from:
+    1. The bulk hourly table written by src/get_historical_weather.py, indexed
+       in memory by hour, for points within table_radius_km of the table location.
+    2. An LRU+TTL cache keyed on lat/lon rounded to `precision` decimals and the hour.
+    3. A live fetch. Concurrent misses for the same key share a single fetch.
+    """
+
+    def __init__(self, table_path=None, table_radius_km=50.0, precision=2,
+                 cache_size=10000, cache_ttl_s=3600.0, negative_ttl_s=60.0,
+                 offline=False, fetch_fn=None):
+        """
+        Args:
+            table_path: CSV written by get_historical_weather.py (optional)
+            table_radius_km: Max distance from the table location to serve from the table
+            precision: Decimals kept from lat/lon in cache keys (2 ~ 1 km)
+            cache_size: Max cached (location, hour) entries
+            cache_ttl_s: Seconds a fetched result stays cached
+            negative_ttl_s: Seconds an empty result stays cached
+            offline: Never fetch; misses return an empty dict
+            fetch_fn: fetch_fn(lat, lon, timestamp) -> dict, defaults to get_weather_for_trip
+        """
+        self.table_radius_km = table_radius_km
+        self.precision = precision
+        self.negative_ttl_s = negative_ttl_s
+        self.offline = offline
+        self.fetch_fn = fetch_fn or get_weather_for_trip
+
+        self.cache = LRUCache(max_size=cache_size, ttl_s=cache_ttl_s)
+        self.table = {}
+        if table_path is not None and os.path.exists(table_path):
+            self.table = self.load_table(table_path)
+
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        self.table_hits = 0
+        self.cache_hits = 0
+        self.fetches = 0
+        self.coalesced = 0
+        self.offline_misses = 0
+        self.lookup_latency = Histogram()
+        self.fetch_latency = Histogram()
+
+    @staticmethod
+    def load_table(table_path):
+        """Index the bulk hourly weather table by hour bucket"""
+        data = pd.read_csv(table_path, parse_dates=['datetime_hourly'])
+        features = [c for c in ['temp', 'humidity', 'wind_speed', 'visibility', 'weather_condition_code']
+                    if c in data.columns]
+
+        table = {}
+        for row in data.itertuples(index=False):
+            weather = {c: float(getattr(row, c)) for c in features}
+            table[hour_bucket(row.datetime_hourly.to_pydatetime())] = weather
+        return table
+
+    def _near_table(self, latitude, longitude):
+        _, meters = calc_distance_fast(TABLE_LATITUDE, TABLE_LONGITUDE, latitude, longitude)
+        return meters / 1000.0 <= self.table_radius_km
+
+    def lookup(self, latitude: float, longitude: float, timestamp: datetime, allow_fetch: bool = True):
+        """
+        Weather features for a location and time (same keys as get_weather_for_trip).
+
+        Args:
+            allow_fetch: When False, only the in-memory tiers are consulted and a
+                         miss returns None, so callers can try them without blocking.
+
+        Returns:
+            A dictionary of weather features, or an empty dict if none are available.
+        """
+        started = time.perf_counter()
+        try:
+            hour = hour_bucket(timestamp)
+
+            if self.table and self._near_table(latitude, longitude):
+                weather = self.table.get(hour)
+                if weather is not None:
+                    with self._lock:
+                        self.table_hits += 1
+                    return dict(weather)
+
+            key = (round(latitude, self.precision), round(longitude, self.precision), hour)
+            weather = self.cache.get(key)
+            if weather is not None:
+                with self._lock:
+                    self.cache_hits += 1
+                return dict(weather)
+
+            if not allow_fetch:
+                return None
+
+            if self.offline:
+                with self._lock:
+                    self.offline_misses += 1
+                return {}
+
+            return dict(self._fetch_once(key, latitude, longitude, hour))
+        finally:
+            self.lookup_latency.observe(time.perf_counter() - started)
+
+    def _fetch_once(self, key, latitude, longitude, hour):
+        """Fetch key, or wait for an identical fetch already in flight"""
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+                self.fetches += 1
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        started = time.perf_counter()
+        try:
+            hour_start = EPOCH + timedelta(hours=hour)
+            weather = self.fetch_fn(latitude, longitude, hour_start) or {}
+            if weather:
+                self.cache.set(key, weather)
+            else:
+                # Empty results expire sooner so transient failures are retried
+                self.cache.set(key, weather, ttl_s=self.negative_ttl_s)
+            future.set_result(weather)
+            return weather
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self.fetch_latency.observe(time.perf_counter() - started)
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self):
+        """Hit counters per tier, hit rate and latency summaries"""
+        with self._lock:
+            served = self.table_hits + self.cache_hits
+            lookups = served + self.fetches + self.coalesced + self.offline_misses
+            stats = {
+                'table_hours': len(self.table),
+                'table_hits': self.table_hits,
+                'cache_hits': self.cache_hits,
+                'fetches': self.fetches,
+                'coalesced_fetches': self.coalesced,
+                'offline_misses': self.offline_misses,
+                'hit_rate': served / lookups if lookups else 0.0,
+            }
+        stats['cache'] = self.cache.stats()
+        stats['lookup_latency_s'] = self.lookup_latency.summary()
+        stats['fetch_latency_s'] = self.fetch_latency.summary()
+        return stats
+
+
 # --- THIS IS THE PART YOU ARE LIKELY MISSING ---
 # This block only runs when you execute the file directly
 # (e.g., python src/features/weather_api.py)
@@ -28,6 +28,9 @@ except ImportError:
 # ==========================
 # Utilities and normalizers
 # ==========================
+# Models trained on normalize_features output instead of the raw feature table
+NORMALIZED_MODELS = ('Linear Regression', 'Ridge Regression', 'Lasso Regression', 'Neural Network')
+
 def normalize_features(X):
     """Normalize features into different ranges for training"""
     features = []
@@ -0,0 +1,288 @@
+"""
+Origin-destination duration table.
+
+Most trips in the training data repeat: the same pickup and dropoff
+neighbourhoods at the same hour of the week. For those, the median duration
+observed in training is as good an answer as a model prediction and costs a
+single hash lookup instead of feature building and a model call.
+
+ODDurationTable aggregates the feature engineered training table into one
+entry per (origin cell, destination cell, hour of week) holding the median
+duration and the number of trips behind it. Cells are grid_deg x grid_deg
+degree squares inside the bounding box of the training trips, so a key packs
+into one int64. Entries are stored as flat arrays (sorted keys, medians,
+counts) plus an open-addressing hash index over the keys, each in its own
+.npy file, and loaded with np.load(mmap_mode='r'): every API worker maps the
+same pages and nothing is parsed at startup.
+
+Holiday trips are left out of the aggregate; callers answer those (and
+pairs with fewer than min_count trips) from the model.
+"""
+
+import json
+import math
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# Grid cell size in degrees (~500 m) and hours in a week
+DEFAULT_GRID_DEG = 0.005
+HOURS_PER_WEEK = 168
+
+# Fibonacci hashing constant (2**64 / golden ratio)
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+_EMPTY = -1
+
+_ARRAYS = ('keys', 'median_s', 'count', 'slots')
+
+# Columns of the feature engineered table that build() reads
+OD_TABLE_COLUMNS = ['start_lat', 'start_lng', 'end_lat', 'end_lng', 'weekday', 'hour', 'duration', 'holiday']
+
+
+class ODDurationTable:
+    """Median trip duration per (origin cell, destination cell, hour of week)"""
+
+    def __init__(self, keys, median_s, count, slots, grid_deg, lat0, lng0, n_lat, n_lng, meta=None):
+        """
+        Args:
+            keys: Sorted packed keys (int64)
+            median_s: Median duration in seconds per key (float32)
+            count: Training trips per key (uint32)
+            slots: Hash index, position in keys per slot or -1 (int32, power-of-two length)
+            grid_deg: Cell size in degrees
+            lat0, lng0: Cell index of the south-west corner of the grid
+            n_lat, n_lng: Grid size in cells
+            meta: Extra build information reported by stats()
+        """
+        self.keys = keys
+        self.median_s = median_s
+        self.count = count
+        self.slots = slots
+        self.grid_deg = float(grid_deg)
+        self.lat0 = int(lat0)
+        self.lng0 = int(lng0)
+        self.n_lat = int(n_lat)
+        self.n_lng = int(n_lng)
+        self.meta = dict(meta or {})
+        self._shift = 64 - (len(slots).bit_length() - 1)
+
+    @classmethod
+    def build(cls, train_df, grid_deg=DEFAULT_GRID_DEG):
+        """
+        Aggregate a feature engineered training table.
+
+        Args:
+            train_df: Frame with start/end coordinates, weekday (1 = Monday),
+                      hour, duration (seconds) and optionally holiday
+            grid_deg: Cell size in degrees
+
+        Returns:
+            ODDurationTable
+        """
+        df = train_df
+        if 'holiday' in df.columns:
+            df = df[df['holiday'].to_numpy() == 0]
+        df = df.dropna(subset=['start_lat', 'start_lng', 'end_lat', 'end_lng', 'duration'])
+
+        lat_cells = np.floor(np.concatenate([df['start_lat'].to_numpy(), df['end_lat'].to_numpy()]) / grid_deg)
+        lng_cells = np.floor(np.concatenate([df['start_lng'].to_numpy(), df['end_lng'].to_numpy()]) / grid_deg)
+        if len(df):
+            lat0, lng0 = int(lat_cells.min()), int(lng_cells.min())
+            n_lat, n_lng = int(lat_cells.max()) - lat0 + 1, int(lng_cells.max()) - lng0 + 1
+        else:
+            lat0 = lng0 = 0
+            n_lat = n_lng = 1
+        n_cells = n_lat * n_lng
+        if n_cells * n_cells * HOURS_PER_WEEK >= 2 ** 63:
+            raise ValueError(f"{n_lat}x{n_lng} cells of {grid_deg} degrees do not fit a 64-bit key; "
+                             f"use a larger grid_deg")
+
+        table = cls(np.empty(0, np.int64), np.empty(0, np.float32), np.empty(0, np.uint32),
+                    np.full(1, _EMPTY, np.int32), grid_deg, lat0, lng0, n_lat, n_lng)
+        hour_of_week = (df['weekday'].to_numpy(dtype=np.int64) - 1) * 24 + df['hour'].to_numpy(dtype=np.int64)
+        keys = table.pack(df['start_lat'].to_numpy(), df['start_lng'].to_numpy(),
+                          df['end_lat'].to_numpy(), df['end_lng'].to_numpy(), hour_of_week)
+        durations = df['duration'].to_numpy(dtype=np.float64)
+
+        # Sort by key then duration; each run of equal keys is one entry
+        order = np.lexsort((durations, keys))
+        keys, durations = keys[order], durations[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, np.int64)
+        counts = np.diff(np.r_[starts, len(keys)])
+        median_s = (durations[starts + (counts - 1) // 2] + durations[starts + counts // 2]) / 2.0
+
+        table.keys = keys[starts]
+        table.median_s = median_s.astype(np.float32)
+        table.count = np.minimum(counts, np.iinfo(np.uint32).max).astype(np.uint32)
+        table.slots = build_hash_index(table.keys)
+        table._shift = 64 - (len(table.slots).bit_length() - 1)
+        table.meta = {
+            'trips': int(len(durations)),
+            'built_at': datetime.now().isoformat(timespec='seconds')
+        }
+        return table
+
+    def __len__(self):
+        return len(self.keys)
+
+    def pack(self, start_lat, start_lng, end_lat, end_lng, hour_of_week):
+        """Packed keys for arrays of trips (-1 where a point is outside the grid)"""
+        origin = self._cells(start_lat, start_lng)
+        destination = self._cells(end_lat, end_lng)
+        n_cells = self.n_lat * self.n_lng
+        hour_of_week = np.asarray(hour_of_week, dtype=np.int64)
+        keys = (origin * n_cells + destination) * HOURS_PER_WEEK + hour_of_week
+        return np.where((origin >= 0) & (destination >= 0), keys, -1)
+
+    def _cells(self, lat, lng):
+        lat_i = np.floor(np.asarray(lat, dtype=np.float64) / self.grid_deg).astype(np.int64) - self.lat0
+        lng_i = np.floor(np.asarray(lng, dtype=np.float64) / self.grid_deg).astype(np.int64) - self.lng0
+        inside = (lat_i >= 0) & (lat_i < self.n_lat) & (lng_i >= 0) & (lng_i < self.n_lng)
+        return np.where(inside, lat_i * self.n_lng + lng_i, -1)
+
+    def _cell(self, lat, lng):
+        lat_i = math.floor(lat / self.grid_deg) - self.lat0
+        lng_i = math.floor(lng / self.grid_deg) - self.lng0
+        if 0 <= lat_i < self.n_lat and 0 <= lng_i < self.n_lng:
+            return lat_i * self.n_lng + lng_i
+        return -1
+
+    def lookup(self, start_lat, start_lng, end_lat, end_lng, hour_of_week):
+        """
+        Median duration and trip count for arrays of trips.
+
+        Returns:
+            tuple: (median seconds, NaN where absent; trip counts, 0 where absent)
+        """
+        keys = self.pack(start_lat, start_lng, end_lat, end_lng, hour_of_week)
+        positions = find_keys(self.keys, self.slots, keys)
+        found = positions >= 0
+        median_s = np.full(len(keys), np.nan)
+        count = np.zeros(len(keys), dtype=np.int64)
+        median_s[found] = self.median_s[positions[found]]
+        count[found] = self.count[positions[found]]
+        return median_s, count
+
+    def lookup_one(self, start_lat, start_lng, end_lat, end_lng, hour_of_week):
+        """
+        Median duration and trip count of a single trip without array overhead.
+
+        Returns:
+            tuple: (median seconds or None, trip count)
+        """
+        origin = self._cell(start_lat, start_lng)
+        destination = self._cell(end_lat, end_lng)
+        if origin < 0 or destination < 0 or not len(self.keys):
+            return None, 0
+        key = (origin * self.n_lat * self.n_lng + destination) * HOURS_PER_WEEK + hour_of_week
+        mask = len(self.slots) - 1
+        slot = ((key * _HASH_MULTIPLIER) & _MASK64) >> self._shift
+        while True:
+            position = int(self.slots[slot])
+            if position == _EMPTY:
+                return None, 0
+            if self.keys[position] == key:
+                return float(self.median_s[position]), int(self.count[position])
+            slot = (slot + 1) & mask
+
+    def save(self, path):
+        """
+        Write the table to directory path (one .npy per array plus meta.json).
+
+        The table is written next to path and renamed into place, so readers
+        that already mapped the previous files keep a consistent view.
+        """
+        path = Path(path)
+        tmp = path.with_name(path.name + '.tmp')
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for name in _ARRAYS:
+            np.save(tmp / f"{name}.npy", np.ascontiguousarray(getattr(self, name)))
+        meta = dict(self.meta, grid_deg=self.grid_deg, lat0=self.lat0, lng0=self.lng0,
+                    n_lat=self.n_lat, n_lng=self.n_lng, entries=len(self))
+        with open(tmp / "meta.json", 'w') as f:
+            json.dump(meta, f, indent=2)
+
+        old = path.with_name(path.name + '.old')
+        shutil.rmtree(old, ignore_errors=True)
+        if path.exists():
+            os.replace(path, old)
+        os.replace(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Open a table written by save(), memory-mapping its arrays unless mmap is False"""
+        path = Path(path)
+        with open(path / "meta.json") as f:
+            meta = json.load(f)
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode='r' if mmap else None) for name in _ARRAYS}
+        grid = {k: meta.pop(k) for k in ('grid_deg', 'lat0', 'lng0', 'n_lat', 'n_lng')}
+        meta.pop('entries', None)
+        return cls(arrays['keys'], arrays['median_s'], arrays['count'], arrays['slots'], meta=meta, **grid)
+
+    def stats(self):
+        """Size and grid of the table"""
+        return dict(
+            self.meta,
+            entries=len(self),
+            grid_deg=self.grid_deg,
+            grid_cells=[self.n_lat, self.n_lng],
+            index_slots=len(self.slots),
+            bytes=int(sum(getattr(self, name).nbytes for name in _ARRAYS))
+        )
+
+
+def _home_slots(keys, n_slots):
+    """Fibonacci hash of packed keys to slots of a power-of-two index"""
+    shift = np.uint64(64 - (n_slots.bit_length() - 1))
+    return ((keys.astype(np.uint64) * np.uint64(_HASH_MULTIPLIER)) >> shift).astype(np.int64)
+
+
+def build_hash_index(keys):
+    """
+    Open-addressing (linear probing) index over unique keys.
+
+    Returns:
+        int32 array of a power-of-two length at least twice len(keys), holding
+        the position of a key in keys or -1 for an empty slot
+    """
+    n_slots = 1 << max(1, (2 * len(keys) - 1).bit_length())
+    slots = np.full(n_slots, _EMPTY, dtype=np.int32)
+    mask = n_slots - 1
+    pending = np.arange(len(keys))
+    pos = _home_slots(np.asarray(keys), n_slots)
+    # Insert every pending key in one pass per probe step: where several
+    # claim the same free slot the first wins and the rest move on
+    while len(pending):
+        free = np.flatnonzero(slots[pos] == _EMPTY)
+        claimed, first = np.unique(pos[free], return_index=True)
+        slots[claimed] = pending[free[first]]
+        placed = np.zeros(len(pending), dtype=bool)
+        placed[free[first]] = True
+        pending, pos = pending[~placed], (pos[~placed] + 1) & mask
+    return slots
+
+
+def find_keys(keys, slots, queries):
+    """Position of each query key in keys, or -1 when absent"""
+    queries = np.asarray(queries, dtype=np.int64)
+    positions = np.full(len(queries), -1, dtype=np.int64)
+    if not len(keys):
+        return positions
+    mask = len(slots) - 1
+    active = np.flatnonzero(queries >= 0)
+    pos = _home_slots(queries[active], len(slots))
+    while len(active):
+        candidate = np.asarray(slots[pos], dtype=np.int64)
+        occupied = candidate != _EMPTY
+        hit = occupied & (np.asarray(keys)[np.where(occupied, candidate, 0)] == queries[active])
+        positions[active[hit]] = candidate[hit]
+        probe = occupied & ~hit
+        active, pos = active[probe], (pos[probe] + 1) & mask
+    return positions
@@ -5,6 +5,9 @@ from datetime import datetime
 import json
 import numpy as np
 
+from model.tree_ensemble import FlatTreeEnsemble, UnsupportedModelError, count_nodes
+from features.feature_plan import FeaturePlan
+
 def save_model(model, model_name, model_type="sklearn", output_dir="saved_models", metadata=None):
     """
     Save trained model with metadata
@@ -53,6 +56,91 @@ def save_model(model, model_name, model_type="sklearn", output_dir="saved_models
     
     return model_path
 
+def export_tree_ensemble(model, model_path, max_nodes=0):
+    """
+    Export a tree ensemble as flat NumPy arrays next to its saved model
+    
+    XGBoost and RandomForest models are flattened into a FlatTreeEnsemble
+    (feature index, threshold, child pointers, leaf values) and written to
+    '<model file stem>_trees.npz', which can be evaluated without loading
+    the original library. The API loads these arrays with the model (see
+    load_latest_tree_ensembles) for its small-batch evaluator.
+    
+    Args:
+        model: Trained model object
+        model_path: Path returned by save_model
+        max_nodes: Skip ensembles with more tree nodes than this (0 exports any size);
+                   the arrays are a second copy of the trees, too large to be worth it
+                   for big forests
+    
+    Returns:
+        str: Path to the exported arrays, or None if the model is not a supported
+             tree ensemble or exceeds max_nodes
+    """
+    n_nodes = count_nodes(model)
+    if n_nodes is None:
+        logging.info(f"Skipping tree export for {model_path}: {type(model).__name__} is not a tree ensemble")
+        return None
+    if max_nodes > 0 and n_nodes > max_nodes:
+        logging.info(f"Skipping tree export for {model_path}: {n_nodes} nodes exceed {max_nodes}")
+        return None
+    try:
+        ensemble = FlatTreeEnsemble.from_model(model)
+    except UnsupportedModelError as e:
+        logging.info(f"Skipping tree export for {model_path}: {e}")
+        return None
+    
+    trees_path = f"{os.path.splitext(model_path)[0]}_trees.npz"
+    ensemble.save(trees_path)
+    logging.info(f"Tree arrays exported: {trees_path} ({ensemble.n_trees} trees, {ensemble.n_nodes} nodes)")
+    return trees_path
+
+def load_tree_ensemble(model_path):
+    """
+    Load the flat tree arrays exported for a saved model
+    
+    Args:
+        model_path: Path to saved model file
+    
+    Returns:
+        FlatTreeEnsemble, or None if no arrays were exported for this model
+    """
+    trees_path = f"{os.path.splitext(model_path)[0]}_trees.npz"
+    if not os.path.exists(trees_path):
+        return None
+    return FlatTreeEnsemble.load(trees_path)
+
+def save_feature_plan(plan, model_path):
+    """
+    Save the feature plan a model was trained with next to the model
+    
+    Args:
+        plan: FeaturePlan fitted on the model's training features
+        model_path: Path returned by save_model
+    
+    Returns:
+        str: Path to '<model file stem>_feature_plan.json'
+    """
+    plan_path = f"{os.path.splitext(model_path)[0]}_feature_plan.json"
+    plan.save(plan_path)
+    logging.info(f"Feature plan saved: {plan_path} ({plan.n_features} columns)")
+    return plan_path
+
+def load_feature_plan(model_path):
+    """
+    Load the feature plan saved with a model
+    
+    Args:
+        model_path: Path to saved model file
+    
+    Returns:
+        FeaturePlan, or None if the model was saved without one
+    """
+    plan_path = f"{os.path.splitext(model_path)[0]}_feature_plan.json"
+    if not os.path.exists(plan_path):
+        return None
+    return FeaturePlan.load(plan_path)
+
 def load_model(model_path, model_type="sklearn"):
     """
     Load saved model
@@ -112,9 +200,25 @@ def save_model_results(results_dict, output_dir="saved_models"):
     logging.info(f"Training results saved: {results_path}")
     return results_path
 
-def create_model_registry(output_dir="saved_models"):
+def _parse_model_filename(file):
     """
-    Create a registry of all saved models
+    Split a saved model filename into model name and timestamp
+
+    Files are written by save_model as '<model_name>_<YYYYmmdd>_<HHMMSS>.<ext>',
+    and model names may themselves contain underscores (e.g. 'random_forest').
+
+    Returns:
+        tuple: (model_name, timestamp)
+    """
+    stem = os.path.splitext(file)[0]
+    parts = stem.rsplit('_', 2)
+    if len(parts) == 3 and parts[1].isdigit() and parts[2].isdigit():
+        return parts[0], f"{parts[1]}_{parts[2]}"
+    return stem.split('_')[0], '_'.join(stem.split('_')[1:])
+
+def scan_model_registry(output_dir="saved_models"):
+    """
+    Registry of all saved models, read from the directory without writing anything
     
     Args:
         output_dir: Directory containing saved models
@@ -130,8 +234,7 @@ def create_model_registry(output_dir="saved_models"):
     # Look for model files
     for file in os.listdir(output_dir):
         if file.endswith('.pkl') or file.endswith('.h5'):
-            model_name = file.split('_')[0]
-            timestamp = file.split('_')[1].split('.')[0]
+            model_name, timestamp = _parse_model_filename(file)
             
             if model_name not in registry:
                 registry[model_name] = []
@@ -139,9 +242,27 @@ def create_model_registry(output_dir="saved_models"):
             registry[model_name].append({
                 'file': file,
                 'timestamp': timestamp,
-                'path': os.path.join(output_dir, file)
+                'path': os.path.join(output_dir, file),
+                'model_type': 'keras' if file.endswith('.h5') else 'sklearn',
+                'metadata_path': os.path.join(output_dir, f"{model_name}_{timestamp}_metadata.json")
             })
     
+    return registry
+
+def create_model_registry(output_dir="saved_models"):
+    """
+    Create a registry of all saved models and save it to model_registry.json
+    
+    Args:
+        output_dir: Directory containing saved models
+    
+    Returns:
+        dict: Registry of saved models
+    """
+    registry = scan_model_registry(output_dir)
+    if not os.path.exists(output_dir):
+        return registry
+    
     # Save registry
     registry_path = f"{output_dir}/model_registry.json"
     with open(registry_path, 'w') as f:
@@ -149,3 +270,93 @@ def create_model_registry(output_dir="saved_models"):
     
     logging.info(f"Model registry created: {registry_path}")
     return registry
+
+def _latest_entries(output_dir):
+    """
+    Newest registry entry of every saved model
+    
+    Returns:
+        list: (display name, registry entry) pairs; the display name comes from
+              the model's metadata, falling back to the saved file name
+    """
+    latest_entries = []
+    # Read only: warm starts and reloads (possibly in several workers) must not rewrite the registry file
+    registry = scan_model_registry(output_dir)
+    
+    for model_name, entries in registry.items():
+        latest = max(entries, key=lambda entry: entry['timestamp'])
+        
+        metadata = {}
+        if os.path.exists(latest['metadata_path']):
+            with open(latest['metadata_path']) as f:
+                metadata = json.load(f)
+        latest_entries.append((metadata.get('display_name', model_name), latest))
+    
+    return latest_entries
+
+def load_latest_models(output_dir="saved_models"):
+    """
+    Load the newest saved artifact of every model in the registry
+    
+    Args:
+        output_dir: Directory containing saved models
+    
+    Returns:
+        dict: Loaded models keyed by display name (e.g. 'Random Forest'),
+              falling back to the saved file name when no metadata exists
+    """
+    models = {}
+    
+    for display_name, latest in _latest_entries(output_dir):
+        try:
+            models[display_name] = load_model(latest['path'], latest['model_type'])
+        except Exception as e:
+            logging.error(f"Could not load {latest['path']}: {e}")
+    
+    return models
+
+def load_latest_tree_ensembles(output_dir="saved_models"):
+    """
+    Load the tree arrays exported with the newest artifact of every model
+    
+    Args:
+        output_dir: Directory containing saved models
+    
+    Returns:
+        dict: FlatTreeEnsemble keyed by display name, for models exported with arrays
+    """
+    ensembles = {}
+    
+    for display_name, latest in _latest_entries(output_dir):
+        try:
+            ensemble = load_tree_ensemble(latest['path'])
+        except Exception as e:
+            logging.error(f"Could not load the tree arrays of {latest['path']}: {e}")
+            continue
+        if ensemble is not None:
+            ensembles[display_name] = ensemble
+    
+    return ensembles
+
+def load_latest_feature_plans(output_dir="saved_models"):
+    """
+    Load the feature plans saved with the newest artifact of every model
+    
+    Args:
+        output_dir: Directory containing saved models
+    
+    Returns:
+        dict: FeaturePlan keyed by display name, for models saved with a plan
+    """
+    plans = {}
+    
+    for display_name, latest in _latest_entries(output_dir):
+        try:
+            plan = load_feature_plan(latest['path'])
+        except Exception as e:
+            logging.error(f"Could not load the feature plan of {latest['path']}: {e}")
+            continue
+        if plan is not None:
+            plans[display_name] = plan
+    
+    return plans
@@ -0,0 +1,292 @@
+"""
+Array-backed evaluator for trained tree ensembles.
+
+XGBRegressor.predict and RandomForestRegressor.predict spend more time on
+input validation, DMatrix construction and (for sklearn) per-tree joblib
+dispatch than on walking the trees when only a few rows are scored.
+FlatTreeEnsemble copies every tree into contiguous NumPy arrays (feature
+index, threshold, child pointers, missing-value direction, leaf value) and
+walks all trees for all rows at once, one tree level per step.
+
+Predictions agree exactly with the source model: inputs are cast to float32
+as both libraries do, splits use the same comparison (XGBoost sends
+x < threshold left, sklearn x <= threshold) and leaf values are accumulated
+in the same order and precision before averaging (RandomForest) or adding
+to the base score (XGBoost).
+"""
+
+import json
+
+import numpy as np
+
+# XGBoost objectives whose prediction is the raw margin (no link function)
+IDENTITY_OBJECTIVES = {
+    'reg:squarederror', 'reg:linear', 'reg:squaredlogerror',
+    'reg:pseudohubererror', 'reg:absoluteerror'
+}
+
+ARRAY_FIELDS = ('feature', 'threshold', 'left', 'right', 'default_left', 'value', 'roots')
+
+
+class UnsupportedModelError(ValueError):
+    """Raised when a model cannot be flattened into a FlatTreeEnsemble"""
+
+
+class FlatTreeEnsemble:
+    """Tree ensemble stored as flat NumPy arrays with a vectorized evaluator"""
+
+    def __init__(self, feature, threshold, left, right, default_left, value, roots,
+                 max_depth, comparison, base_score=0.0, average=False, n_features=None):
+        """
+        Args:
+            feature: Split feature index per node (0 for leaves)
+            threshold: Split threshold per node
+            left, right: Child node index per node; leaves point to themselves
+            default_left: Whether missing values go left, per node
+            value: Leaf value per node (0 for internal nodes)
+            roots: Root node index of every tree, in evaluation order
+            max_depth: Depth of the deepest tree (number of traversal steps)
+            comparison: 'lt' (XGBoost, x < threshold goes left) or 'le' (sklearn)
+            base_score: Value the tree sum starts from
+            average: Divide the tree sum by the number of trees (RandomForest)
+            n_features: Number of input columns the model was trained on
+        """
+        if comparison not in ('lt', 'le'):
+            raise ValueError(f"comparison must be 'lt' or 'le', got {comparison!r}")
+        self.feature = np.ascontiguousarray(feature, dtype=np.int32)
+        self.threshold = np.ascontiguousarray(threshold)
+        self.left = np.ascontiguousarray(left, dtype=np.int32)
+        self.right = np.ascontiguousarray(right, dtype=np.int32)
+        self.default_left = np.ascontiguousarray(default_left, dtype=bool)
+        self.value = np.ascontiguousarray(value)
+        self.roots = np.ascontiguousarray(roots, dtype=np.int32)
+        # Interleaved [left, right] pairs so one take() picks the next node
+        self._children = np.column_stack([self.left, self.right]).ravel()
+        self.max_depth = int(max_depth)
+        self.comparison = comparison
+        self.base_score = self.value.dtype.type(base_score)
+        self.average = bool(average)
+        self.n_features = n_features
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def predict(self, X):
+        """
+        Predict one value per row of X.
+
+        Args:
+            X: Array-like of shape (n_rows, n_features)
+
+        Returns:
+            np.ndarray of shape (n_rows,) in the source model's output dtype
+        """
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if self.n_features is not None and X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features, but the model expects {self.n_features}")
+
+        n_rows = X.shape[0]
+        values = X.ravel()
+        row_offset = np.arange(n_rows) * X.shape[1]
+        has_missing = np.isnan(values).any()
+        # One node per (tree, row); leaves loop to themselves, so max_depth steps reach every leaf
+        node = np.repeat(self.roots[:, None], n_rows, axis=1)
+        for _ in range(self.max_depth):
+            x = values.take(self.feature.take(node) + row_offset)
+            threshold = self.threshold.take(node)
+            go_right = ~(x < threshold) if self.comparison == 'lt' else ~(x <= threshold)
+            if has_missing:
+                missing = np.isnan(x)
+                go_right[missing] = ~self.default_left.take(node[missing])
+            node = self._children.take(2 * node + go_right)
+
+        # Accumulate tree by tree, as both libraries do, so rounding matches exactly
+        leaves = np.empty((self.n_trees + 1, n_rows), dtype=self.value.dtype)
+        leaves[0] = self.base_score
+        leaves[1:] = self.value[node]
+        total = np.cumsum(leaves, axis=0, dtype=self.value.dtype)[-1]
+        if self.average:
+            total /= self.n_trees
+        return total
+
+    def save(self, path):
+        """Write the arrays and settings to an .npz file"""
+        np.savez(
+            path,
+            **{name: getattr(self, name) for name in ARRAY_FIELDS},
+            settings=np.array(json.dumps({
+                'max_depth': self.max_depth,
+                'comparison': self.comparison,
+                'base_score': float(self.base_score),
+                'average': self.average,
+                'n_features': self.n_features
+            }))
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Read an ensemble written by save()"""
+        with np.load(path) as data:
+            settings = json.loads(str(data['settings']))
+            return cls(**{name: data[name] for name in ARRAY_FIELDS}, **settings)
+
+    @classmethod
+    def from_model(cls, model):
+        """
+        Flatten a trained XGBRegressor or RandomForestRegressor.
+
+        Raises:
+            UnsupportedModelError: For other model types or unsupported settings
+        """
+        if hasattr(model, 'get_booster'):
+            return _from_xgboost(model)
+        if hasattr(model, 'estimators_') and all(hasattr(est, 'tree_') for est in model.estimators_):
+            return _from_sklearn_forest(model)
+        raise UnsupportedModelError(f"{type(model).__name__} is not a supported tree ensemble")
+
+
+def count_nodes(model):
+    """
+    Number of tree nodes FlatTreeEnsemble.from_model would copy, counted
+    without flattening (an upper bound for XGBoost models with early stopping).
+
+    Returns:
+        int, or None if the model is not a supported tree ensemble
+    """
+    if hasattr(model, 'get_booster'):
+        # One line per node in the text dump
+        return sum(dump.count('\n') for dump in model.get_booster().get_dump())
+    if hasattr(model, 'estimators_') and all(hasattr(est, 'tree_') for est in model.estimators_):
+        return sum(int(est.tree_.node_count) for est in model.estimators_)
+    return None
+
+
+def _concat_trees(trees, threshold_dtype, value_dtype):
+    """
+    Concatenate per-tree node arrays, offsetting child pointers.
+
+    Args:
+        trees: List of dicts with feature, threshold, left, right, default_left
+               and value arrays; leaves have left == -1
+    """
+    parts = {name: [] for name in ('feature', 'threshold', 'left', 'right', 'default_left', 'value')}
+    roots = []
+    max_depth = 0
+    offset = 0
+    for tree in trees:
+        n = len(tree['left'])
+        ids = np.arange(n, dtype=np.int64)
+        is_leaf = np.asarray(tree['left']) == -1
+        left = np.where(is_leaf, ids, tree['left'])
+        right = np.where(is_leaf, ids, tree['right'])
+
+        parts['feature'].append(np.where(is_leaf, 0, tree['feature']))
+        parts['threshold'].append(np.where(is_leaf, 0, tree['threshold']).astype(threshold_dtype))
+        parts['left'].append(left + offset)
+        parts['right'].append(right + offset)
+        parts['default_left'].append(np.asarray(tree['default_left'], dtype=bool))
+        parts['value'].append(np.where(is_leaf, tree['value'], 0).astype(value_dtype))
+        roots.append(offset)
+        max_depth = max(max_depth, _tree_depth(left, right))
+        offset += n
+
+    if offset >= np.iinfo(np.int32).max:
+        raise UnsupportedModelError(f"Ensemble has {offset} nodes, too many for int32 node indices")
+    arrays = {name: np.concatenate(values) for name, values in parts.items()}
+    return arrays, np.array(roots), max_depth
+
+
+def _tree_depth(left, right):
+    """Number of splits on the longest root-to-leaf path"""
+    depth = 0
+    level = np.array([0])
+    while True:
+        children = np.concatenate([left[level], right[level]])
+        children = children[children != np.concatenate([level, level])]
+        if not len(children):
+            return depth
+        depth += 1
+        level = children
+
+
+def _from_xgboost(model):
+    """Flatten an XGBoost gbtree regressor from its JSON model dump"""
+    booster = model.get_booster()
+    missing = model.get_params().get('missing', np.nan)
+    if missing is not None and not np.isnan(missing):
+        raise UnsupportedModelError(f"XGBoost missing={missing} is not supported (only NaN)")
+
+    learner = json.loads(booster.save_raw(raw_format='json'))['learner']
+    objective = learner['objective']['name']
+    if objective not in IDENTITY_OBJECTIVES:
+        raise UnsupportedModelError(f"XGBoost objective {objective} is not supported")
+    params = learner['learner_model_param']
+    if int(params.get('num_target', 1)) != 1 or int(params.get('num_class', 0)) > 1:
+        raise UnsupportedModelError("Only single-output XGBoost models are supported")
+    gbm = learner['gradient_booster']
+    if gbm['name'] != 'gbtree':
+        raise UnsupportedModelError(f"XGBoost booster {gbm['name']} is not supported")
+
+    trees = gbm['model']['trees']
+    best_iteration = booster.attr('best_iteration')
+    if best_iteration is not None:
+        # predict() stops at the early-stopping iteration
+        per_round = int(gbm['model']['gbtree_model_param'].get('num_parallel_tree', 1))
+        trees = trees[:(int(best_iteration) + 1) * per_round]
+
+    flat = []
+    for tree in trees:
+        if tree.get('categories_nodes') or any(tree.get('split_type', [])):
+            raise UnsupportedModelError("XGBoost categorical splits are not supported")
+        conditions = np.array(tree['split_conditions'], dtype=np.float32)
+        flat.append({
+            'feature': np.array(tree['split_indices']),
+            'threshold': conditions,
+            'left': np.array(tree['left_children']),
+            'right': np.array(tree['right_children']),
+            'default_left': np.array(tree['default_left'], dtype=bool),
+            # Leaf nodes keep their leaf value in split_conditions
+            'value': conditions
+        })
+
+    arrays, roots, max_depth = _concat_trees(flat, np.float32, np.float32)
+    base_score = float(str(params['base_score']).strip('[]'))
+    return FlatTreeEnsemble(
+        **arrays, roots=roots, max_depth=max_depth, comparison='lt',
+        base_score=np.float32(base_score), average=False, n_features=int(params['num_feature'])
+    )
+
+
+def _from_sklearn_forest(model):
+    """Flatten a fitted sklearn RandomForestRegressor (or any averaging tree forest)"""
+    if getattr(model, 'n_outputs_', 1) != 1:
+        raise UnsupportedModelError("Only single-output forests are supported")
+    if not hasattr(model, 'n_jobs') or model.n_jobs not in (None, 1):
+        # Parallel predict() sums trees in completion order, so only serial forests are reproducible
+        raise UnsupportedModelError(f"Forests with n_jobs={model.n_jobs} do not sum trees in a fixed order")
+
+    flat = []
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        missing_left = getattr(tree, 'missing_go_to_left', None)
+        flat.append({
+            'feature': tree.feature,
+            'threshold': tree.threshold,
+            'left': tree.children_left,
+            'right': tree.children_right,
+            'default_left': missing_left if missing_left is not None else np.zeros(tree.node_count, dtype=bool),
+            'value': tree.value[:, 0, 0]
+        })
+
+    arrays, roots, max_depth = _concat_trees(flat, np.float64, np.float64)
+    return FlatTreeEnsemble(
+        **arrays, roots=roots, max_depth=max_depth, comparison='le',
+        base_score=0.0, average=True, n_features=getattr(model, 'n_features_in_', None)
+    )
@@ -0,0 +1,207 @@
+"""
+Row-partitioned parallel execution of the row-local feature stages.
+
+Distance, time, precipitation and outlier features depend on one row at a
+time, so a table can be split into contiguous row ranges that are computed
+independently. A PartitionExecutor copies the input columns of a stage into
+one shared memory block, lets a process pool run the stage's kernel on one
+range each (workers attach to the block; no DataFrame is pickled) and reads
+the output columns back from the same block.
+
+Kernels call the same NumPy/pandas code as the serial feature functions on
+slices of the columns, element by element, so the output is bit-identical to
+the serial path for any number of workers (see
+benchmarks/bench_parallel_features.py). Tables smaller than
+min_partition_rows per worker use fewer partitions; a single partition runs
+in the calling process without shared memory.
+"""
+
+import logging
+import multiprocessing
+import os
+import types
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+from features.distance import calc_distance
+from features.holidays import holiday_flags
+
+# Column offsets in the shared block are aligned to cache lines
+_ALIGNMENT = 64
+
+
+# ===============================
+# KERNELS
+# ===============================
+# kernel(columns, params) -> {output name: array}; columns maps input names
+# to equally long array slices. Kernels must be module-level functions so
+# spawned workers can import them.
+
+def distance_kernel(columns, params):
+    '''Manhattan and Euclidean distances (features.distance.calc_distance)'''
+    trips = types.SimpleNamespace(**columns)
+    return {
+        'manhattan': calc_distance(trips, method='manhattan'),
+        'euclidean': calc_distance(trips, method='euclidean'),
+    }
+
+
+def time_kernel(columns, params):
+    '''weekday, hour, date and holiday of features.time.extract_time_features;
+    params['holidays'] are the sorted dates of the HolidayCalendar'''
+    times = pd.DatetimeIndex(columns['datetime'])
+    return {
+        'weekday': times.weekday + 1,
+        'hour': times.hour,
+        'date': times.normalize(),
+        'holiday': holiday_flags(columns['datetime'], params['holidays']).astype(int),
+    }
+
+
+def precipitation_kernel(columns, params):
+    '''Precipitation of each date, 0.0 for dates without a reading
+    (features.precipitation.merge_precipitation with unique dates)'''
+    dates, values = params['dates'], params['values']  # sorted, unique, not empty
+    days = columns['date']
+    position = np.minimum(np.searchsorted(dates, days), len(dates) - 1)
+    return {'precipitation': np.where(dates[position] == days, values[position], 0.0)}
+
+
+def outlier_kernel(columns, params):
+    '''routing_error and short_trip flags of feature_pipe.marking_outliers'''
+    gmaps_distance, manhattan = columns['gmaps_distance'], columns['manhattan']
+    return {
+        'routing_error': np.where((gmaps_distance > 500) & (manhattan < 50), 1.0, 0.0),
+        'short_trip': np.where((gmaps_distance < 500) & (manhattan < 50), 1.0, 0.0),
+    }
+
+
+def _views(block, layout):
+    return {name: np.ndarray(length, dtype=dtype, buffer=block.buf, offset=offset)
+            for name, (dtype, offset, length) in layout.items()}
+
+
+def _ready():
+    '''Worker: returns once the worker has imported this module'''
+    return os.getpid()
+
+
+def _run_partition(block_name, layout, input_names, start, stop, kernel, params):
+    '''Worker: run kernel on rows [start, stop) of the columns in the shared block'''
+    block = shared_memory.SharedMemory(name=block_name)
+    views = inputs = None
+    try:
+        views = _views(block, layout)
+        inputs = {name: views[name][start:stop] for name in input_names}
+        results = kernel(inputs, params)
+        for name, values in results.items():
+            views[name][start:stop] = np.asarray(values)
+    finally:
+        views = inputs = None  # release the buffer before closing
+        block.close()
+    return stop - start
+
+
+class PartitionExecutor:
+    """Runs row-local kernels over contiguous row partitions in a process pool"""
+
+    def __init__(self, workers=None, min_partition_rows=50000, start_method=None):
+        """
+        Args:
+            workers: Worker processes (None uses every CPU; 1 runs serially in-process)
+            min_partition_rows: Fewest rows worth sending to a worker
+            start_method: multiprocessing start method of the pool. Defaults to
+                          'fork' where available: workers start in milliseconds
+                          with the parent's modules already imported, where spawned
+                          workers would each re-import the entry script (TensorFlow
+                          and all) first. Kernels only run NumPy/pandas code, which
+                          is safe in a forked child of a threaded parent
+        """
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.min_partition_rows = min_partition_rows
+        if start_method is None:
+            start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.start_method = start_method
+        self._pool = None
+
+    def partitions(self, n_rows):
+        """Contiguous (start, stop) row ranges of a table of n_rows"""
+        count = max(1, min(self.workers, n_rows // max(self.min_partition_rows, 1)))
+        bounds = np.linspace(0, n_rows, count + 1).astype(np.int64)
+        return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    def map(self, kernel, columns, params=None):
+        """
+        Compute kernel on every row of columns.
+
+        Args:
+            kernel: Module-level function kernel(columns, params) -> {name: array}
+            columns: {name: 1-D array} of equal length, the kernel's inputs
+            params: Small read-only values sent to every partition
+        Returns:
+            {output name: array} of full length
+        """
+        params = dict(params or {})
+        columns = {name: np.ascontiguousarray(values) for name, values in columns.items()}
+        n_rows = len(next(iter(columns.values())))
+        partitions = self.partitions(n_rows)
+        if len(partitions) == 1:
+            return {name: np.asarray(values) for name, values in kernel(columns, params).items()}
+
+        # Output names and dtypes from the kernel run on the first row
+        probe = kernel({name: values[:1] for name, values in columns.items()}, params)
+        outputs = {name: np.asarray(values).dtype for name, values in probe.items()}
+
+        layout, size = {}, 0
+        for name, dtype in [(n, v.dtype) for n, v in columns.items()] + list(outputs.items()):
+            layout[name] = (dtype.str, size, n_rows)
+            size += -(-dtype.itemsize * n_rows // _ALIGNMENT) * _ALIGNMENT
+
+        block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        views = None
+        try:
+            views = _views(block, layout)
+            for name, values in columns.items():
+                views[name][:] = values
+            pool = self._get_pool()
+            futures = [pool.submit(_run_partition, block.name, layout, list(columns), start, stop, kernel, params)
+                       for start, stop in partitions]
+            for future in futures:
+                future.result()
+            results = {name: views[name].copy() for name in outputs}
+        finally:
+            views = None  # release the buffer before closing
+            block.close()
+            block.unlink()
+        return results
+
+    def warm_up(self):
+        """Start every worker process now rather than on the first parallel stage"""
+        if self.workers > 1:
+            pool = self._get_pool()
+            for future in [pool.submit(_ready) for _ in range(self.workers)]:
+                future.result()
+
+    def _get_pool(self):
+        if self._pool is None:
+            # Workers must share the parent's resource tracker: one started by a
+            # worker would report the blocks it attached to as leaked when it exits
+            resource_tracker.ensure_running()
+            context = multiprocessing.get_context(self.start_method)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            logging.info(f"Started {self.workers} feature worker processes")
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
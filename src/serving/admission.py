@@ -0,0 +1,148 @@
+"""
+Admission control for model inference.
+
+When the inference pool backs up, every queued /predict call waits longer
+and eventually times out. LoadShedder watches the number of requests
+waiting for inference (with micro-batching, the requests in forming and
+queued batches rather than the batches themselves) and a moving average of
+inference latency; once either passes its threshold, callers are told to
+answer from the distance heuristic instead of queueing.
+Shedding stops once both signals fall below resume_ratio times their
+thresholds, so the API does not flap around the limit.
+
+While shedding, every probe_every-th request is still admitted so the
+latency average keeps being measured and recovery is noticed without
+waiting for the average to go stale.
+"""
+
+import threading
+import time
+
+
+class LoadShedder:
+    """Decides per request whether model inference is admitted"""
+
+    def __init__(self, executor, max_queue_depth, max_latency_s, resume_ratio=0.5,
+                 probe_every=10, ewma_alpha=0.2, stale_after_s=5.0, clock=time.monotonic, batcher=None):
+        """
+        Args:
+            executor: BoundedExecutor running inference (its queue depth is read)
+            max_queue_depth: Shed when at least this many requests wait for a worker
+            max_latency_s: Shed when the latency average exceeds this (None disables)
+            resume_ratio: Fraction of both thresholds to fall below before resuming
+            probe_every: While shedding, admit one request in this many
+            ewma_alpha: Smoothing factor of the latency average
+            stale_after_s: Ignore the latency average when no sample is this recent
+            clock: Monotonic time source, replaceable for testing
+            batcher: MicroBatcher feeding the executor, whose waiting requests are
+                     counted in place of the batches they are queued in
+        """
+        self.executor = executor
+        self.batcher = batcher
+        self.max_queue_depth = max_queue_depth
+        self.max_latency_s = max_latency_s
+        self.resume_ratio = resume_ratio
+        self.probe_every = probe_every
+        self.ewma_alpha = ewma_alpha
+        self.stale_after_s = stale_after_s
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        self._latency_s = None
+        self._last_sample = None
+        self._since_probe = 0
+
+        self.shedding = False
+        self.reason = None
+        self.episodes = 0
+        self.admitted = 0
+        self.probes = 0
+        self.shed = 0
+
+    def latency(self):
+        """Latency average in seconds, or None without a recent sample"""
+        if self._last_sample is None or self._clock() - self._last_sample > self.stale_after_s:
+            return None
+        return self._latency_s
+
+    def queue_depth(self):
+        """Requests waiting for an inference worker"""
+        depth = self.executor.queued
+        if self.batcher is not None:
+            depth += self.batcher.waiting - self.batcher.queued_batches
+        return max(depth, 0)
+
+    def _overload_reason(self, depth, latency, ratio=1.0):
+        if depth >= self.max_queue_depth * ratio:
+            return "queue_depth"
+        if self.max_latency_s is not None and latency is not None and latency > self.max_latency_s * ratio:
+            return "latency"
+        return None
+
+    def admit(self):
+        """
+        Admit or shed one request.
+
+        Returns:
+            tuple: (True, None) to run the model, or (False, reason) to answer
+                   from the fallback, reason being 'queue_depth' or 'latency'
+        """
+        depth = self.queue_depth()
+        with self._lock:
+            latency = self.latency()
+            if not self.shedding:
+                reason = self._overload_reason(depth, latency)
+                if reason is not None:
+                    self.shedding = True
+                    self.reason = reason
+                    self.episodes += 1
+                    self._since_probe = 0
+            else:
+                reason = self._overload_reason(depth, latency, self.resume_ratio)
+                if reason is None:
+                    self.shedding = False
+                    self.reason = None
+                else:
+                    self.reason = reason
+
+            if self.shedding:
+                self._since_probe += 1
+                if self._since_probe < self.probe_every:
+                    self.shed += 1
+                    return False, self.reason
+                self._since_probe = 0
+                self.probes += 1
+            self.admitted += 1
+            return True, None
+
+    def record_timeout(self, latency_s):
+        """Feed an admitted inference call that timed out: it counts as at least max_latency_s"""
+        self.record(max(latency_s, self.max_latency_s or 0.0))
+
+    def record(self, latency_s):
+        """Feed the end-to-end latency of one completed inference call (not of
+        calls rejected before running, whose near-zero latency would hide overload)"""
+        with self._lock:
+            now = self._clock()
+            if self.latency() is None:
+                self._latency_s = latency_s
+            else:
+                self._latency_s += self.ewma_alpha * (latency_s - self._latency_s)
+            self._last_sample = now
+
+    def stats(self):
+        """Current state, thresholds and counters"""
+        with self._lock:
+            latency = self.latency()
+            return {
+                'shedding': self.shedding,
+                'reason': self.reason,
+                'queue_depth': self.queue_depth(),
+                'max_queue_depth': self.max_queue_depth,
+                'latency_s': latency,
+                'max_latency_s': self.max_latency_s,
+                'episodes': self.episodes,
+                'admitted': self.admitted,
+                'probes': self.probes,
+                'shed': self.shed,
+            }
@@ -0,0 +1,178 @@
+"""
+Adaptive micro-batching of concurrent single-row predictions.
+
+Requests for the same model that arrive within a short window (or until the
+batch is full) are stacked and scored with one predict call, then each caller
+receives its own result. The window adapts to the observed arrival rate: at
+low traffic a request would wait for company that is not coming, so the
+window collapses to zero and the request is dispatched immediately.
+"""
+
+import asyncio
+import threading
+import time
+
+from serving.metrics import Histogram
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+class MicroBatcher:
+    """Coalesce concurrent requests per model into batched calls on an executor"""
+
+    def __init__(self, executor, batch_fn, max_batch_size=64, max_window_s=0.002,
+                 min_window_s=0.0005, ewma_alpha=0.2):
+        """
+        Args:
+            executor: BoundedExecutor that runs batch_fn
+            batch_fn: batch_fn(model, items) -> list with one result per item;
+                      an Exception instance as a result is raised to that caller only
+            max_batch_size: Flush as soon as a batch reaches this many items
+            max_window_s: Longest time the first item of a batch may wait
+            min_window_s: Shortest non-zero window once traffic justifies batching
+            ewma_alpha: Smoothing factor for the inter-arrival time estimate
+        """
+        self.executor = executor
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_window_s = max_window_s
+        self.min_window_s = min_window_s
+        self.ewma_alpha = ewma_alpha
+
+        self._pending = {}
+        self._timers = {}
+        # Dispatched batches (and their items) not yet started by a worker
+        self._queued_lock = threading.Lock()
+        self.queued_batches = 0
+        self.queued_items = 0
+        self._last_arrival = None
+        self._interarrival_s = None
+
+        self.batches = 0
+        self.items = 0
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self.added_latency = Histogram()
+
+    def current_window(self):
+        """Seconds the next batch will wait for more requests (0 = dispatch immediately)"""
+        if self._interarrival_s is None or self._interarrival_s >= self.max_window_s:
+            # Fewer than one extra request expected within the window
+            return 0.0
+        fill_time = self._interarrival_s * (self.max_batch_size - 1)
+        return min(self.max_window_s, max(self.min_window_s, fill_time))
+
+    @property
+    def waiting(self):
+        """Requests waiting to be scored: in forming batches or in batches queued on the executor"""
+        return sum(len(batch['items']) for batch in list(self._pending.values())) + self.queued_items
+
+    def _record_arrival(self, now):
+        if self._last_arrival is not None:
+            gap = now - self._last_arrival
+            if self._interarrival_s is None:
+                self._interarrival_s = gap
+            else:
+                self._interarrival_s += self.ewma_alpha * (gap - self._interarrival_s)
+        self._last_arrival = now
+
+    async def submit(self, key, model, item):
+        """
+        Queue one item for model and wait for its result.
+
+        Args:
+            key: Batching key (usually the model name)
+            model: Model passed to batch_fn
+            item: Single request payload passed to batch_fn inside a list
+        """
+        loop = asyncio.get_running_loop()
+        now = time.perf_counter()
+        self._record_arrival(now)
+
+        batch = self._pending.get(key)
+        if batch is not None and batch['model'] is not model:
+            # Model was replaced while a batch was forming; do not mix versions
+            self._flush(key)
+            batch = None
+        if batch is None:
+            batch = {'model': model, 'items': [], 'futures': [], 'enqueued': []}
+            self._pending[key] = batch
+
+        future = loop.create_future()
+        batch['items'].append(item)
+        batch['futures'].append(future)
+        batch['enqueued'].append(now)
+
+        if len(batch['items']) >= self.max_batch_size:
+            self._flush(key)
+        elif key not in self._timers:
+            window = self.current_window()
+            if window <= 0:
+                self._flush(key)
+            else:
+                self._timers[key] = loop.call_later(window, self._flush, key)
+
+        return await future
+
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if not batch:
+            return
+
+        dispatched = time.perf_counter()
+        batch['started'] = False
+        with self._queued_lock:
+            self.queued_batches += 1
+            self.queued_items += len(batch['items'])
+        self.batches += 1
+        self.items += len(batch['items'])
+        self.batch_size.observe(len(batch['items']))
+        for enqueued in batch['enqueued']:
+            self.added_latency.observe(dispatched - enqueued)
+
+        asyncio.ensure_future(self._run_batch(batch))
+
+    def _mark_started(self, batch):
+        """Stop counting a batch as queued (once; from a worker or when it never runs)"""
+        with self._queued_lock:
+            if not batch['started']:
+                batch['started'] = True
+                self.queued_batches -= 1
+                self.queued_items -= len(batch['items'])
+
+    def _call_batch_fn(self, batch):
+        self._mark_started(batch)
+        return self.batch_fn(batch['model'], batch['items'])
+
+    async def _run_batch(self, batch):
+        futures = batch['futures']
+        try:
+            results = await self.executor.run(self._call_batch_fn, batch)
+        except BaseException as e:
+            self._mark_started(batch)
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, result in zip(futures, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        """Batch counters, current window and histogram summaries"""
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+            'window_s': self.current_window(),
+            'waiting': self.waiting,
+            'batch_size': self.batch_size.summary(),
+            'added_latency_s': self.added_latency.summary()
+        }
@@ -0,0 +1,138 @@
+"""
+In-process caches for the GoPredict API.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional time-to-live per entry"""
+
+    def __init__(self, max_size=10000, ttl_s=None, clock=time.monotonic):
+        """
+        Args:
+            max_size: Maximum number of entries before the least recently used is evicted
+            ttl_s: Default seconds an entry stays valid (None never expires)
+            clock: Monotonic time source, replaceable for testing
+        """
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if absent or expired"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl_s=_MISSING):
+        """Store value under key; ttl_s overrides the default TTL for this entry"""
+        ttl = self.ttl_s if ttl_s is _MISSING else ttl_s
+        expires_at = self._clock() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Size, hit/miss counters and hit rate"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+class PredictionCache:
+    """
+    Cache of model predictions for near-duplicate trips.
+
+    Keys combine the model name and version, origin and destination snapped to
+    a grid of grid_deg degrees, the hour of the week and the holiday flag, so
+    repeat trips from the same pickup/dropoff cells in the same hour skip
+    feature building and the model call entirely.
+    """
+
+    def __init__(self, grid_deg=0.001, max_size=100000, ttl_s=None):
+        """
+        Args:
+            grid_deg: Grid cell size in degrees (0.001 ~ 100 m)
+            max_size: Maximum cached predictions (LRU eviction)
+            ttl_s: Optional seconds an entry stays valid
+        """
+        self.grid_deg = grid_deg
+        self.cache = LRUCache(max_size=max_size, ttl_s=ttl_s)
+        self.invalidations = 0
+
+    def _snap(self, value):
+        return int(round(value / self.grid_deg))
+
+    def key(self, model_name, model_version, start_lat, start_lng, end_lat, end_lng, hour_of_week, holiday):
+        """Build the cache key for one trip"""
+        return (
+            model_name, model_version,
+            self._snap(start_lat), self._snap(start_lng),
+            self._snap(end_lat), self._snap(end_lng),
+            hour_of_week, holiday
+        )
+
+    def get(self, key):
+        """Cached prediction for key, or None"""
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        """Store a prediction"""
+        self.cache.set(key, value)
+
+    def invalidate(self):
+        """Drop every cached prediction (called whenever the served models change)"""
+        self.cache.clear()
+        self.invalidations += 1
+
+    def stats(self):
+        """Hit/miss counters and cache size"""
+        stats = self.cache.stats()
+        stats['grid_deg'] = self.grid_deg
+        stats['invalidations'] = self.invalidations
+        return stats
@@ -0,0 +1,136 @@
+"""
+Response encodings for the prediction and distance endpoints.
+
+A dict returned from a FastAPI handler is first copied by jsonable_encoder
+and then serialized with json.dumps, both walking every value in Python;
+for batch responses of thousands of rows that costs more than scoring them.
+Handlers return these responses directly instead:
+
+- FastJSONResponse: JSON serialized in one orjson call (json.dumps when
+  orjson is not installed), skipping jsonable_encoder.
+- ArrowResponse: an Arrow IPC stream with one column per field, for batch
+  payloads (requires pyarrow). pyarrow.ipc.open_stream(body).read_all()
+  decodes it without parsing row by row.
+
+negotiate() picks between the offered media types from the Accept header.
+"""
+
+import json
+
+import numpy as np
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # pyarrow is optional; Arrow responses are then not offered
+    pyarrow = None
+
+JSON_MEDIA_TYPE = "application/json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def _json_default(value):
+    """Encode NumPy scalars and arrays that the standard json module rejects"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_json(content):
+    """Serialize content to JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_json_default, separators=(",", ":")).encode()
+
+
+def arrow_ipc(columns, metadata=None):
+    """
+    Encode equal-length columns as an Arrow IPC stream.
+
+    Args:
+        columns: Mapping of column name to list or NumPy array (NaN and None become null)
+        metadata: Optional str -> str mapping stored in the schema
+
+    Returns:
+        bytes
+    """
+    # from_pandas maps NaN to null, so missing values read back as None
+    table = pyarrow.table({name: pyarrow.array(values, from_pandas=True) for name, values in columns.items()})
+    if metadata:
+        table = table.replace_schema_metadata({str(k): str(v) for k, v in metadata.items()})
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def offered_media_types(columnar=False):
+    """Media types an endpoint can produce, preferred first"""
+    if columnar and pyarrow is not None:
+        return [JSON_MEDIA_TYPE, ARROW_MEDIA_TYPE]
+    return [JSON_MEDIA_TYPE]
+
+
+def negotiate(accept, offered):
+    """
+    Choose the response media type from an Accept header.
+
+    Args:
+        accept: Accept header value (empty or None accepts anything)
+        offered: Media types the endpoint can produce, preferred first
+
+    Returns:
+        The chosen media type, or None if the client accepts none of them
+    """
+    if not accept:
+        return offered[0]
+    ranges = []
+    for part in accept.split(","):
+        media_range, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        ranges.append((media_range.lower(), q))
+
+    best, best_q = None, 0.0
+    for media_type in offered:
+        # The most specific matching range sets the quality: type/subtype, type/*, */*
+        patterns = (media_type, media_type.split("/")[0] + "/*", "*/*")
+        q, specificity = 0.0, len(patterns)
+        for media_range, range_q in ranges:
+            if media_range in patterns and patterns.index(media_range) < specificity:
+                q, specificity = range_q, patterns.index(media_range)
+        if q > best_q:
+            best, best_q = media_type, q
+    return best
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serialized with orjson when available"""
+
+    def render(self, content):
+        return dumps_json(content)
+
+
+class ArrowResponse(Response):
+    """Arrow IPC stream response; content is a column mapping or encoded bytes"""
+
+    media_type = ARROW_MEDIA_TYPE
+
+    def __init__(self, content, metadata=None, **kwargs):
+        if not isinstance(content, bytes):
+            content = arrow_ipc(content, metadata)
+        super().__init__(content, **kwargs)
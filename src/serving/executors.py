@@ -0,0 +1,115 @@
+"""
+Bounded executors that keep blocking work off the asyncio event loop.
+
+Each pool has a concurrency limit (worker threads), a bounded queue of
+waiting tasks, a default timeout, and queue-depth / wait-time metrics. When
+the queue is full new work is rejected immediately instead of piling up.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from serving.metrics import Histogram
+
+
+class ExecutorSaturated(Exception):
+    """Raised when a pool already has max_workers running and max_queue waiting tasks"""
+
+
+class BoundedExecutor:
+    """Thread pool with admission limit, timeouts and wait/run time histograms"""
+
+    def __init__(self, name, max_workers, max_queue, timeout=None):
+        """
+        Args:
+            name: Pool name used in thread names and metrics
+            max_workers: Maximum number of tasks running at once
+            max_queue: Maximum number of tasks waiting for a worker
+            timeout: Default seconds to wait for a task (None waits forever)
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"gopredict-{name}")
+        self._lock = threading.Lock()
+
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_time = Histogram()
+        self.run_time = Histogram()
+
+    async def run(self, fn, *args, timeout=None):
+        """
+        Run fn(*args) on the pool and await its result.
+
+        Raises:
+            ExecutorSaturated: if the queue is full
+            asyncio.TimeoutError: if the task does not finish within the timeout
+        """
+        with self._lock:
+            if self.queued + self.running >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ExecutorSaturated(f"{self.name} pool is saturated ({self.queued} queued)")
+            self.queued += 1
+
+        submitted = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+            self.wait_time.observe(started - submitted)
+            try:
+                result = fn(*args)
+                with self._lock:
+                    self.completed += 1
+                return result
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                raise
+            finally:
+                with self._lock:
+                    self.running -= 1
+                self.run_time.observe(time.perf_counter() - started)
+
+        future = self._pool.submit(task)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+                # Tasks that never started are dropped from the queue
+                if future.cancel():
+                    self.queued -= 1
+            raise
+
+    def stats(self):
+        """Current queue depth, counters and latency summaries"""
+        with self._lock:
+            stats = {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'queue_depth': self.queued,
+                'running': self.running,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+            }
+        stats['wait_time_s'] = self.wait_time.summary()
+        stats['run_time_s'] = self.run_time.summary()
+        return stats
+
+    def shutdown(self, wait=False):
+        """Stop accepting work and release the worker threads"""
+        self._pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,368 @@
+"""
+Out-of-process execution of preprocessing, feature engineering, training and
+full pipeline jobs.
+
+Each job runs in its own spawned process so minutes of pandas/XGBoost/Keras
+work never holds the API's GIL or event loop. The child reports stage
+progress over a multiprocessing queue, saves trained models with save_model,
+and returns only their paths; the parent loads them on a monitor thread and
+hands them to the serving process through the on_models callback. Jobs that
+rebuild the origin-destination duration table report its path to on_od_table.
+Preprocessing and feature engineering stages are restored from the stage
+cache when their inputs are unchanged (params['force'] recomputes them); the
+result lists each stage's hit or miss under 'cache'.
+
+Job processes are not daemonic so feature engineering can start its own
+worker pool (config.DATASETS['feature_workers'] > 1, see
+partition_executor.py). Cancelling or shutting down still terminates them:
+SIGTERM unwinds the job so it shuts its pool down and releases its shared
+memory before exiting, and shutdown() kills jobs that do not exit in time.
+"""
+
+import logging
+import multiprocessing
+import queue
+import signal
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+# Job lifecycle states
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+JOB_KINDS = ('preprocess', 'feature_engineering', 'train', 'pipeline')
+
+
+# ===============================
+# CHILD PROCESS
+# ===============================
+
+def _run_preprocess(pipeline, params, progress):
+    progress('preprocessing', 0, 1)
+    pipeline.step1_data_preprocessing()
+    return {}
+
+
+def _run_feature_engineering(pipeline, params, progress):
+    progress('feature_engineering', 0, 2)
+    chunk_size = params.get('chunk_size')
+    # Chunked runs keep memory bounded: the OD table reads only its columns back
+    train_df, _ = pipeline.step2_feature_engineering(chunk_size, load=not chunk_size)
+    progress('od_table', 1, 2)
+    pipeline.build_od_table(train_df)
+    return {'od_table': str(pipeline.paths['od_table'])}
+
+
+def _run_train(pipeline, params, progress):
+    from dataset_store import read_dataset
+
+    progress('loading_features', 0, 2)
+    train_df = read_dataset(pipeline.paths['feature_train'])
+    progress('training', 1, 2)
+    _, saved_models = pipeline.step3_model_training(train_df, params.get('models_to_run'))
+    return {'saved_models': {name: str(path) for name, path in saved_models.items()}}
+
+
+def _run_pipeline(pipeline, params, progress):
+    results = pipeline.run_complete_pipeline(models_to_run=params.get('models_to_run'), progress=progress,
+                                             chunk_size=params.get('chunk_size'))
+    return {
+        'saved_models': {name: str(path) for name, path in results['saved_models'].items()},
+        'best_model': results['best_model'],
+        'best_rmse': float(results['best_rmse']),
+        'submission_file': str(results['submission_file']),
+        'od_table': str(pipeline.paths['od_table'])
+    }
+
+
+JOB_RUNNERS = {
+    'preprocess': _run_preprocess,
+    'feature_engineering': _run_feature_engineering,
+    'train': _run_train,
+    'pipeline': _run_pipeline,
+}
+
+
+def _terminated(signum, frame):
+    # Unwind the job (closing feature worker pools) instead of dying on the spot
+    raise SystemExit(128 + signum)
+
+
+def _job_main(kind, params, project_root, events):
+    """Entry point of the job process (must stay importable for the spawn start method)"""
+    signal.signal(signal.SIGTERM, _terminated)
+    src_dir = str(Path(project_root) / "src")
+    if src_dir not in sys.path:
+        sys.path.insert(0, src_dir)
+
+    def progress(stage, index, total):
+        events.put(('stage', stage, index, total, time.time()))
+
+    try:
+        from complete_pipeline import CompleteMLPipeline
+
+        pipeline = CompleteMLPipeline(project_root, force=params.get('force', False))
+        result = JOB_RUNNERS[kind](pipeline, params, progress)
+        if pipeline.cache.report:
+            result['cache'] = pipeline.cache.report
+        events.put(('done', result, time.time()))
+    except BaseException as e:
+        events.put(('error', f"{type(e).__name__}: {e}", time.time()))
+
+
+# ===============================
+# PARENT PROCESS
+# ===============================
+
+class JobManager:
+    """Start, track and cancel pipeline jobs running in separate processes"""
+
+    def __init__(self, project_root, on_models=None, on_od_table=None, max_concurrent=1, start_method='spawn'):
+        """
+        Args:
+            project_root: Project root passed to CompleteMLPipeline in the child
+            on_models: Callback on_models(models, plans, ensembles) with {display_name: model},
+                       the {display_name: FeaturePlan} and {display_name: FlatTreeEnsemble}
+                       saved with them after a job
+                       that trained models succeeds; runs on the job's monitor thread
+            on_od_table: Callback on_od_table(path) after a job that rebuilt the
+                         OD duration table succeeds; runs on the job's monitor thread
+            max_concurrent: Jobs allowed to run at once; extra jobs wait in a FIFO queue
+            start_method: multiprocessing start method for job processes
+        """
+        self.project_root = str(project_root)
+        self.on_models = on_models
+        self.on_od_table = on_od_table
+        self.max_concurrent = max_concurrent
+        self._ctx = multiprocessing.get_context(start_method)
+
+        self._jobs = {}
+        self._pending = []
+        self._processes = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, params=None):
+        """
+        Queue a job and start it if a slot is free.
+
+        Returns:
+            dict: Public view of the new job
+        """
+        if kind not in JOB_RUNNERS:
+            raise ValueError(f"Unknown job kind '{kind}', expected one of {JOB_KINDS}")
+
+        job = {
+            'id': uuid.uuid4().hex[:12],
+            'kind': kind,
+            'params': dict(params or {}),
+            'status': QUEUED,
+            'stage': None,
+            'stage_index': 0,
+            'total_stages': None,
+            'stage_timings': {},
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'error': None,
+            'result': None,
+            '_stage_started': None,
+        }
+        with self._lock:
+            self._jobs[job['id']] = job
+            self._pending.append(job['id'])
+        logging.info(f"Queued {kind} job {job['id']}")
+
+        self._start_pending()
+        return self.get(job['id'])
+
+    def get(self, job_id):
+        """Public view of a job, or None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._view(job) if job is not None else None
+
+    def list(self):
+        """Public views of all jobs, newest first"""
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda j: j['created_at'], reverse=True)
+            return [self._view(job) for job in jobs]
+
+    def active_count(self):
+        """Number of queued or running jobs"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job['status'] in (QUEUED, RUNNING))
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued or running job; running jobs have their process terminated.
+
+        Returns:
+            dict: Public view of the job, or None if unknown
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] == QUEUED:
+                self._pending.remove(job_id)
+                self._finish(job, CANCELLED)
+            elif job['status'] == RUNNING:
+                job['cancel_requested'] = True
+                process = self._processes.get(job_id)
+                if process is not None:
+                    process.terminate()
+            view = self._view(job)
+        logging.info(f"Cancellation requested for job {job_id}")
+        return view
+
+    def shutdown(self, timeout=10.0):
+        """Terminate running job processes, killing those still alive after timeout seconds"""
+        with self._lock:
+            processes = list(self._processes.values())
+            self._pending.clear()
+        for process in processes:
+            process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+    def _view(self, job):
+        view = {k: v for k, v in job.items() if not k.startswith('_') and k != 'cancel_requested'}
+        end = job['finished_at'] or time.time()
+        view['duration_s'] = end - job['started_at'] if job['started_at'] else None
+        return view
+
+    def _start_pending(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job['status'] == RUNNING)
+            to_start = []
+            while self._pending and running < self.max_concurrent:
+                job = self._jobs[self._pending.pop(0)]
+                job['status'] = RUNNING
+                job['started_at'] = time.time()
+                to_start.append(job)
+                running += 1
+
+        for job in to_start:
+            events = self._ctx.Queue()
+            process = self._ctx.Process(
+                target=_job_main,
+                args=(job['kind'], job['params'], self.project_root, events),
+                name=f"gopredict-job-{job['id']}",
+                # Daemonic processes may not start the feature worker pool
+                daemon=False
+            )
+            process.start()
+            with self._lock:
+                self._processes[job['id']] = process
+            logging.info(f"Started {job['kind']} job {job['id']} (pid {process.pid})")
+            threading.Thread(
+                target=self._monitor, args=(job, process, events),
+                name=f"gopredict-job-monitor-{job['id']}", daemon=True
+            ).start()
+
+    def _record_stage(self, job, stage, index, total, at):
+        with self._lock:
+            if job['stage'] is not None:
+                job['stage_timings'][job['stage']] = at - job['_stage_started']
+            job['stage'] = stage
+            job['stage_index'] = index
+            job['total_stages'] = total
+            job['_stage_started'] = at
+
+    def _monitor(self, job, process, events):
+        outcome = None
+        while outcome is None:
+            try:
+                event = events.get(timeout=0.5)
+            except queue.Empty:
+                if not process.is_alive():
+                    # Give a last event written just before exit a chance to arrive
+                    try:
+                        event = events.get(timeout=0.5)
+                    except queue.Empty:
+                        break
+                else:
+                    continue
+            if event[0] == 'stage':
+                self._record_stage(job, *event[1:])
+            else:
+                outcome = event
+
+        process.join()
+        with self._lock:
+            self._processes.pop(job['id'], None)
+
+        if job.get('cancel_requested'):
+            self._complete(job, CANCELLED)
+        elif outcome is None:
+            self._complete(job, FAILED, error=f"Job process exited with code {process.exitcode}")
+        elif outcome[0] == 'error':
+            self._complete(job, FAILED, error=outcome[1], at=outcome[2])
+        else:
+            self._handle_result(job, outcome[1], outcome[2])
+
+        self._start_pending()
+
+    def _handle_result(self, job, result, at):
+        saved_models = result.get('saved_models') or {}
+        if saved_models:
+            from model.save_models import load_model, load_feature_plan, load_tree_ensemble
+
+            try:
+                models = {name: load_model(path) for name, path in saved_models.items()}
+                plans = {name: load_feature_plan(path) for name, path in saved_models.items()}
+                ensembles = {name: load_tree_ensemble(path) for name, path in saved_models.items()}
+                if self.on_models is not None:
+                    self.on_models(models, {name: plan for name, plan in plans.items() if plan is not None},
+                                   {name: ensemble for name, ensemble in ensembles.items() if ensemble is not None})
+                result = dict(result, models=sorted(models))
+            except Exception as e:
+                self._complete(job, FAILED, error=f"Loading trained models failed: {e}", at=at)
+                return
+        if result.get('od_table') and self.on_od_table is not None:
+            try:
+                self.on_od_table(result['od_table'])
+            except Exception as e:
+                logging.warning(f"Loading the OD duration table failed: {e}")
+        self._complete(job, SUCCEEDED, result=result, at=at)
+
+    def _complete(self, job, status, result=None, error=None, at=None):
+        with self._lock:
+            job['result'] = result
+            job['error'] = error
+            self._finish(job, status, at)
+        if status == SUCCEEDED:
+            logging.info(f"✅ {job['kind']} job {job['id']} succeeded")
+        elif status == FAILED:
+            logging.error(f"❌ {job['kind']} job {job['id']} failed: {error}")
+        else:
+            logging.info(f"{job['kind']} job {job['id']} cancelled")
+
+    def _finish(self, job, status, at=None):
+        # Caller holds the lock
+        at = at or time.time()
+        if job['stage'] is not None and job['_stage_started'] is not None:
+            job['stage_timings'][job['stage']] = at - job['_stage_started']
+        if status == SUCCEEDED and job['total_stages']:
+            job['stage_index'] = job['total_stages']
+        job['status'] = status
+        job['finished_at'] = at
+
+    def stats(self):
+        """Job counts by status"""
+        with self._lock:
+            counts = {state: 0 for state in (QUEUED, RUNNING) + FINISHED_STATES}
+            for job in self._jobs.values():
+                counts[job['status']] += 1
+        return counts
@@ -0,0 +1,93 @@
+"""
+Per-process memory accounting for the GoPredict API workers.
+
+RSS counts every resident page, including pages shared copy-on-write with the
+preloading parent, so summing RSS over forked workers overstates real usage.
+USS (unique set size) counts only pages private to a process and is the
+memory that would be freed if that worker exited; PSS splits shared pages
+evenly between the processes that map them.
+"""
+
+import os
+
+try:
+    import psutil
+except ImportError:  # psutil is optional; fall back to /proc on Linux
+    psutil = None
+
+
+def _read_smaps_rollup(pid):
+    """Parse /proc/<pid>/smaps_rollup into bytes (Linux only)"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return {
+        'rss_bytes': fields.get('Rss'),
+        'uss_bytes': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+        'pss_bytes': fields.get('Pss'),
+    }
+
+
+def process_memory(pid=None):
+    """
+    RSS, USS and PSS of a process in bytes.
+
+    Uses psutil when available and falls back to /proc/<pid>/smaps_rollup.
+    Values that cannot be determined on this platform are None.
+
+    Args:
+        pid: Process id (defaults to the current process)
+
+    Returns:
+        dict: pid, rss_bytes, uss_bytes, pss_bytes
+    """
+    pid = pid or os.getpid()
+    usage = {'pid': pid, 'rss_bytes': None, 'uss_bytes': None, 'pss_bytes': None}
+
+    if psutil is not None:
+        try:
+            info = psutil.Process(pid).memory_full_info()
+            usage['rss_bytes'] = info.rss
+            usage['uss_bytes'] = getattr(info, 'uss', None)
+            usage['pss_bytes'] = getattr(info, 'pss', None)
+            return usage
+        except (psutil.AccessDenied, psutil.NoSuchProcess):
+            pass
+
+    try:
+        usage.update(_read_smaps_rollup(pid))
+    except OSError:
+        pass
+    return usage
+
+
+def memory_report(pids, labels=None):
+    """
+    Format a per-process memory table with totals.
+
+    Args:
+        pids: Process ids to report
+        labels: Optional list of names for the processes (defaults to "pid <n>")
+
+    Returns:
+        str: Multi-line report
+    """
+    labels = labels or [f"pid {pid}" for pid in pids]
+    usages = [process_memory(pid) for pid in pids]
+
+    def mb(value):
+        return f"{value / 1024 ** 2:10.1f}" if value is not None else f"{'n/a':>10}"
+
+    lines = [f"{'Process':<20}{'RSS MB':>10}{'USS MB':>10}{'PSS MB':>10}"]
+    for label, usage in zip(labels, usages):
+        lines.append(f"{label:<20}{mb(usage['rss_bytes'])}{mb(usage['uss_bytes'])}{mb(usage['pss_bytes'])}")
+
+    def total(key):
+        values = [u[key] for u in usages]
+        return sum(values) if all(v is not None for v in values) else None
+
+    lines.append(f"{'Total':<20}{mb(total('rss_bytes'))}{mb(total('uss_bytes'))}{mb(total('pss_bytes'))}")
+    return '\n'.join(lines)
@@ -0,0 +1,261 @@
+"""
+Lightweight in-process metrics for the GoPredict API.
+
+Histograms use fixed cumulative buckets (Prometheus style) so they can be
+updated from worker threads with a single short lock and no per-sample storage.
+MetricsRegistry renders counters, gauges and histograms in the Prometheus text
+exposition format for the /metrics endpoint.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from 100us to 30s
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+class Histogram:
+    """Fixed-bucket histogram of observed values"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Record one observation"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+            if value > self._max:
+                self._max = value
+
+    @contextmanager
+    def time(self):
+        """Context manager observing the elapsed seconds of its block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def percentile(self, q):
+        """Estimate the q-th quantile (0-1) as the upper bound of its bucket"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+            max_value = self._max
+        if total == 0:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.buckets + (max_value,), counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, max_value)
+        return max_value
+
+    def snapshot(self):
+        """
+        Return the current state of the histogram
+
+        Returns:
+            dict: count, sum, max and cumulative bucket counts keyed by upper bound
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total, value_sum, max_value = self._count, self._sum, self._max
+
+        cumulative = {}
+        running = 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            cumulative[bound] = running
+        cumulative[float('inf')] = total
+
+        return {'count': total, 'sum': value_sum, 'max': max_value, 'buckets': cumulative}
+
+    def summary(self):
+        """Compact JSON-friendly summary for status endpoints"""
+        snap = self.snapshot()
+        return {
+            'count': snap['count'],
+            'mean': snap['sum'] / snap['count'] if snap['count'] else 0.0,
+            'p50': self.percentile(0.50),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'max': snap['max']
+        }
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(int(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in labels.items()
+    )
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+class _LabeledMetric:
+    """Base class for metrics with one value (or child) per label combination"""
+
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames and self.metric_type in ('counter', 'gauge'):
+            # Unlabelled counters and gauges are exported as 0 before first use
+            self._children[()] = 0
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """List of (labels dict, value) pairs"""
+        with self._lock:
+            items = list(self._children.items())
+        return [(dict(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Counter(_LabeledMetric):
+    """Monotonically increasing count"""
+
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+
+class Gauge(_LabeledMetric):
+    """Value that can go up and down, or be computed on scrape by a callback"""
+
+    metric_type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), fn=None):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.fn is not None:
+            return [({}, self.fn())]
+        return super().samples()
+
+
+class HistogramFamily(_LabeledMetric):
+    """One Histogram per label combination"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def labels(self, **labels):
+        """Histogram child for a label combination"""
+        key = self._key(labels)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = Histogram(self.buckets)
+            return child
+
+    def observe(self, value, **labels):
+        self.labels(**labels).observe(value)
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), fn=None):
+        return self._register(Gauge(name, documentation, labelnames, fn))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(HistogramFamily(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector):
+        """
+        Add a callable evaluated on every scrape.
+
+        The collector returns a list of (name, type, documentation, samples)
+        tuples where samples is a list of (labels dict, value); for histograms
+        each value is a Histogram.
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        """Prometheus text format (version 0.0.4) for all metrics"""
+        families = [(m.name, m.metric_type, m.documentation, m.samples()) for m in self._metrics]
+        for collector in self._collectors:
+            families.extend(collector())
+
+        lines = []
+        for name, metric_type, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                if metric_type == 'histogram':
+                    lines.extend(_render_histogram(name, labels, value))
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _render_histogram(name, labels, histogram):
+    snap = histogram.snapshot()
+    lines = []
+    for bound, count in snap['buckets'].items():
+        bucket_labels = dict(labels, le=_format_value(float(bound)))
+        lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(float(snap['sum']))}")
+    lines.append(f"{name}_count{_format_labels(labels)} {snap['count']}")
+    return lines
@@ -0,0 +1,161 @@
+"""
+Versioned, immutable model sets for the GoPredict API.
+
+Training jobs finish on a monitor thread while /predict calls are reading
+the published models. Instead of mutating a shared dict, ModelHolder builds
+a new ModelSet (an immutable name -> ServedModel mapping with a version
+number) and swaps it in with a single attribute assignment. A request reads
+`holder.current` once and uses that set until it returns, so it never sees
+models from two versions; the read path takes no lock.
+
+The holder keeps the last few sets for rollback. Older sets are dropped from
+the holder and freed by reference counting once the last request pinning
+them finishes; until then they are reported as draining.
+"""
+
+import threading
+import weakref
+from collections import deque
+from datetime import datetime
+from types import MappingProxyType
+
+
+class ServedModel:
+    """A published model with the state used to serve it"""
+
+    __slots__ = ('name', 'model', 'ensemble', 'plan', 'version')
+
+    def __init__(self, name, model, ensemble=None, plan=None, version=0):
+        """
+        Args:
+            name: Display name the model is requested by
+            model: Trained model object
+            ensemble: FlatTreeEnsemble for small batches (optional)
+            plan: FeaturePlan the model was trained with (optional)
+            version: Version of the model set that first published this model
+        """
+        self.name = name
+        self.model = model
+        self.ensemble = ensemble
+        self.plan = plan
+        self.version = version
+
+
+class ModelSet:
+    """Immutable mapping of model name to ServedModel, with a version number"""
+
+    __slots__ = ('version', 'models', 'source', 'published_at', '__weakref__')
+
+    def __init__(self, version, models, source):
+        self.version = version
+        self.models = MappingProxyType(dict(models))
+        self.source = source
+        self.published_at = datetime.now().isoformat(timespec='seconds')
+
+    def get(self, name):
+        return self.models.get(name)
+
+    def __contains__(self, name):
+        return name in self.models
+
+    def __len__(self):
+        return len(self.models)
+
+    def names(self):
+        return list(self.models)
+
+    def describe(self):
+        return {
+            'version': self.version,
+            'source': self.source,
+            'published_at': self.published_at,
+            'models': {name: served.version for name, served in self.models.items()}
+        }
+
+
+class ModelHolder:
+    """Publishes ModelSets atomically with monotonically increasing versions"""
+
+    def __init__(self, keep=2):
+        """
+        Args:
+            keep: Previous model sets retained as rollback targets
+        """
+        self._lock = threading.Lock()  # serializes publishers; readers never take it
+        self._previous = deque(maxlen=keep)
+        self._live = weakref.WeakValueDictionary()
+        self._next_version = 1
+        self.current = ModelSet(0, {}, "empty")
+        self._live[0] = self.current
+
+    def publish(self, models, ensembles=None, plans=None, source="publish"):
+        """
+        Publish models on top of the current set as a new version.
+
+        Models with a name already in the current set replace it; the rest
+        are carried over unchanged.
+
+        Args:
+            models: Trained models keyed by display name
+            ensembles: FlatTreeEnsemble per model name (optional)
+            plans: FeaturePlan per model name (optional)
+            source: Short description recorded with the version
+
+        Returns:
+            The new current ModelSet
+        """
+        ensembles = ensembles or {}
+        plans = plans or {}
+        with self._lock:
+            version = self._next_version
+            entries = dict(self.current.models)
+            for name, model in models.items():
+                entries[name] = ServedModel(name, model, ensembles.get(name), plans.get(name), version)
+            return self._swap(entries, source)
+
+    def rollback(self, version=None):
+        """
+        Republish a retained previous set as a new version.
+
+        Args:
+            version: Version to restore (defaults to the one before the current set)
+
+        Returns:
+            The new current ModelSet
+
+        Raises:
+            LookupError: If the version is not retained (or there is nothing to roll back to)
+        """
+        with self._lock:
+            candidates = [s for s in self._previous if 0 < s.version != self.current.version]
+            if version is None:
+                target = candidates[-1] if candidates else None
+            else:
+                target = next((s for s in candidates if s.version == version), None)
+            if target is None:
+                retained = [s.version for s in candidates]
+                raise LookupError(f"Version {version} is not available for rollback (retained: {retained})"
+                                  if version is not None else "No previous model version to roll back to")
+            return self._swap(target.models, f"rollback to v{target.version}")
+
+    def _swap(self, entries, source):
+        new_set = ModelSet(self._next_version, entries, source)
+        self._next_version += 1
+        self._previous.append(self.current)
+        self._live[new_set.version] = new_set
+        # Single reference assignment: readers see either the old or the new set
+        self.current = new_set
+        return new_set
+
+    def versions(self):
+        """Current set, retained rollback targets and sets still pinned by in-flight requests"""
+        with self._lock:
+            current = self.current
+            retained = [s for s in self._previous if 0 < s.version != current.version]
+            kept = {current.version} | {s.version for s in self._previous}
+            draining = sorted(v for v in list(self._live.keys()) if v not in kept)
+            return {
+                'current': current.describe(),
+                'retained': [s.describe() for s in reversed(retained)],
+                'draining': draining
+            }
@@ -0,0 +1,358 @@
+"""
+Content-hashed cache of pipeline stage outputs.
+
+Preprocessing and feature engineering take minutes (DBSCAN alone dominates
+feature engineering) and are redone on every run even when only model
+settings changed. A StageCache stores the output files of a stage under a
+key hashing everything the output depends on:
+
+- the content of its input files (SHA-256, memoized by size and mtime)
+- its parameters (DBSCAN eps/min_samples, chunk size, ...)
+- the source of the code that computes it (functions or whole modules),
+  plus the pandas/numpy/scikit-learn versions
+- for in-memory sub-stages, the key of the previous sub-stage
+
+A stage whose key has an entry is restored by copying the cached files into
+place instead of recomputing. Entries live in <root>/<stage>/<key>/ with a
+manifest.json, are written to a temporary directory and renamed into place,
+and only the `keep` most recently used entries per stage are kept. `force`
+(True or stage names; 'features' matches every 'features.*' sub-stage)
+recomputes a stage and replaces its entry.
+
+run_frame_stages() chains FrameStages that transform a list of DataFrames
+in memory (the feature_pipe sub-stages): it resumes from the last stage with
+an entry and caches the frames after every stage it runs. Every lookup is
+recorded in StageCache.report.
+"""
+
+import hashlib
+import inspect
+import json
+import logging
+import os
+import shutil
+import time
+import types
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.feather
+except ImportError:  # frames of in-memory stages are then pickled
+    pyarrow = None
+
+try:
+    import sklearn
+except ImportError:  # only stages using scikit-learn need it
+    sklearn = None
+
+# Bump when the layout of cache entries changes
+CACHE_FORMAT = 1
+
+HIT = 'hit'
+MISS = 'miss'
+FORCED = 'forced'
+DISABLED = 'disabled'
+
+# path -> ((size, mtime_ns), sha256 hex digest)
+_file_hashes = {}
+
+
+def file_digest(path):
+    """SHA-256 of a file's content (a directory hashes its files' names and contents)"""
+    path = Path(path)
+    if path.is_dir():
+        h = hashlib.sha256()
+        for child in sorted(p for p in path.rglob('*') if p.is_file()):
+            h.update(str(child.relative_to(path)).encode())
+            h.update(file_digest(child).encode())
+        return h.hexdigest()
+
+    stat = path.stat()
+    signature = (stat.st_size, stat.st_mtime_ns)
+    cached = _file_hashes.get(str(path))
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    _file_hashes[str(path)] = (signature, h.hexdigest())
+    return h.hexdigest()
+
+
+def code_digest(*objects):
+    """SHA-256 of the source of functions, classes or modules"""
+    h = hashlib.sha256()
+    for obj in objects:
+        if isinstance(obj, types.ModuleType):
+            with open(inspect.getsourcefile(obj), 'rb') as f:
+                source = f.read()
+        else:
+            source = inspect.getsource(obj).encode()
+        h.update(getattr(obj, '__qualname__', obj.__name__).encode())
+        h.update(source)
+    return h.hexdigest()
+
+
+def _library_versions():
+    return {
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__ if sklearn is not None else None,
+    }
+
+
+def _install(source, destination):
+    """Copy a cached file or directory to destination, replacing it atomically"""
+    destination = Path(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    tmp = destination.with_name(destination.name + '.restore')
+    shutil.rmtree(tmp, ignore_errors=True)
+    if Path(source).is_dir():
+        shutil.copytree(source, tmp)
+        old = destination.with_name(destination.name + '.old')
+        shutil.rmtree(old, ignore_errors=True)
+        if destination.exists():
+            os.replace(destination, old)
+        os.replace(tmp, destination)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        shutil.copyfile(source, tmp)
+        os.replace(tmp, destination)
+
+
+def _write_frame(df, path):
+    """Save a frame exactly as it is: dtypes and index (unlike the dataset stores, no schema is applied)"""
+    if path.suffix == '.feather':
+        pyarrow.feather.write_feather(df, path, compression='uncompressed')
+    else:
+        df.to_pickle(path)
+
+
+def _read_frame(path):
+    if path.suffix == '.feather':
+        return pyarrow.feather.read_table(path, memory_map=True).to_pandas()
+    return pd.read_pickle(path)
+
+
+class StageCache:
+    """Output files of pipeline stages keyed by a hash of their inputs, parameters and code"""
+
+    def __init__(self, root, enabled=True, force=False, keep=2):
+        """
+        Args:
+            root: Cache directory
+            enabled: False recomputes every stage and stores nothing
+            force: True to recompute every stage, or stage names to recompute
+            keep: Entries kept per stage (least recently used are removed)
+        """
+        self.root = Path(root)
+        self.enabled = enabled
+        self.force = force if force is True else frozenset(force or ())
+        self.keep = keep
+        self.report = []
+
+    def key(self, stage, inputs=(), params=None, code=()):
+        """Cache key of a stage from its input files, parameters and code objects"""
+        description = {
+            'format': CACHE_FORMAT,
+            'stage': stage,
+            'inputs': [file_digest(path) for path in inputs],
+            'params': params or {},
+            'code': code_digest(*code) if code else None,
+            'libraries': _library_versions(),
+        }
+        encoded = json.dumps(description, sort_keys=True, default=str).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    def is_forced(self, stage):
+        if self.force is True:
+            return True
+        return stage in self.force or stage.split('.')[0] in self.force
+
+    def entry(self, stage, key):
+        """Directory of the entry of stage with key, or None if there is none"""
+        path = self.root / stage / key
+        return path if (path / 'manifest.json').exists() else None
+
+    def lookup(self, stage, key):
+        """Entry to restore stage from, or None if it must be computed (not recorded)"""
+        if not self.enabled or self.is_forced(stage):
+            return None
+        return self.entry(stage, key)
+
+    def restore(self, stage, key, outputs):
+        """
+        Copy the cached files of stage to their output paths.
+
+        Args:
+            outputs: {name: path} the stage writes
+        Returns:
+            True on a hit, False if the stage must be computed
+        """
+        entry = self.lookup(stage, key)
+        if entry is None:
+            return False
+        started = time.perf_counter()
+        manifest = self._touch(entry)
+        for name, path in outputs.items():
+            _install(entry / manifest['files'][name], path)
+        self.record(stage, HIT, key, time.perf_counter() - started)
+        return True
+
+    def store(self, stage, key, outputs, seconds=None, frames=None):
+        """
+        Save the output files (and optionally frames) of a computed stage.
+
+        Args:
+            outputs: {name: path} of files or directories to copy into the entry
+            seconds: Time the stage took to compute, recorded in the report
+            frames: DataFrames to save in the entry (see load_frames)
+        """
+        if seconds is not None:
+            self.record(stage, FORCED if self.is_forced(stage) else MISS if self.enabled else DISABLED,
+                        key, seconds)
+        if not self.enabled:
+            return
+        stage_dir = self.root / stage
+        tmp = stage_dir / f".tmp-{key}-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        files = {}
+        for name, path in outputs.items():
+            path = Path(path)
+            files[name] = name + ''.join(path.suffixes) if path.is_file() else name
+            if path.is_dir():
+                shutil.copytree(path, tmp / files[name])
+            else:
+                shutil.copyfile(path, tmp / files[name])
+        frame_format = 'pickle' if pyarrow is None else 'feather'
+        for i, df in enumerate(frames or ()):
+            _write_frame(df, tmp / f"frame_{i}.{frame_format}")
+        manifest = {'stage': stage, 'key': key, 'created': time.time(), 'seconds': seconds,
+                    'files': files, 'frames': len(frames or ()), 'frame_format': frame_format}
+        with open(tmp / 'manifest.json', 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        destination = stage_dir / key
+        shutil.rmtree(destination, ignore_errors=True)
+        os.replace(tmp, destination)
+        self._prune(stage_dir)
+
+    def load_frames(self, stage, key):
+        """DataFrames saved with the entry of stage (the entry must exist)"""
+        entry = self.entry(stage, key)
+        manifest = self._touch(entry)
+        return [_read_frame(entry / f"frame_{i}.{manifest['frame_format']}") for i in range(manifest['frames'])]
+
+    def record(self, stage, status, key, seconds):
+        self.report.append({'stage': stage, 'status': status, 'key': key[:12], 'seconds': round(seconds, 3)})
+        logging.info(f"Stage cache {status}: {stage} ({key[:12]})")
+
+    def summary(self):
+        """Lines of the report: one per stage with its status and time"""
+        lines = [f"Stage cache ({self.root}{'' if self.enabled else ', disabled'}):"]
+        for item in self.report:
+            action = 'restored in' if item['status'] == HIT else 'computed in'
+            lines.append(f"  {item['stage']:<24} {item['status']:<8} {item['key']}  "
+                         f"{action} {item['seconds']:.2f} s")
+        hits = sum(item['status'] == HIT for item in self.report)
+        lines.append(f"  {hits}/{len(self.report)} stages restored from cache")
+        return lines
+
+    def _touch(self, entry):
+        """Mark an entry as used (pruning keeps the most recently used) and return its manifest"""
+        manifest_path = entry / 'manifest.json'
+        os.utime(manifest_path)
+        with open(manifest_path) as f:
+            return json.load(f)
+
+    def _prune(self, stage_dir):
+        entries = [p for p in stage_dir.iterdir() if (p / 'manifest.json').exists()]
+        entries.sort(key=lambda p: (p / 'manifest.json').stat().st_mtime, reverse=True)
+        for entry in entries[self.keep:]:
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+class FrameStage:
+    """An in-memory stage: fn(frames) returns the transformed list of DataFrames"""
+
+    def __init__(self, name, fn, description, params=None, inputs=(), code=(), artifacts=None):
+        """
+        Args:
+            name: Stage name in the cache and report
+            fn: Function of the list of frames
+            description: What the stage adds, for the log
+            params: Parameters the output depends on
+            inputs: Files the output depends on
+            code: Functions or modules computing the output
+            artifacts: {name: path} of files the stage writes besides the frames
+        """
+        self.name = name
+        self.fn = fn
+        self.description = description
+        self.params = params or {}
+        self.inputs = inputs
+        self.code = code
+        self.artifacts = artifacts or {}
+
+
+def run_frame_stages(cache, stages, inputs, load):
+    """
+    Run FrameStages in order on the frames returned by load(), skipping to
+    the output of the last stage that has a cache entry.
+
+    Each stage's key chains the key before it, starting from the content of
+    the input files, so an entry is only used if every earlier stage would
+    have produced the same frames. An entry holds the frames after its stage
+    plus the artifacts of every stage up to it, so resuming restores them.
+
+    Args:
+        cache: StageCache
+        stages: FrameStages in execution order
+        inputs: Files load() reads
+        load: Function returning the initial list of frames
+    Returns:
+        The frames after the last stage
+    """
+    keys = []
+    previous = cache.key('inputs', inputs=inputs)
+    for stage in stages:
+        previous = cache.key(stage.name, inputs=stage.inputs, params=dict(stage.params, previous=previous),
+                             code=stage.code)
+        keys.append(previous)
+
+    start, frames = 0, None
+    for i in reversed(range(len(stages))):
+        if any(cache.is_forced(stage.name) for stage in stages[:i + 1]):
+            continue
+        if cache.lookup(stages[i].name, keys[i]) is not None:
+            artifacts = {}
+            for stage, key in zip(stages[:i], keys[:i]):
+                artifacts.update(stage.artifacts)
+                cache.record(stage.name, HIT, key, 0.0)
+            artifacts.update(stages[i].artifacts)
+            cache.restore(stages[i].name, keys[i], artifacts)
+            frames = cache.load_frames(stages[i].name, keys[i])
+            start = i + 1
+            logging.info(f"Restored the frames after '{stages[i].name}' from the stage cache")
+            break
+
+    if frames is None:
+        frames = load()
+    artifacts = {}
+    for stage in stages[:start]:
+        artifacts.update(stage.artifacts)
+    for stage, key in zip(stages[start:], keys[start:]):
+        logging.info(f"Adding {stage.description}...")
+        started = time.perf_counter()
+        frames = stage.fn(frames)
+        seconds = time.perf_counter() - started
+        logging.info(f"✅ {stage.description.capitalize()} added!")
+        artifacts.update(stage.artifacts)
+        cache.store(stage.name, key, artifacts, seconds, frames=frames)
+    return frames
@@ -4,14 +4,26 @@ GoPredict API Startup Script
 
 This script starts the FastAPI server for the GoPredict machine learning project.
 It handles environment setup and provides different run modes.
+
+With --preload the parent process loads models and lookup tables once, binds
+the listening socket and forks the workers, so every worker shares those
+pages copy-on-write. Per-worker RSS/USS is printed shortly after startup and
+again whenever the parent receives SIGUSR1.
 """
 
 import os
+import gc
 import sys
+import signal
+import socket
+import threading
 import uvicorn
 import argparse
 from pathlib import Path
 
+# Seconds after forking before the parent prints the per-worker memory report
+MEMORY_REPORT_DELAY_S = 5.0
+
 def setup_environment():
     """Setup environment variables and paths"""
     # Add src to Python path
@@ -37,6 +49,83 @@ def setup_environment():
     print(f"   Src path exists: {src_path.exists()}")
     print(f"   Python path: {sys.path[:3]}...")  # Show first 3 entries
 
+def run_preloaded(app_module, host, port, workers, log_level):
+    """
+    Load models once in this process, then fork workers that share them.
+
+    Args:
+        app_module: Imported api.main module
+        host: Host to bind to
+        port: Port to bind to
+        workers: Number of worker processes to fork
+        log_level: Uvicorn log level
+    """
+    if not hasattr(os, "fork"):
+        print("❌ --preload needs fork(); run without it on this platform")
+        sys.exit(1)
+
+    from serving.memory import memory_report
+
+    print("📦 Preloading models and lookup tables...")
+    app_module.preload_serving_state()
+
+    # Move everything loaded so far into the permanent GC generation so that
+    # collections in the workers do not write to (and un-share) those pages
+    gc.collect()
+    gc.freeze()
+
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    config = uvicorn.Config(app_module.app, log_level=log_level)
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                uvicorn.Server(config).run(sockets=[sock])
+            finally:
+                os._exit(0)
+        children.append(pid)
+    print(f"✅ Forked {workers} workers: {children}")
+
+    def report_memory(*_):
+        pids = [os.getpid()] + list(children)
+        labels = ["parent"] + [f"worker {pid}" for pid in children]
+        print("\n📊 Worker memory (USS = pages private to the process)")
+        print(memory_report(pids, labels), flush=True)
+
+    def stop_workers(signum, frame):
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop_workers)
+    signal.signal(signal.SIGTERM, stop_workers)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, report_memory)
+
+    timer = threading.Timer(MEMORY_REPORT_DELAY_S, report_memory)
+    timer.daemon = True
+    timer.start()
+
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        if pid in children:
+            children.remove(pid)
+
+    timer.cancel()
+    sock.close()
+
 def main():
     """Main function to start the API server"""
     parser = argparse.ArgumentParser(description="GoPredict API Server")
@@ -46,6 +135,8 @@ def main():
     parser.add_argument("--reload", action="store_true", help="Enable auto-reload")
     parser.add_argument("--log-level", default="info", choices=["debug", "info", "warning", "error"])
     parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--preload", action="store_true",
+                        help="Load models in the parent and fork workers that share them")
     
     args = parser.parse_args()
     
@@ -68,6 +159,7 @@ def main():
     print(f"   Reload: {args.reload}")
     print(f"   Log Level: {args.log_level}")
     print(f"   Workers: {args.workers}")
+    print(f"   Preload: {args.preload}")
     print("=" * 50)
     
     # Test import before starting server
@@ -83,11 +175,17 @@ def main():
         print(f"❌ Unexpected error importing API module: {e}")
         sys.exit(1)
     
+    if args.preload:
+        if args.reload:
+            print("⚠️ --reload is ignored with --preload")
+        run_preloaded(api.main, host, port, args.workers, args.log_level)
+        return
+    
     # Start the server
     uvicorn.run(
         "api.main:app",
-        host=args.host,
-        port=args.port,
+        host=host,
+        port=port,
         reload=args.reload,
         log_level=args.log_level,
         workers=args.workers if not args.reload else 1
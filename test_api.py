@@ -141,6 +141,123 @@ def test_prediction():
     except Exception as e:
         print(f"Prediction test error: {e}")
 
+def test_batch_prediction():
+    """Test the batch prediction endpoint"""
+    print("\nTesting batch prediction endpoint...")
+    try:
+        trip = {
+            "from": {"lat": 40.767937, "lon": -73.982155},
+            "to": {"lat": 40.748817, "lon": -73.985428},
+            "startTime": "2016-01-01T17:00:00",
+            "city": "new_york"
+        }
+        invalid_trip = {"from": {"lat": 40.767937, "lon": -73.982155}}
+        response = requests.post(f"{API_BASE_URL}/predict/batch", json=[trip, invalid_trip, trip])
+        if response.status_code == 200:
+            print("Batch prediction test passed")
+            result = response.json()
+            print(f"   Trips scored: {result['count'] - result['errors']}/{result['count']}")
+            print(f"   First duration: {result['results'][0]['minutes']:.2f} minutes")
+            print(f"   Invalid item error: {result['results'][1]['error']}")
+        else:
+            print(f"Batch prediction test failed: {response.status_code}")
+            print(f"   Error: {response.text}")
+    except Exception as e:
+        print(f"Batch prediction test error: {e}")
+
+def test_bulk_prediction():
+    """Test the streaming bulk scoring endpoint"""
+    print("\nTesting bulk prediction endpoint...")
+    try:
+        rows = [
+            {"row_id": i, "start_lat": 40.767937, "start_lng": -73.982155,
+             "end_lat": 40.748817, "end_lng": -73.985428, "datetime": "2016-01-01 17:00:00"}
+            for i in range(5)
+        ]
+        body = "\n".join(json.dumps(row) for row in rows)
+        response = requests.post(
+            f"{API_BASE_URL}/predict/bulk?chunk_size=2",
+            data=body,
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+        if response.status_code == 200:
+            print("Bulk prediction test passed")
+            lines = [json.loads(line) for line in response.text.splitlines() if line]
+            summary = lines[-1]["summary"]
+            print(f"   Rows scored: {summary['rows'] - summary['errors']}/{summary['rows']}")
+            print(f"   Chunks: {summary['chunks']}")
+            print(f"   Rows/sec: {summary['rows_per_second']}")
+        else:
+            print(f"Bulk prediction test failed: {response.status_code}")
+            print(f"   Error: {response.text}")
+    except Exception as e:
+        print(f"Bulk prediction test error: {e}")
+
+def test_bulk_prediction_row_ids():
+    """Test bulk scoring output stays valid JSON when some lines have no row_id"""
+    print("\nTesting bulk prediction with missing row_ids...")
+    try:
+        row = {"start_lat": 40.767937, "start_lng": -73.982155,
+               "end_lat": 40.748817, "end_lng": -73.985428, "datetime": "2016-01-01 17:00:00"}
+        body = "\n".join([
+            json.dumps(dict(row, row_id=4)),
+            json.dumps(row),
+            "{not json",
+            json.dumps(dict(row, row_id=7)),
+        ])
+        response = requests.post(
+            f"{API_BASE_URL}/predict/bulk",
+            data=body,
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+        if response.status_code == 200:
+            def reject(token):
+                raise ValueError(f"invalid JSON token {token}")
+            lines = [json.loads(line, parse_constant=reject) for line in response.text.splitlines() if line]
+            ids = [line.get("row_id") for line in lines[:-1]]
+            if ids == [4, None, None, 7]:
+                print("Bulk prediction row_id test passed")
+            else:
+                print(f"Bulk prediction row_id test failed: row_ids {ids}")
+        else:
+            print(f"Bulk prediction row_id test failed: {response.status_code}")
+            print(f"   Error: {response.text}")
+    except Exception as e:
+        print(f"Bulk prediction row_id test error: {e}")
+
+def test_metrics():
+    """Test the Prometheus metrics endpoint"""
+    print("\nTesting metrics endpoint...")
+    try:
+        response = requests.get(f"{API_BASE_URL}/metrics")
+        if response.status_code == 200:
+            print("Metrics test passed")
+            families = [line.split()[2] for line in response.text.splitlines() if line.startswith("# TYPE")]
+            print(f"   Metric families: {len(families)}")
+            print(f"   Has stage histogram: {'gopredict_predict_stage_seconds' in families}")
+        else:
+            print(f"Metrics test failed: {response.status_code}")
+            print(f"   Error: {response.text}")
+    except Exception as e:
+        print(f"Metrics test error: {e}")
+
+def test_jobs():
+    """Test the job listing endpoint"""
+    print("\nTesting jobs endpoint...")
+    try:
+        response = requests.get(f"{API_BASE_URL}/jobs")
+        if response.status_code == 200:
+            print("Jobs test passed")
+            result = response.json()
+            print(f"   Jobs: {result['count']}")
+            for job in result['jobs'][:3]:
+                print(f"   {job['id']}: {job['kind']} {job['status']} (stage: {job['stage']})")
+        else:
+            print(f"Jobs test failed: {response.status_code}")
+            print(f"   Error: {response.text}")
+    except Exception as e:
+        print(f"Jobs test error: {e}")
+
 def main():
     """Run all tests"""
     print("Starting GoPredict API Tests")
@@ -158,6 +275,11 @@ def main():
     test_time_features()
     test_models()
     test_prediction()
+    test_batch_prediction()
+    test_bulk_prediction()
+    test_bulk_prediction_row_ids()
+    test_metrics()
+    test_jobs()
     
     print("\n" + "=" * 50)
     print("API testing completed!")